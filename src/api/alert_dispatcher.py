@@ -0,0 +1,206 @@
+import asyncio
+import json
+import random
+import time
+import urllib.request
+from abc import ABC, abstractmethod
+from collections import deque
+from pathlib import Path
+
+# ================= CONFIGURACIÓN =================
+MAX_COLA = 1000            # Alertas pendientes por sink; al llenarse se descarta la más vieja
+TAMANO_LOTE = 50           # Alertas por entrega
+ESPERA_LOTE_S = 1.0        # Tiempo máximo que una alerta espera a que se llene su lote
+COOLDOWN_S = 300.0         # Una misma (estación, tipo de falla) se entrega a lo más una vez por ventana
+MAX_REINTENTOS = 5
+BACKOFF_BASE_S = 0.5       # Espera antes del reintento i: base · 2^i (con jitter), hasta BACKOFF_MAX_S
+BACKOFF_MAX_S = 30.0
+
+
+# ================= SINKS =================
+class SinkAlertas(ABC):
+    """Destino de las alertas. `entregar` recibe un lote (lista de dicts) y lanza una excepción si falla"""
+
+    nombre = 'sink'
+
+    @abstractmethod
+    async def entregar(self, lote):
+        ...
+
+
+class SinkWebhook(SinkAlertas):
+    """POST del lote como JSON a una URL (en un hilo, para no bloquear el event loop)"""
+
+    nombre = 'webhook'
+
+    def __init__(self, url, timeout_s=5.0):
+        self.url = url
+        self.timeout_s = timeout_s
+
+    def _post(self, cuerpo):
+        peticion = urllib.request.Request(self.url, data=cuerpo, method='POST',
+                                          headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(peticion, timeout=self.timeout_s) as respuesta:
+            respuesta.read()
+
+    async def entregar(self, lote):
+        cuerpo = json.dumps({'alertas': lote}, ensure_ascii=False).encode('utf-8')
+        await asyncio.to_thread(self._post, cuerpo)
+
+
+class SinkArchivo(SinkAlertas):
+    """Agrega cada alerta como una línea JSON a un archivo"""
+
+    nombre = 'archivo'
+
+    def __init__(self, ruta):
+        self.ruta = Path(ruta)
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+
+    def _escribir(self, lineas):
+        with open(self.ruta, 'a', encoding='utf-8') as f:
+            f.write(lineas)
+
+    async def entregar(self, lote):
+        lineas = ''.join(json.dumps(alerta, ensure_ascii=False) + '\n' for alerta in lote)
+        await asyncio.to_thread(self._escribir, lineas)
+
+
+class SinkColaLocal(SinkAlertas):
+    """
+    Cola en memoria que otro proceso consume (vía GET /alertas/cola); ocupa el lugar de un
+    broker de mensajes mientras no lo hay. Guarda a lo más `max_elementos` alertas.
+    """
+
+    nombre = 'cola'
+
+    def __init__(self, max_elementos=MAX_COLA):
+        self.alertas = deque(maxlen=max_elementos)
+
+    async def entregar(self, lote):
+        self.alertas.extend(lote)
+
+    def consumir(self, maximo):
+        return [self.alertas.popleft() for _ in range(min(maximo, len(self.alertas)))]
+
+
+# ================= DESPACHADOR =================
+class _Canal:
+    """Cola acotada y estadísticas de un sink; cada sink tiene su propia tarea de entrega"""
+
+    def __init__(self, sink, max_cola):
+        self.sink = sink
+        self.cola = deque(maxlen=max_cola)
+        self.hay_alertas = asyncio.Event()
+        self.tarea = None
+        self.stats = {'entregadas': 0, 'lotes': 0, 'reintentos': 0, 'fallidas': 0, 'descartadas': 0}
+
+
+class DespachadorAlertas:
+    """
+    Reparte las alertas a los sinks sin bloquear a quien las publica. `publicar` es
+    síncrono y O(1): revisa el cooldown de (estación, tipo de falla) y deja la alerta en
+    la cola de cada sink. Una tarea por sink arma lotes (hasta `tamano_lote` alertas o
+    `espera_lote_s` segundos) y los entrega con reintentos y backoff exponencial.
+
+    Un sink lento o caído solo retrasa su propia cola; si se llena, se descartan las
+    alertas más viejas (se cuentan en `descartadas`), nunca se bloquea la puntuación.
+    """
+
+    def __init__(self, sinks, max_cola=MAX_COLA, tamano_lote=TAMANO_LOTE, espera_lote_s=ESPERA_LOTE_S,
+                 cooldown_s=COOLDOWN_S, max_reintentos=MAX_REINTENTOS, backoff_base_s=BACKOFF_BASE_S):
+        self.canales = [_Canal(sink, max_cola) for sink in sinks]
+        self.tamano_lote = tamano_lote
+        self.espera_lote_s = espera_lote_s
+        self.cooldown_s = cooldown_s
+        self.max_reintentos = max_reintentos
+        self.backoff_base_s = backoff_base_s
+        self._ultima_entrega = {}  # (estacion, tipo_falla) -> time.monotonic() de la última publicada
+        self.publicadas = 0
+        self.suprimidas = 0
+
+    def iniciar(self):
+        """Lanza las tareas de entrega (dentro del event loop)"""
+        for canal in self.canales:
+            if canal.tarea is None:
+                canal.tarea = asyncio.create_task(self._entregar_canal(canal))
+
+    def publicar(self, alerta):
+        """Encola la alerta para todos los sinks; regresa False si cayó en el cooldown"""
+        ahora = time.monotonic()
+        clave = (alerta.get('estacion'), alerta.get('tipo_falla'))
+        ultima = self._ultima_entrega.get(clave)
+        if ultima is not None and ahora - ultima < self.cooldown_s:
+            self.suprimidas += 1
+            return False
+        self._ultima_entrega[clave] = ahora
+        if len(self._ultima_entrega) > 4 * MAX_COLA:
+            self._ultima_entrega = {k: t for k, t in self._ultima_entrega.items() if ahora - t < self.cooldown_s}
+
+        self.publicadas += 1
+        for canal in self.canales:
+            if len(canal.cola) == canal.cola.maxlen:
+                canal.stats['descartadas'] += 1  # deque(maxlen) suelta la más vieja
+            canal.cola.append(alerta)
+            canal.hay_alertas.set()
+        return True
+
+    async def _siguiente_lote(self, canal):
+        await canal.hay_alertas.wait()
+        # Esperar un poco a que se junten más alertas, salvo que el lote ya esté lleno
+        limite = time.monotonic() + self.espera_lote_s
+        while len(canal.cola) < self.tamano_lote and time.monotonic() < limite:
+            await asyncio.sleep(min(0.05, self.espera_lote_s))
+        lote = [canal.cola.popleft() for _ in range(min(self.tamano_lote, len(canal.cola)))]
+        if not canal.cola:
+            canal.hay_alertas.clear()
+        return lote
+
+    async def _entregar_canal(self, canal):
+        while True:
+            lote = await self._siguiente_lote(canal)
+            if lote:
+                await self._entregar_con_reintentos(canal, lote)
+
+    async def _entregar_con_reintentos(self, canal, lote):
+        for intento in range(self.max_reintentos + 1):
+            try:
+                await canal.sink.entregar(lote)
+                canal.stats['entregadas'] += len(lote)
+                canal.stats['lotes'] += 1
+                return True
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if intento == self.max_reintentos:
+                    canal.stats['fallidas'] += len(lote)
+                    print(f"❌ Sink '{canal.sink.nombre}': lote de {len(lote)} alertas descartado tras "
+                          f"{self.max_reintentos} reintentos ({e})")
+                    return False
+                canal.stats['reintentos'] += 1
+                espera = min(BACKOFF_MAX_S, self.backoff_base_s * 2 ** intento)
+                await asyncio.sleep(espera * random.uniform(0.5, 1.0))
+
+    async def detener(self, timeout_s=5.0):
+        """Intenta vaciar las colas (hasta `timeout_s`) y detiene las tareas"""
+        limite = time.monotonic() + timeout_s
+        while any(canal.cola for canal in self.canales) and time.monotonic() < limite:
+            await asyncio.sleep(0.05)
+        for canal in self.canales:
+            if canal.tarea is not None:
+                canal.tarea.cancel()
+        await asyncio.gather(*(c.tarea for c in self.canales if c.tarea is not None), return_exceptions=True)
+
+    def sink(self, nombre):
+        return next((canal.sink for canal in self.canales if canal.sink.nombre == nombre), None)
+
+    def estadisticas(self):
+        return {
+            'publicadas': self.publicadas,
+            'suprimidas_cooldown': self.suprimidas,
+            'cooldown_segundos': self.cooldown_s,
+            'sinks': {
+                canal.sink.nombre: {**canal.stats, 'en_cola': len(canal.cola)}
+                for canal in self.canales
+            },
+        }
@@ -0,0 +1,116 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from catboost import Pool
+
+from src.features.feature_store import PREFIJO_EMBEDDING
+from src.features.projection import PREFIJO_PROYECCION
+
+# ================= CONFIGURACIÓN =================
+MAX_PENDIENTES = 500       # Alertas que todavía se pueden explicar (guardan su fila de features)
+MAX_CACHE = 2000           # Explicaciones ya calculadas
+TOP_FEATURES = 8
+GRUPO_EMBEDDING = 'texto (embedding)'
+
+
+def _es_embedding(nombre):
+    return nombre.startswith(PREFIJO_EMBEDDING) or nombre.startswith(PREFIJO_PROYECCION)
+
+
+def explicar_fila(modelo, fila, clase_idx, top=TOP_FEATURES):
+    """
+    Contribuciones SHAP de cada feature a la clase predicha de una fila. La estación y el
+    contexto (clima, tráfico) se reportan uno por uno; las dimensiones del embedding se
+    suman en un solo grupo, porque por separado no significan nada para un operador.
+    """
+    nombres = modelo.feature_names_
+    pool = Pool([fila], cat_features=modelo.get_cat_feature_indices(), feature_names=nombres)
+    shap = np.asarray(modelo.get_feature_importance(data=pool, type='ShapValues'))[0]
+    if shap.ndim == 2:
+        shap = shap[clase_idx]  # Multiclase: (clases, features + 1)
+    valor_base, contribuciones = float(shap[-1]), shap[:-1]
+
+    individuales = []
+    embedding, n_embedding = 0.0, 0
+    for nombre, valor, contribucion in zip(nombres, fila, contribuciones):
+        if _es_embedding(nombre):
+            embedding += float(contribucion)
+            n_embedding += 1
+        else:
+            individuales.append({'feature': nombre, 'valor': valor, 'contribucion': float(contribucion)})
+    if n_embedding:
+        individuales.append({'feature': GRUPO_EMBEDDING, 'valor': None, 'contribucion': embedding,
+                             'dimensiones': n_embedding})
+
+    individuales.sort(key=lambda c: abs(c['contribucion']), reverse=True)
+    return {
+        'valor_base': valor_base,
+        'prediccion': valor_base + float(contribuciones.sum()),
+        'contribuciones': individuales[:top],
+    }
+
+
+class ExplicadorAlertas:
+    """
+    Explicaciones por alerta, calculadas solo cuando alguien las pide. Al disparar una
+    alerta solo se guarda (O(1)) la fila de features y el modelo que la puntuó; el cálculo
+    SHAP corre en un hilo aparte y el resultado queda en caché por id de alerta, así que
+    nunca pasa por la ruta de puntuación. Pendientes y caché están acotados (LRU).
+    """
+
+    def __init__(self, max_pendientes=MAX_PENDIENTES, max_cache=MAX_CACHE, top=TOP_FEATURES):
+        self.max_pendientes = max_pendientes
+        self.max_cache = max_cache
+        self.top = top
+        self._pendientes = OrderedDict()  # alerta_id -> (ModeloActivo, fila, clase_idx, etiqueta)
+        self._cache = OrderedDict()       # alerta_id -> explicación
+        self._en_curso = {}               # alerta_id -> Future
+        self._lock = threading.Lock()     # El hilo de cálculo también modifica estos dicts
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='shap')
+
+    def registrar(self, alerta_id, modelo_activo, fila, clase_idx, etiqueta):
+        with self._lock:
+            self._pendientes[alerta_id] = (modelo_activo, fila, clase_idx, etiqueta)
+            while len(self._pendientes) > self.max_pendientes:
+                self._pendientes.popitem(last=False)
+
+    def en_cache(self, alerta_id):
+        with self._lock:
+            explicacion = self._cache.get(alerta_id)
+            if explicacion is not None:
+                self._cache.move_to_end(alerta_id)
+            return explicacion
+
+    def solicitar(self, alerta_id):
+        """Future con la explicación (la lanza si no está en curso); None si el id no se conoce"""
+        with self._lock:
+            futuro = self._en_curso.get(alerta_id)
+            if futuro is None:
+                pendiente = self._pendientes.pop(alerta_id, None)
+                if pendiente is None:
+                    return None
+                futuro = self._executor.submit(self._calcular, alerta_id, *pendiente)
+                self._en_curso[alerta_id] = futuro
+            return futuro
+
+    def _calcular(self, alerta_id, modelo_activo, fila, clase_idx, etiqueta):
+        try:
+            explicacion = explicar_fila(modelo_activo.model, fila, clase_idx, self.top)
+        except Exception:
+            with self._lock:
+                # Se puede volver a pedir
+                self._pendientes[alerta_id] = (modelo_activo, fila, clase_idx, etiqueta)
+                self._en_curso.pop(alerta_id, None)
+            raise
+        explicacion.update({'id': alerta_id, 'clase': etiqueta, 'version_modelo': modelo_activo.version})
+        with self._lock:
+            self._cache[alerta_id] = explicacion
+            while len(self._cache) > self.max_cache:
+                self._cache.popitem(last=False)
+            self._en_curso.pop(alerta_id, None)
+        return explicacion
+
+    def cerrar(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,35 @@
+import fcntl
+import os
+from pathlib import Path
+
+# ================= CANDADO DE DIRECTORIO =================
+# El historial y el WAL suponen un solo escritor por directorio. Con varios workers
+# (gunicorn -w N) cada uno abriría los mismos archivos y se pisarían las escrituras, así
+# que el primero que arranca toma un flock exclusivo y los demás se enteran al instante.
+# El sistema libera el flock cuando el proceso muere: nunca queda un candado huérfano.
+LOCK_FILE = ".lock"
+
+
+class DirectorioOcupado(RuntimeError):
+    """Otro proceso ya escribe en el directorio"""
+
+
+def bloquear_directorio(directorio):
+    """
+    Toma el candado exclusivo del directorio sin esperar y regresa el archivo abierto
+    (cerrarlo lo libera). Lanza DirectorioOcupado si otro proceso lo tiene.
+    """
+    ruta = Path(directorio) / LOCK_FILE
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    archivo = open(ruta, 'a+', encoding='utf-8')
+    try:
+        fcntl.flock(archivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        archivo.seek(0)
+        pid = archivo.read().strip() or '?'
+        archivo.close()
+        raise DirectorioOcupado(f"'{directorio}' ya está en uso por el proceso {pid}") from None
+    archivo.truncate(0)
+    archivo.write(str(os.getpid()))
+    archivo.flush()
+    return archivo
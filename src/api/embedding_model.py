@@ -0,0 +1,115 @@
+import gc
+import os
+import resource
+
+import numpy as np
+
+# ================= CONFIGURACIÓN =================
+# fp32: pesos originales. bf16: todos los pesos a la mitad (matmuls bf16 en CPU).
+# int8: cuantización dinámica de las capas lineales (la tabla de embeddings de tokens
+# se queda en fp32, así que ahorra menos que bf16 en XLM-RoBERTa).
+PRECISIONES = ('fp32', 'bf16', 'int8')
+
+
+def _convertir_precision(model, precision):
+    if precision == 'fp32':
+        return model
+    import torch
+    if precision == 'bf16':
+        return model.to(torch.bfloat16)
+    if precision == 'int8':
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+# ================= MEMORIA =================
+def memoria_proceso():
+    """
+    Memoria del proceso en MB. En Linux incluye PSS (las páginas compartidas se reparten
+    entre los procesos que las usan) y cuánto del RSS es compartido: con el modelo
+    precargado, la suma de PSS de los workers es lo que realmente ocupa el host.
+    """
+    memoria = {'pid': os.getpid()}
+    try:
+        with open('/proc/self/smaps_rollup', 'r') as f:
+            campos = dict(linea.split(':', 1) for linea in f if linea.endswith('kB\n'))
+        kb = {nombre: int(valor.split()[0]) for nombre, valor in campos.items()}
+        memoria.update({
+            'rss_mb': round(kb['Rss'] / 1024, 1),
+            'pss_mb': round(kb['Pss'] / 1024, 1),
+            'compartida_mb': round((kb.get('Shared_Clean', 0) + kb.get('Shared_Dirty', 0)) / 1024, 1),
+            'privada_mb': round((kb.get('Private_Clean', 0) + kb.get('Private_Dirty', 0)) / 1024, 1),
+        })
+    except (OSError, KeyError, ValueError):
+        pass
+    # Máximo histórico (en Linux ru_maxrss viene en KB)
+    memoria['rss_max_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return memoria
+
+
+def _rss_mb():
+    return memoria_proceso().get('rss_mb')
+
+
+# ================= MODELO =================
+class ModeloEmbeddings:
+    """
+    SentenceTransformer en la precisión pedida, con la misma interfaz `encode` que usa la
+    API (un texto -> vector, una lista -> matriz), siempre en float32 de numpy.
+
+    Para compartir los pesos entre workers se crea con `precargar` antes de que el
+    servidor haga fork (gunicorn --preload): los tensores nunca se escriben, así que sus
+    páginas quedan compartidas (copy-on-write) y cada worker solo paga su memoria propia.
+    """
+
+    def __init__(self, model_name, precision='fp32'):
+        if precision not in PRECISIONES:
+            raise ValueError(f"Precisión desconocida: {precision}. Opciones: {', '.join(PRECISIONES)}")
+        from sentence_transformers import SentenceTransformer
+
+        antes = _rss_mb()
+        self.model_name = model_name
+        self.precision = precision
+        self.precargado = False
+        self.pid_carga = os.getpid()
+        self.model = _convertir_precision(SentenceTransformer(model_name).eval(), precision)
+        despues = _rss_mb()
+        self.memoria_carga_mb = round(despues - antes, 1) if antes is not None and despues is not None else None
+
+    def encode(self, textos):
+        if self.precision == 'fp32':
+            return self.model.encode(textos, convert_to_numpy=True)
+        # numpy no tiene bf16: se pide el tensor y se convierte
+        embeddings = self.model.encode(textos, convert_to_tensor=True)
+        return embeddings.float().cpu().numpy().astype(np.float32, copy=False)
+
+    def info(self):
+        return {
+            'modelo': self.model_name,
+            'precision': self.precision,
+            'precargado': self.precargado,
+            'compartido_con_maestro': self.precargado and os.getpid() != self.pid_carga,
+            'memoria_carga_mb': self.memoria_carga_mb,
+        }
+
+
+def precargar(model_name, precision='fp32'):
+    """
+    Carga el modelo en el proceso maestro, antes del fork. Se carga con un solo hilo de
+    torch (no debe quedar un pool de OpenMP activo al hacer fork; cada worker fija el suyo
+    con `configurar_hilos`) y se congela el GC para que las recolecciones en los workers no
+    escriban sobre los objetos heredados y rompan el copy-on-write.
+    """
+    import torch
+    torch.set_num_threads(1)
+    modelo = ModeloEmbeddings(model_name, precision)
+    modelo.precargado = True
+    gc.collect()
+    gc.freeze()
+    return modelo
+
+
+def configurar_hilos(hilos):
+    """Hilos de torch de este proceso (0 = uno por núcleo)"""
+    import torch
+    torch.set_num_threads(hilos or os.cpu_count() or 1)
+    return torch.get_num_threads()
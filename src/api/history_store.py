@@ -0,0 +1,556 @@
+import json
+import math
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from src.api.dir_lock import bloquear_directorio
+
+# ================= FORMATO =================
+# El historial es un directorio con:
+#   - activo.bin / activo.json : segmento abierto; filas de tamaño fijo que solo se agregan
+#   - seg_<t_min>_<n>/         : segmentos sellados, una columna por .npy (memory-mappable),
+#                                ordenados por (estación, t) con un índice de inicio por
+#                                estación; una consulta es una búsqueda binaria por segmento
+#   - pend_<t_min>_<n>.bin/.json : segmento activo ya sellado cuyo seg_ aún no se escribe;
+#                                se borra cuando el segmento se publica (si no, se reintenta)
+HISTORIAL_DIR = "data/history"
+ACTIVO_FILE = "activo.bin"
+ACTIVO_META = "activo.json"
+META_FILE = "meta.json"
+INICIO_FILE = "inicio.npy"
+PREFIJO_SEGMENTO = "seg_"
+PREFIJO_PENDIENTE = "pend_"
+COLUMNAS = ('t', 'estacion', 'probs', 'riesgo', 'flags', 'tweets', 'alertas')
+
+FILAS_POR_SEGMENTO = 50_000      # Al llenarse, el segmento activo se sella
+FILAS_COMPACTADO = 2_000_000     # Tamaño máximo de un segmento compactado
+FACTOR_COMPACTACION = 8          # Se fusionan de 8 en 8 segmentos del mismo nivel de tamaño
+DELTA_RIESGO = 1.0               # Estaciones sin tweets solo se registran si su riesgo cambia más que esto
+RETENCION_DIAS = 30.0
+
+BIT_ALERTA = 1                   # La estación supera el umbral de alerta
+BIT_ALERTA_PROPAGADA = 2         # Alerta por riesgo propagado desde estaciones vecinas
+
+
+def _dtype_fila(n_clases):
+    return np.dtype([
+        ('t', '<f8'), ('estacion', '<u2'), ('probs', '<f4', (n_clases,)), ('riesgo', '<f4'),
+        ('flags', 'u1'), ('tweets', '<u2'), ('alertas', '<u2'),
+    ])
+
+
+# ================= SEGMENTOS SELLADOS =================
+class Segmento:
+    """Segmento inmutable; las columnas se abren como memmap al primer uso"""
+
+    def __init__(self, ruta):
+        self.ruta = Path(ruta)
+        with open(self.ruta / META_FILE, 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.t_min = self.meta['t_min']
+        self.t_max = self.meta['t_max']
+        self.n_filas = self.meta['n_filas']
+        self._posicion = {e: i for i, e in enumerate(self.meta['estaciones'])}
+        self._columnas = None
+
+    def columnas(self):
+        if self._columnas is None:
+            self._columnas = {c: np.load(self.ruta / f"{c}.npy", mmap_mode='r') for c in COLUMNAS}
+            self._columnas['inicio'] = np.load(self.ruta / INICIO_FILE)
+        return self._columnas
+
+    def rango(self, estacion, desde, hasta):
+        """(a, b) de las filas de la estación con desde <= t <= hasta"""
+        i = self._posicion.get(estacion)
+        if i is None:
+            return 0, 0
+        cols = self.columnas()
+        a, b = int(cols['inicio'][i]), int(cols['inicio'][i + 1])
+        t = cols['t'][a:b]
+        return a + int(np.searchsorted(t, desde, 'left')), a + int(np.searchsorted(t, hasta, 'right'))
+
+    def ultima_antes(self, estacion, desde):
+        """Índice de la última fila de la estación con t < desde (o None)"""
+        i = self._posicion.get(estacion)
+        if i is None:
+            return None
+        cols = self.columnas()
+        a, b = int(cols['inicio'][i]), int(cols['inicio'][i + 1])
+        k = a + int(np.searchsorted(cols['t'][a:b], desde, 'left'))
+        return k - 1 if k > a else None
+
+
+def _escribir_segmento(directorio, filas, meta, reemplaza=()):
+    """Escribe un segmento ordenado por (estación, t) y lo publica con un rename atómico"""
+    orden = np.lexsort((filas['t'], filas['estacion']))
+    filas = filas[orden]
+    nombre = f"{PREFIJO_SEGMENTO}{int(filas['t'].min() * 1000):015d}_{len(filas)}"
+    destino = Path(directorio) / nombre
+    tmp = Path(directorio) / (nombre + '.tmp')
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+
+    for c in COLUMNAS:
+        np.save(tmp / f"{c}.npy", np.ascontiguousarray(filas[c]))
+    inicio = np.searchsorted(filas['estacion'], np.arange(len(meta['estaciones']) + 1), 'left')
+    np.save(tmp / INICIO_FILE, inicio.astype(np.int64))
+    meta = {**meta, 't_min': float(filas['t'].min()), 't_max': float(filas['t'].max()),
+            'n_filas': int(len(filas)), 'reemplaza': list(reemplaza)}
+    with open(tmp / META_FILE, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp, destino)
+    return Segmento(destino)
+
+
+# ================= HISTORIAL =================
+class HistorialEstaciones:
+    """
+    Serie de tiempo del estado de cada estación (probabilidades por clase, riesgo
+    propagado, alertas y número de tweets), solo de agregar. Por tick se escribe una fila
+    por estación que recibió tweets o cuyo riesgo/alerta cambió; entre filas el estado se
+    mantiene, así que las consultas arrastran el último valor a los buckets vacíos.
+    """
+
+    def __init__(self, directorio, estaciones, clases, probs_iniciales, umbral_alerta, umbral_propagada,
+                 filas_por_segmento=FILAS_POR_SEGMENTO, filas_compactado=FILAS_COMPACTADO,
+                 delta_riesgo=DELTA_RIESGO, retencion_dias=RETENCION_DIAS):
+        self.directorio = Path(directorio)
+        # Un solo escritor: otro proceso con el mismo directorio lanza DirectorioOcupado
+        self._candado = bloquear_directorio(self.directorio)
+        self.estaciones = list(estaciones)
+        self.clases = [int(c) for c in clases]
+        self._indice = {e: i for i, e in enumerate(self.estaciones)}
+        self._columnas_falla = np.array([c != 0 for c in self.clases])
+        self.umbral_alerta = umbral_alerta
+        self.umbral_propagada = umbral_propagada
+        self.filas_por_segmento = filas_por_segmento
+        self.filas_compactado = filas_compactado
+        self.delta_riesgo = delta_riesgo
+        self.retencion_s = retencion_dias * 86400
+        self.dtype = _dtype_fila(len(self.clases))
+
+        self._lock = threading.Lock()
+        self._ejecutor = ThreadPoolExecutor(max_workers=1)  # Sellado y compactación fuera de la petición
+        self._pendientes = []  # (filas, archivo) ya selladas cuyo segmento aún no se escribe
+        self._fallidos = []    # Pendientes cuya escritura falló; se reintentan en el siguiente sellado
+
+        n = len(self.estaciones)
+        self._probs_iniciales = np.asarray(probs_iniciales, dtype=np.float32)
+        self._ultimas_probs = np.tile(self._probs_iniciales, (n, 1))
+        self._ultimo_riesgo = np.zeros(n, dtype=np.float32)
+        self._ultimos_flags = np.zeros(n, dtype=np.uint8)
+
+        self._segmentos = self._cargar_segmentos()
+        self._recuperar_pendientes()
+        self._recuperar_activo()
+
+    # ---------- arranque ----------
+    def _meta_actual(self):
+        return {'estaciones': self.estaciones, 'clases': self.clases}
+
+    def _cargar_segmentos(self):
+        segmentos = []
+        for ruta in sorted(self.directorio.glob(f"{PREFIJO_SEGMENTO}*")):
+            if ruta.name.endswith('.tmp'):
+                shutil.rmtree(ruta, ignore_errors=True)  # Escritura interrumpida
+            elif (ruta / META_FILE).exists():
+                segmentos.append(Segmento(ruta))
+        # Una compactación interrumpida deja el segmento fusionado y sus originales (y una
+        # caída justo después de publicar un pendiente, el segmento y el archivo pend_)
+        reemplazados = {nombre for s in segmentos for nombre in s.meta.get('reemplaza', [])}
+        for ruta in self.directorio.glob(f"{PREFIJO_PENDIENTE}*.bin"):
+            if ruta.name in reemplazados:
+                ruta.unlink(missing_ok=True)
+                ruta.with_suffix('.json').unlink(missing_ok=True)
+        for s in segmentos:
+            if s.ruta.name in reemplazados:
+                shutil.rmtree(s.ruta, ignore_errors=True)
+        return sorted((s for s in segmentos if s.ruta.name not in reemplazados), key=lambda s: s.t_min)
+
+    def _recuperar_pendientes(self):
+        """Escribe los segmentos sellados que no se alcanzaron a publicar antes de la caída"""
+        for ruta in sorted(self.directorio.glob(f"{PREFIJO_PENDIENTE}*.bin")):
+            with open(ruta.with_suffix('.json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            filas = np.fromfile(ruta, dtype=_dtype_fila(len(meta['clases'])))
+            if len(filas):
+                self._segmentos.append(_escribir_segmento(self.directorio, filas, meta, [ruta.name]))
+            ruta.unlink()
+            ruta.with_suffix('.json').unlink(missing_ok=True)
+        self._segmentos.sort(key=lambda s: s.t_min)
+
+    def _recuperar_activo(self):
+        ruta_meta = self.directorio / ACTIVO_META
+        ruta_bin = self.directorio / ACTIVO_FILE
+        filas = np.empty(0, dtype=self.dtype)
+        if ruta_meta.exists() and ruta_bin.exists():
+            with open(ruta_meta, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            dtype = _dtype_fila(len(meta['clases']))
+            crudo = np.fromfile(ruta_bin, dtype=np.uint8)
+            # Una fila a medio escribir al final (caída del proceso) se descarta
+            crudo = crudo[:len(crudo) - len(crudo) % dtype.itemsize]
+            anteriores = crudo.view(dtype)
+            if meta == self._meta_actual() and len(anteriores) < self.filas_por_segmento:
+                filas = anteriores.copy()
+            elif len(anteriores):
+                # Otra red, otras clases o un segmento lleno: se sella con su propia definición
+                self._segmentos.append(_escribir_segmento(self.directorio, anteriores.copy(), meta))
+
+        self._activo = np.empty(self.filas_por_segmento, dtype=self.dtype)
+        self._n = len(filas)
+        self._activo[:self._n] = filas
+        with open(ruta_meta, 'w', encoding='utf-8') as f:
+            json.dump(self._meta_actual(), f, ensure_ascii=False)
+        self._archivo = open(ruta_bin, 'wb')
+        self._archivo.write(self._activo[:self._n].tobytes())
+        self._archivo.flush()
+
+        # El estado de arranque (para el filtro por cambios) es la última fila de cada estación
+        if self._n:
+            estaciones = filas['estacion'][::-1]
+            unicas, posiciones = np.unique(estaciones, return_index=True)
+            ultimas = filas[self._n - 1 - posiciones]
+            self._ultimas_probs[unicas] = ultimas['probs']
+            self._ultimo_riesgo[unicas] = ultimas['riesgo']
+            self._ultimos_flags[unicas] = ultimas['flags']
+
+    # ---------- escritura ----------
+    def registrar_tick(self, t, tocadas, riesgo, alertas=None):
+        """
+        tocadas: {estacion: (probabilidades en el orden de `clases`, n_tweets)} del tick;
+        riesgo: vector de riesgo propagado alineado con `estaciones`;
+        alertas: {estacion: alertas críticas emitidas en el tick}.
+        """
+        alertas = alertas or {}
+        n = len(self.estaciones)
+        tweets = np.zeros(n, dtype=np.uint16)
+        n_alertas = np.zeros(n, dtype=np.uint16)
+        for estacion, (probs, n_tweets) in tocadas.items():
+            i = self._indice.get(estacion)
+            if i is not None:
+                self._ultimas_probs[i] = probs
+                tweets[i] = n_tweets
+        for estacion, conteo in alertas.items():
+            i = self._indice.get(estacion)
+            if i is not None:
+                n_alertas[i] = conteo
+
+        riesgo = np.asarray(riesgo, dtype=np.float32)
+        prob_falla = self._ultimas_probs[:, self._columnas_falla].max(axis=1, initial=0.0)
+        alerta = prob_falla > self.umbral_alerta
+        flags = (alerta * BIT_ALERTA | (~alerta & (riesgo > self.umbral_propagada)) * BIT_ALERTA_PROPAGADA).astype(np.uint8)
+
+        cambio = ((tweets > 0) | (n_alertas > 0) | (flags != self._ultimos_flags)
+                  | (np.abs(riesgo - self._ultimo_riesgo) >= self.delta_riesgo))
+        indices = np.flatnonzero(cambio)
+        if len(indices) == 0:
+            return 0
+
+        filas = np.empty(len(indices), dtype=self.dtype)
+        filas['t'] = t
+        filas['estacion'] = indices
+        filas['probs'] = self._ultimas_probs[indices]
+        filas['riesgo'] = riesgo[indices]
+        filas['flags'] = flags[indices]
+        filas['tweets'] = tweets[indices]
+        filas['alertas'] = n_alertas[indices]
+        self._ultimo_riesgo[indices] = riesgo[indices]
+        self._ultimos_flags[indices] = flags[indices]
+
+        self.registrar_filas(filas)
+        return len(filas)
+
+    def reiniciar(self, t):
+        """Todas las estaciones vuelven al estado inicial (una fila por estación en `t`)"""
+        n = len(self.estaciones)
+        self._ultimas_probs[:] = self._probs_iniciales
+        self._ultimo_riesgo[:] = 0.0
+        self._ultimos_flags[:] = 0
+        filas = np.zeros(n, dtype=self.dtype)
+        filas['t'] = t
+        filas['estacion'] = np.arange(n)
+        filas['probs'] = self._probs_iniciales
+        self.registrar_filas(filas)
+        return n
+
+    def registrar_filas(self, filas):
+        """Agrega filas al segmento activo; si se llena se sella y se sigue en uno nuevo"""
+        with self._lock:
+            while len(filas):
+                libres = self.filas_por_segmento - self._n
+                bloque = filas[:libres]
+                self._activo[self._n:self._n + len(bloque)] = bloque
+                self._n += len(bloque)
+                self._archivo.write(bloque.tobytes())
+                self._archivo.flush()
+                filas = filas[libres:]
+                if self._n >= self.filas_por_segmento:
+                    self._sellar()
+
+    def _sellar(self):
+        """
+        Cierra el segmento activo (con el lock tomado): activo.bin se renombra a un archivo
+        pend_ y se sigue en uno nuevo; el segmento se escribe y compacta en segundo plano y
+        el pend_ solo se borra cuando ya está publicado, así que una caída no pierde filas.
+        """
+        if self._n == 0:
+            return
+        filas = self._activo[:self._n].copy()
+        pendiente = self.directorio / f"{PREFIJO_PENDIENTE}{int(filas['t'].min() * 1000):015d}_{len(filas)}.bin"
+        with open(pendiente.with_suffix('.json'), 'w', encoding='utf-8') as f:
+            json.dump(self._meta_actual(), f, ensure_ascii=False)
+        self._archivo.close()
+        os.replace(self.directorio / ACTIVO_FILE, pendiente)
+        self._archivo = open(self.directorio / ACTIVO_FILE, 'wb')
+        self._n = 0
+
+        self._pendientes.append((filas, pendiente))
+        reintentos, self._fallidos = self._fallidos, []
+        for filas_pendientes, archivo in [(filas, pendiente)] + reintentos:
+            self._ejecutor.submit(self._publicar, filas_pendientes, archivo)
+
+    def _publicar(self, filas, pendiente):
+        try:
+            segmento = _escribir_segmento(self.directorio, filas, self._meta_actual(), [pendiente.name])
+        except Exception as e:
+            # Las filas siguen en memoria (consultables) y en el pend_; se reintenta en el
+            # siguiente sellado o al arrancar
+            print(f"❌ No se pudo sellar el segmento del historial (se reintentará): {e}")
+            with self._lock:
+                self._fallidos.append((filas, pendiente))
+            return
+        with self._lock:
+            self._segmentos.append(segmento)
+            self._pendientes = [p for p in self._pendientes if p[0] is not filas]
+        pendiente.unlink(missing_ok=True)
+        pendiente.with_suffix('.json').unlink(missing_ok=True)
+        self.compactar()
+
+    def _nivel(self, segmento):
+        return int(math.log(max(segmento.n_filas / self.filas_por_segmento, 1.0), FACTOR_COMPACTACION))
+
+    def compactar(self):
+        """
+        Compactación por niveles: cada vez que hay FACTOR_COMPACTACION segmentos
+        consecutivos del mismo nivel (y la misma definición) se fusionan en uno, sin pasar
+        de `filas_compactado`. Así cada fila se reescribe O(log n) veces. También elimina
+        los segmentos que salieron de la retención.
+        """
+        while True:
+            with self._lock:
+                segmentos = list(self._segmentos)
+            if not segmentos:
+                return
+            limite = max(s.t_max for s in segmentos) - self.retencion_s
+            vencidos = [s for s in segmentos if s.t_max < limite]
+            vigentes = [s for s in segmentos if s.t_max >= limite]
+
+            grupo = None
+            for k in range(len(vigentes) - FACTOR_COMPACTACION + 1):
+                candidatos = vigentes[k:k + FACTOR_COMPACTACION]
+                primero = candidatos[0]
+                if (all(self._nivel(c) == self._nivel(primero) for c in candidatos)
+                        and all(c.meta['estaciones'] == primero.meta['estaciones']
+                                and c.meta['clases'] == primero.meta['clases'] for c in candidatos)
+                        and sum(c.n_filas for c in candidatos) <= self.filas_compactado):
+                    grupo = candidatos
+                    break
+
+            if grupo is None and not vencidos:
+                return
+            nuevos = []
+            if grupo is not None:
+                filas = np.concatenate([self._filas_de(c) for c in grupo])
+                meta = {'estaciones': grupo[0].meta['estaciones'], 'clases': grupo[0].meta['clases']}
+                nuevos.append(_escribir_segmento(self.directorio, filas, meta, [c.ruta.name for c in grupo]))
+            eliminados = vencidos + (grupo or [])
+            with self._lock:
+                self._segmentos = sorted([s for s in self._segmentos if s not in eliminados] + nuevos,
+                                         key=lambda s: s.t_min)
+            for s in eliminados:
+                shutil.rmtree(s.ruta, ignore_errors=True)
+
+    def _filas_de(self, segmento):
+        cols = segmento.columnas()
+        filas = np.empty(segmento.n_filas, dtype=_dtype_fila(len(segmento.meta['clases'])))
+        for c in COLUMNAS:
+            filas[c] = cols[c]
+        return filas
+
+    def cerrar(self):
+        with self._lock:
+            self._archivo.close()
+            reintentos, self._fallidos = self._fallidos, []
+            for filas, pendiente in reintentos:
+                self._ejecutor.submit(self._publicar, filas, pendiente)
+        self._ejecutor.shutdown(wait=True)
+        self._candado.close()
+
+    # ---------- consultas ----------
+    def consultar(self, estaciones, desde, hasta, bucket_s, con_probabilidades=False):
+        """
+        Serie reducida por buckets de `bucket_s` segundos para cada estación: min/max/media
+        del riesgo y de la probabilidad de falla, media por clase, suma de tweets y
+        alertas, y si hubo alerta. Los buckets sin filas conservan el último estado
+        (entre filas el estado no cambió). La media por clase solo con `con_probabilidades`.
+        """
+        n_buckets = max(1, math.ceil((hasta - desde) / bucket_s))
+        with self._lock:
+            segmentos = [s for s in self._segmentos]
+            memoria = [filas for filas, _ in self._pendientes] + [self._activo[:self._n]]
+        # Las filas en memoria se filtran por tiempo una sola vez para todas las estaciones
+        en_rango = [f[(f['t'] >= desde) & (f['t'] <= hasta)] for f in memoria]
+        antes = [f[f['t'] < desde] for f in memoria]
+
+        resultado = {}
+        for estacion in estaciones:
+            filas = self._filas_estacion(estacion, desde, hasta, segmentos, en_rango)
+            semilla = self._ultima_antes(estacion, desde, segmentos, antes)
+            resultado[estacion] = reducir_por_buckets(filas, semilla, desde, bucket_s, n_buckets, self.clases,
+                                                      con_probabilidades)
+        return resultado
+
+    def _filas_estacion(self, estacion, desde, hasta, segmentos, en_rango):
+        partes = []
+        for s in segmentos:
+            if s.t_max < desde or s.t_min > hasta:
+                continue
+            a, b = s.rango(estacion, desde, hasta)
+            if b > a:
+                cols = s.columnas()
+                partes.append(self._columnas_consulta({c: cols[c][a:b] for c in COLUMNAS}, s.meta['clases']))
+        i = self._indice.get(estacion)
+        if i is not None:
+            for filas in en_rango:
+                m = filas['estacion'] == i
+                if m.any():
+                    partes.append(self._columnas_consulta({c: filas[c][m] for c in COLUMNAS}, self.clases))
+        if not partes:
+            return None
+        columnas = {c: np.concatenate([p[c] for p in partes]) for c in partes[0]}
+        orden = np.argsort(columnas['t'], kind='stable')
+        return {c: v[orden] for c, v in columnas.items()}
+
+    def _ultima_antes(self, estacion, desde, segmentos, antes):
+        """Última fila de la estación antes de `desde` (el valor que se arrastra al rango)"""
+        mejor = None
+        i = self._indice.get(estacion)
+        if i is not None:
+            for filas in antes:
+                m = np.flatnonzero(filas['estacion'] == i)
+                if len(m) and (mejor is None or filas['t'][m[-1]] > mejor['t'][0]):
+                    mejor = self._columnas_consulta({c: filas[c][m[-1:]] for c in COLUMNAS}, self.clases)
+        for s in reversed(segmentos):
+            if s.t_min >= desde or (mejor is not None and s.t_max <= mejor['t'][0]):
+                continue
+            k = s.ultima_antes(estacion, desde)
+            if k is not None:
+                cols = s.columnas()
+                if mejor is None or cols['t'][k] > mejor['t'][0]:
+                    mejor = self._columnas_consulta({c: cols[c][k:k + 1] for c in COLUMNAS}, s.meta['clases'])
+        return mejor
+
+    def _columnas_consulta(self, cols, clases):
+        falla = np.array([c != 0 for c in clases])
+        probs = np.asarray(cols['probs'], dtype=np.float32)
+        if clases == self.clases:
+            por_clase = probs
+        else:
+            # Segmentos con otras clases (modelo anterior) no aportan probabilidades por clase
+            por_clase = np.full((len(probs), len(self.clases)), np.nan, dtype=np.float32)
+        return {
+            't': np.asarray(cols['t']), 'riesgo': np.asarray(cols['riesgo'], dtype=np.float32),
+            'prob_falla': probs[:, falla].max(axis=1, initial=0.0), 'probs': por_clase,
+            'flags': np.asarray(cols['flags']), 'tweets': np.asarray(cols['tweets']),
+            'alertas': np.asarray(cols['alertas']),
+        }
+
+
+# ================= REDUCCIÓN =================
+def reducir_por_buckets(filas, semilla, desde, bucket_s, n_buckets, clases, con_probabilidades=False):
+    """Agregados por bucket (vectorizado con reduceat) y arrastre del último valor"""
+    tiempos = [desde + i * bucket_s for i in range(n_buckets)]
+    n_clases = len(clases)
+    minimo = {c: np.full(n_buckets, np.nan) for c in ('riesgo', 'prob_falla')}
+    maximo = {c: np.full(n_buckets, np.nan) for c in ('riesgo', 'prob_falla')}
+    media = {c: np.full(n_buckets, np.nan) for c in ('riesgo', 'prob_falla')}
+    media_probs = np.full((n_buckets, n_clases), np.nan)
+    ultimo = {c: np.full(n_buckets, np.nan) for c in ('riesgo', 'prob_falla')}
+    ultimas_probs = np.full((n_buckets, n_clases), np.nan)
+    tweets = np.zeros(n_buckets, dtype=np.int64)
+    alertas = np.zeros(n_buckets, dtype=np.int64)
+    alerta = np.zeros(n_buckets, dtype=bool)
+    alerta_propagada = np.zeros(n_buckets, dtype=bool)
+    ultimos_flags = np.zeros(n_buckets, dtype=np.uint8)
+    presente = np.zeros(n_buckets, dtype=bool)
+
+    if filas is not None and len(filas['t']):
+        bucket = np.minimum(((filas['t'] - desde) // bucket_s).astype(np.int64), n_buckets - 1)
+        inicios = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        ids = bucket[inicios]
+        conteo = np.diff(np.r_[inicios, len(bucket)])
+        finales = np.r_[inicios[1:], len(bucket)] - 1
+        presente[ids] = True
+        for c in ('riesgo', 'prob_falla'):
+            valores = filas[c].astype(np.float64)
+            minimo[c][ids] = np.minimum.reduceat(valores, inicios)
+            maximo[c][ids] = np.maximum.reduceat(valores, inicios)
+            media[c][ids] = np.add.reduceat(valores, inicios) / conteo
+            ultimo[c][ids] = valores[finales]
+        media_probs[ids] = np.add.reduceat(filas['probs'].astype(np.float64), inicios, axis=0) / conteo[:, None]
+        ultimas_probs[ids] = filas['probs'][finales]
+        tweets[ids] = np.add.reduceat(filas['tweets'].astype(np.int64), inicios)
+        alertas[ids] = np.add.reduceat(filas['alertas'].astype(np.int64), inicios)
+        flags = np.bitwise_or.reduceat(filas['flags'], inicios)
+        alerta[ids] = (flags & BIT_ALERTA) > 0
+        alerta_propagada[ids] = (flags & BIT_ALERTA_PROPAGADA) > 0
+        ultimos_flags[ids] = filas['flags'][finales]
+
+    # Arrastre: cada bucket vacío toma el último valor del bucket con datos anterior
+    # (o de la semilla, la última fila antes del rango)
+    origen = np.where(presente, np.arange(n_buckets), -1)
+    origen = np.maximum.accumulate(origen)
+    vacios = ~presente
+    for c in ('riesgo', 'prob_falla'):
+        arrastre = np.where(origen >= 0, ultimo[c][np.maximum(origen, 0)], np.nan)
+        if semilla is not None:
+            arrastre = np.where(origen >= 0, arrastre, float(semilla[c][0]))
+        for serie in (minimo[c], maximo[c], media[c]):
+            serie[vacios] = arrastre[vacios]
+    arrastre_probs = np.where((origen >= 0)[:, None], ultimas_probs[np.maximum(origen, 0)], np.nan)
+    if semilla is not None:
+        arrastre_probs = np.where((origen >= 0)[:, None], arrastre_probs, semilla['probs'][0])
+    media_probs[vacios] = arrastre_probs[vacios]
+    # Las alertas también se arrastran: un bucket vacío sigue en alerta si la última fila lo estaba
+    arrastre_flags = np.where(origen >= 0, ultimos_flags[np.maximum(origen, 0)], 0)
+    if semilla is not None:
+        arrastre_flags = np.where(origen >= 0, arrastre_flags, int(semilla['flags'][0]))
+    alerta[vacios] = (arrastre_flags[vacios] & BIT_ALERTA) > 0
+    alerta_propagada[vacios] = (arrastre_flags[vacios] & BIT_ALERTA_PROPAGADA) > 0
+
+    def lista(valores):
+        valores = np.round(valores, 3)
+        nulos = np.isnan(valores)
+        if not nulos.any():
+            return valores.tolist()
+        return [None if nulo else v for v, nulo in zip(valores.tolist(), nulos.tolist())]
+
+    return {
+        't': tiempos,
+        'riesgo': {'min': lista(minimo['riesgo']), 'max': lista(maximo['riesgo']), 'media': lista(media['riesgo'])},
+        'prob_falla': {'min': lista(minimo['prob_falla']), 'max': lista(maximo['prob_falla']),
+                       'media': lista(media['prob_falla'])},
+        'probabilidades': ({clase: lista(media_probs[:, j]) for j, clase in enumerate(clases)}
+                           if con_probabilidades else None),
+        'tweets': tweets.tolist(),
+        'alertas_criticas': alertas.tolist(),
+        'alerta': alerta.tolist(),
+        'alerta_propagada': alerta_propagada.tolist(),
+    }
@@ -1,16 +1,34 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import Dict, List, Optional
-import random
+import asyncio
+import time
+import subprocess
+import sys
+import uuid
+from collections import OrderedDict
 from datetime import datetime
-from sentence_transformers import SentenceTransformer
-from catboost import CatBoostClassifier
-import json
-import pandas as pd
 import os
 from pathlib import Path
+from src.api.alert_dispatcher import DespachadorAlertas, SinkArchivo, SinkColaLocal, SinkWebhook
+from src.api.alert_explainer import ExplicadorAlertas
+from src.api.dir_lock import DirectorioOcupado
+from src.api.embedding_model import ModeloEmbeddings, configurar_hilos, memoria_proceso, precargar
+from src.api.history_store import HistorialEstaciones
+from src.api.model_registry import cargar_modelo_activo, firma_artefactos, rutas_artefactos
+from src.api.session_store import AlmacenSesiones, SesionSimulacion, riesgo_observado
+from src.api.state_wal import BitacoraEstado
+from src.data_generation.phrase_bank import clasificar_por_palabras_clave
 from src.data_generation.realistic_tweet_generator import generar_tweet_simulado
+from src.features.context_provider import FuenteArchivo, ProveedorContexto
+from src.features.line_topology import Topologia
+from src.features.metro_network import cargar_red, lineas_desde_env
+from src.features.near_duplicates import VentanaDuplicados, simhash
+from src.features.station_geo import IndiceEstacionesGeo, coordenadas_de
+from src.features.station_matcher import ReconocedorEstaciones, canonizador_estaciones
+from src.training.feedback_log import contar_feedback, leer_cursor, registrar_feedback
 
 # ================= PATH CONFIGURATION =================
 # Get the project root directory (two levels up from this file)
@@ -27,26 +45,45 @@ def get_abs_path(relative_path: str) -> Path:
 # ================= MODELOS PYDANTIC =================
 class EstacionEstado(BaseModel):
     estacion: str
+    lineas: List[str]  # Más de una en estaciones de transbordo
     hora: str
     probabilidades: Dict[int, float]  # {clase_id: probabilidad}
     no_falla_prob: float
     falla_mas_probable: str
     falla_mas_probable_prob: float
     alerta: bool  # Si supera el umbral
+    riesgo_propagado: float  # Riesgo propio o heredado de estaciones vecinas (0-100)
+    alerta_propagada: bool  # Sin alerta propia, pero una falla cercana puede extenderse
 
 class TweetProcesado(BaseModel):
+    id: str  # Referencia para enviar feedback sobre esta predicción
     texto: str
     estacion: str
+    confianza_estacion: float  # 0 si no se pudo identificar la estación
+    origen_estacion: Optional[str] = None  # 'texto', 'geo' (ubicación del tweet) o None
     clase_predicha: str
     probabilidad_clase: float
     timestamp: str
+    etapa: str  # Etapa de la cascada que decidió: 'prefiltro', 'deteccion' o 'clasificacion'
+    prob_falla_deteccion: Optional[float] = None  # Probabilidad de falla del modelo binario
+    multiplicidad: int = 1  # Copias del mismo contenido vistas en la ventana reciente (incluyéndolo)
+    duplicado: bool = False  # True si reutilizó la predicción de una copia anterior (mismo id)
 
 class AlertaCritica(BaseModel):
+    id: str  # Mismo id que el tweet que originó la alerta
     estacion: str
     tipo_falla: str
     certeza: float
     tweet: str
     timestamp: str
+    prob_falla_deteccion: Optional[float] = None
+
+class SesionRequest(BaseModel):
+    semilla: Optional[int] = None  # Misma semilla = misma secuencia de tweets simulados
+
+class FeedbackRequest(BaseModel):
+    id: str  # id de un TweetProcesado o AlertaCritica
+    clase_correcta: str  # Clase confirmada o corregida por el operador
 
 class IteracionResponse(BaseModel):
     timestamp: str
@@ -54,6 +91,9 @@ class IteracionResponse(BaseModel):
     estados_estaciones: List[EstacionEstado]
     alertas_criticas: List[AlertaCritica]
     numero_tweets: int
+    version_modelo: str
+    tweets_por_etapa: Dict[str, int]
+    sesion: Optional[str] = None  # None = simulación principal
 
 # ================= CONFIG =================
 # Configuration from environment variables with defaults
@@ -66,23 +106,89 @@ N_TWEETS = (
     int(get_env("MAX_TWEETS_PER_ITERATION", "3"))
 )
 EMBEDDING_MODEL_NAME = get_env("EMBEDDING_MODEL", "xlm-roberta-base")
+EMBEDDINGS_PRECISION = get_env("EMBEDDINGS_PRECISION", "fp32")  # fp32, bf16 o int8
+EMBEDDINGS_PRECARGA = get_env("EMBEDDINGS_PRECARGA", "false").lower() == "true"  # Cargar antes del fork (gunicorn --preload)
+EMBEDDINGS_HILOS = int(get_env("EMBEDDINGS_HILOS", "0"))  # Hilos de torch por worker (0 = uno por núcleo)
 
 # Model and data paths
 MODEL_CLASIFICACION_PATH = get_abs_path(get_env("MODEL_CLASIFICACION_PATH", "models/modelo_clasificacion_falla.cbm"))
 MODEL_DETECCION_PATH = get_abs_path(get_env("MODEL_DETECCION_PATH", "models/modelo_deteccion_falla.cbm"))
 LABEL_ENCODING_PATH = get_abs_path(get_env("LABEL_ENCODING_PATH", "data/processed/label_encoding.json"))
+PROYECCION_EMBEDDINGS_PATH = get_abs_path(get_env("PROYECCION_EMBEDDINGS_PATH", "models/proyeccion_embeddings.npz"))
+
+# Cascada: el modelo binario filtra y el multiclase solo corre en tweets marcados como falla
+CASCADA_ACTIVA = get_env("CASCADA_ACTIVA", "true").lower() == "true"
+UMBRAL_DETECCION = float(get_env("UMBRAL_DETECCION", "50.0"))  # % de probabilidad de falla para pasar a clasificación
+CASCADA_PREFILTRO = get_env("CASCADA_PREFILTRO", "false").lower() == "true"  # Descarta sin embedding tweets sin palabras clave de falla
+CLASE_SIN_FALLA = "Sin falla"
+ESTACION_DESCONOCIDA = "Sin estación"  # Tweets sin una estación reconocible (no actualizan el mapa)
+GEO_MAX_DISTANCIA_M = float(get_env("GEO_MAX_DISTANCIA_M", "1000"))  # Radio para asignar un tweet geolocalizado
+
+# Contexto (clima/tráfico) por estación y hora del día, en lugar de valores aleatorios por tweet
+CONTEXTO_PATH = get_abs_path(get_env("CONTEXTO_PATH", "data/processed/features.json"))
+CONTEXTO_TTL_S = float(get_env("CONTEXTO_TTL_S", "300"))  # Cada cuánto se revisa si la fuente cambió
+
+RUTAS_ARTEFACTOS = rutas_artefactos(MODEL_CLASIFICACION_PATH, LABEL_ENCODING_PATH, PROYECCION_EMBEDDINGS_PATH,
+                                    MODEL_DETECCION_PATH if CASCADA_ACTIVA else None)
+
+# Feedback y reentrenamiento incremental
+PREDICCIONES_RECIENTES_MAX = int(get_env("PREDICCIONES_RECIENTES_MAX", "2000"))  # Predicciones que aceptan feedback
+FEEDBACK_MIN_REENTRENAMIENTO = int(get_env("FEEDBACK_MIN_REENTRENAMIENTO", "50"))  # 0 = no lanzar automáticamente
+REENTRENAMIENTO_LOG_PATH = get_abs_path("logs/reentrenamiento.log")
+
+# Casi duplicados (retweets, copias con otro emoji o usuario): reutilizan embedding y predicción
+DEDUP_ACTIVO = get_env("DEDUP_ACTIVO", "true").lower() == "true"
+DEDUP_VENTANA = int(get_env("DEDUP_VENTANA", "1000"))  # Huellas recientes que se conservan
+DEDUP_MAX_SEGUNDOS = float(get_env("DEDUP_MAX_SEGUNDOS", "900"))  # Antigüedad máxima de una huella
+DEDUP_MAX_DISTANCIA = int(get_env("DEDUP_MAX_DISTANCIA", "4"))  # Bits distintos (de 64) para considerar copia
+
+# Propagación de riesgo a estaciones vecinas (un paso de difusión por iteración)
+RIESGO_DIFUSION = float(get_env("RIESGO_DIFUSION", "0.5"))
+RIESGO_DECAIMIENTO = float(get_env("RIESGO_DECAIMIENTO", "0.8"))
+UMBRAL_ALERTA_PROPAGADA = float(get_env("UMBRAL_ALERTA_PROPAGADA", "30.0"))
+
+# Historial de riesgo por estación (serie de tiempo en disco para /historial)
+HISTORIAL_ACTIVO = get_env("HISTORIAL_ACTIVO", "true").lower() == "true"
+HISTORIAL_DIR = get_abs_path(get_env("HISTORIAL_DIR", "data/history"))
+HISTORIAL_MAX_BUCKETS = int(get_env("HISTORIAL_MAX_BUCKETS", "1000"))  # Puntos máximos por estación en /historial
+
+# Estado persistente: write-ahead log + snapshots para no perder el estado al reiniciar
+ESTADO_PERSISTENTE = get_env("ESTADO_PERSISTENTE", "true").lower() == "true"
+ESTADO_DIR = get_abs_path(get_env("ESTADO_DIR", "data/state"))
+ESTADO_SNAPSHOT_CADA = int(get_env("ESTADO_SNAPSHOT_CADA", "1000"))  # Eventos entre snapshots (cota del arranque)
+ESTADO_FSYNC = get_env("ESTADO_FSYNC", "false").lower() == "true"  # fsync por evento (sobrevive a cortes de energía)
+
+# Despacho de alertas críticas a sistemas externos (en segundo plano, con lotes y reintentos)
+ALERTAS_WEBHOOK_URL = get_env("ALERTAS_WEBHOOK_URL", "")  # Vacío = sin webhook
+ALERTAS_ARCHIVO = get_env("ALERTAS_ARCHIVO", "")  # JSONL; vacío = sin archivo
+ALERTAS_COLA_LOCAL = get_env("ALERTAS_COLA_LOCAL", "true").lower() == "true"  # Cola consumible vía GET /alertas/cola
+ALERTAS_COOLDOWN_S = float(get_env("ALERTAS_COOLDOWN_S", "300"))  # Misma (estación, falla) a lo más una vez por ventana
+ALERTAS_LOTE = int(get_env("ALERTAS_LOTE", "50"))
+ALERTAS_ESPERA_LOTE_S = float(get_env("ALERTAS_ESPERA_LOTE_S", "1.0"))
+ALERTAS_MAX_COLA = int(get_env("ALERTAS_MAX_COLA", "1000"))
+ALERTAS_REINTENTOS = int(get_env("ALERTAS_REINTENTOS", "5"))
+
+# Explicaciones SHAP de alertas (bajo demanda, en un hilo aparte)
+EXPLICACIONES_MAX_PENDIENTES = int(get_env("EXPLICACIONES_MAX_PENDIENTES", "500"))  # Alertas recientes que se pueden explicar
+EXPLICACIONES_MAX_CACHE = int(get_env("EXPLICACIONES_MAX_CACHE", "2000"))
+EXPLICACIONES_TOP = int(get_env("EXPLICACIONES_TOP", "8"))  # Features (y grupo de embedding) a reportar
 
-estaciones_L1 = [
-    "Observatorio", "Tacubaya", "Juanacatlán", "Chapultepec", "Sevilla",
-    "Insurgentes", "Cuauhtémoc", "Balderas", "Salto del Agua", "Isabel la Católica",
-    "Pino Suárez", "Merced", "Candelaria", "San Lázaro", "Moctezuma", "Balbuena",
-    "Boulevard Puerto Aéreo", "Gómez Farías", "Zaragoza", "Pantitlán"
-]
+# Sesiones de simulación independientes (what-if); la simulación principal no expira
+SESIONES_MAX = int(get_env("SESIONES_MAX", "100"))
+SESIONES_MAX_MB = float(get_env("SESIONES_MAX_MB", "256"))  # Memoria estimada total de las sesiones
+SESIONES_INACTIVIDAD_S = float(get_env("SESIONES_INACTIVIDAD_S", "1800"))  # Sin uso por más de esto se descartan
+
+# Recarga en caliente: segundos entre revisiones de models/ (0 = solo vía /admin/recargar-modelo)
+MODEL_RELOAD_INTERVAL = float(get_env("MODEL_RELOAD_INTERVAL", "10"))
+
+# Red del Metro (definición compartida); RED_LINEAS limita las líneas simuladas
+RED_LINEAS = lineas_desde_env(get_env("RED_LINEAS", ""))
+red = cargar_red(RED_LINEAS)
 
 # ================= VARIABLES GLOBALES =================
 app = FastAPI(
     title="API Simulación Metro CDMX",
-    description="API para simular y clasificar tweets del Metro CDMX Línea 1",
+    description="API para simular y clasificar tweets de la red del Metro CDMX",
     version="1.0.0"
 )
 
@@ -96,14 +202,34 @@ app.add_middleware(
 )
 
 # Variables globales para modelos y estado
-model_cb = None
-embed_model = None
-label_mapping = {}
-estatus_estaciones = {}
+# modelo_activo agrupa modelo CatBoost, mapeo de etiquetas y proyección; se reemplaza
+# completo en cada recarga (una sola asignación), nunca se modifica en sitio.
+modelo_activo = None
+# Con EMBEDDINGS_PRECARGA el modelo se carga al importar el módulo, en el proceso maestro;
+# los workers lo heredan al hacer fork y comparten sus páginas (copy-on-write)
+embed_model = precargar(EMBEDDING_MODEL_NAME, EMBEDDINGS_PRECISION) if EMBEDDINGS_PRECARGA else None
+reconocedor_estaciones = None
+indice_geo = None
+proveedor_contexto = None
+topologia = None
+sesion_principal = None  # La simulación sin id de sesión: persistente (WAL) y con historial
+sesiones = None  # Sesiones what-if, en memoria
+historial = None
+bitacora_estado = None
+despachador_alertas = None
+recarga_lock = asyncio.Lock()
+ultimo_error_recarga = None
+firma_fallida = None  # Artefactos que no pasaron la validación (no se reintentan hasta que cambien)
+predicciones_recientes = OrderedDict()  # id -> features usadas en la predicción
+feedback_pendiente = 0  # Feedback que ningún reentrenamiento ha consumido (se recalcula desde el cursor)
+proceso_reentrenamiento = None
+ultimo_codigo_reentrenamiento = None  # Código de salida del último reentrenamiento terminado
+explicador_alertas = ExplicadorAlertas(EXPLICACIONES_MAX_PENDIENTES, EXPLICACIONES_MAX_CACHE, EXPLICACIONES_TOP)
 
 # ================= FUNCIONES AUXILIARES =================
 def get_initial_probs():
     """Inicializa probabilidades para una estación"""
+    label_mapping = modelo_activo.label_mapping
     initial_probs = {i: 0.0 for i in label_mapping.keys()}
     if 0 in initial_probs:
         initial_probs[0] = 100.0
@@ -114,66 +240,379 @@ def get_initial_probs():
     initial_probs['hora'] = '-'
     return initial_probs
 
+def crear_despachador():
+    """Despachador con los sinks configurados (None si no hay ninguno)"""
+    sinks = []
+    if ALERTAS_WEBHOOK_URL:
+        sinks.append(SinkWebhook(ALERTAS_WEBHOOK_URL))
+    if ALERTAS_ARCHIVO:
+        sinks.append(SinkArchivo(get_abs_path(ALERTAS_ARCHIVO)))
+    if ALERTAS_COLA_LOCAL:
+        sinks.append(SinkColaLocal(ALERTAS_MAX_COLA))
+    if not sinks:
+        return None
+    return DespachadorAlertas(sinks, ALERTAS_MAX_COLA, ALERTAS_LOTE, ALERTAS_ESPERA_LOTE_S,
+                              ALERTAS_COOLDOWN_S, ALERTAS_REINTENTOS)
+
+def crear_sesion(sesion_id, semilla=None):
+    """Simulación con estado propio; la topología y los modelos son compartidos"""
+    return SesionSimulacion(sesion_id, red, topologia, get_initial_probs,
+                            VentanaDuplicados(DEDUP_VENTANA, DEDUP_MAX_DISTANCIA, DEDUP_MAX_SEGUNDOS),
+                            RIESGO_DIFUSION, RIESGO_DECAIMIENTO, semilla)
+
 def inicializar_estaciones():
-    """Inicializa el estado de todas las estaciones"""
-    global estatus_estaciones
-    estatus_estaciones = {est: get_initial_probs() for est in estaciones_L1}
+    """Reinicia el estado de todas las estaciones en todas las simulaciones"""
+    sesion_principal.reiniciar()
+    reiniciar_historial()
+    for sesion in sesiones:
+        sesion.reiniciar()
+
+def obtener_sesion(sesion_id):
+    """Sesión pedida (None = principal); 404 si no existe o ya se descartó por inactividad"""
+    if sesion_id is None:
+        return sesion_principal
+    sesion = sesiones.obtener(sesion_id)
+    if sesion is None:
+        raise HTTPException(status_code=404, detail=f"Sesión no encontrada o expirada: '{sesion_id}'")
+    return sesion
+
+def seleccionar_estaciones(linea=None, estacion=None):
+    """Estaciones pedidas por los filtros ('1,3' / 'Balderas,Zócalo'); 404 si alguna no existe"""
+    try:
+        return red.estaciones_de(lineas_desde_env(linea), lineas_desde_env(estacion))
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+
+def construir_estados(sesion, estaciones, label_mapping):
+    """EstacionEstado de las estaciones seleccionadas (el costo depende solo de la selección)"""
+    estados = []
+    for estacion in estaciones:
+        datos = sesion.estado_estacion(estacion)
+
+        # Probabilidad de No Falla (clase 0)
+        prob_no_falla = datos.get(0, 0.0)
+
+        # Encontrar la falla más probable (excluyendo clase 0)
+        max_falla_prob = 0.0
+        max_falla_nombre = "N/A"
+
+        for class_idx in label_mapping.keys():
+            if class_idx != 0:
+                prob = datos.get(class_idx, 0.0)
+                if prob > max_falla_prob:
+                    max_falla_prob = prob
+                    max_falla_nombre = label_mapping[class_idx]
+
+        # Determinar si hay alerta
+        tiene_alerta = max_falla_prob > UMBRAL_ALERTA
+        riesgo_propagado = sesion.propagador.riesgo_de(estacion)
+
+        # Extraer solo las probabilidades (sin 'hora')
+        probabilidades_limpias = {k: v for k, v in datos.items() if k != 'hora'}
+
+        estados.append(EstacionEstado(
+            estacion=estacion,
+            lineas=red.lineas_de(estacion),
+            hora=datos['hora'],
+            probabilidades=probabilidades_limpias,
+            no_falla_prob=prob_no_falla,
+            falla_mas_probable=max_falla_nombre,
+            falla_mas_probable_prob=max_falla_prob,
+            alerta=tiene_alerta,
+            riesgo_propagado=riesgo_propagado,
+            alerta_propagada=not tiene_alerta and riesgo_propagado > UMBRAL_ALERTA_PROPAGADA
+        ))
+    return estados
+
+def abrir_historial():
+    """(Re)abre el historial con las clases del modelo activo (un cambio de clases sella el segmento)"""
+    global historial
+    if not HISTORIAL_ACTIVO:
+        return
+    if historial is not None:
+        historial.cerrar()
+        historial = None
+    clases = sorted(modelo_activo.label_mapping)
+    iniciales = get_initial_probs()
+    try:
+        historial = HistorialEstaciones(
+            HISTORIAL_DIR, topologia.estaciones, clases, [iniciales[c] for c in clases],
+            UMBRAL_ALERTA, UMBRAL_ALERTA_PROPAGADA
+        )
+    except DirectorioOcupado as e:
+        # Otro worker ya escribe el historial: este sigue sin historial
+        print(f"⚠️ Historial desactivado en el worker {os.getpid()}: {e}")
+
+def registrar_historial(conteo_tweets, alertas_criticas):
+    """Agrega al historial el tick actual (estaciones con tweets o cuyo riesgo cambió)"""
+    if historial is None:
+        return
+    tocadas = {}
+    for estacion, n_tweets in conteo_tweets.items():
+        estado = sesion_principal.estado_estacion(estacion)
+        if estado is not None:
+            tocadas[estacion] = ([estado[c] for c in historial.clases], n_tweets)
+    alertas = {}
+    for alerta in alertas_criticas:
+        alertas[alerta.estacion] = alertas.get(alerta.estacion, 0) + 1
+    historial.registrar_tick(time.time(), tocadas, sesion_principal.propagador.riesgo, alertas)
+
+def reiniciar_historial():
+    """Registra en el historial que todas las estaciones volvieron a su estado inicial"""
+    if historial is not None:
+        historial.reiniciar(time.time())
+
+def capturar_estado():
+    """Estado completo de la simulación principal para un snapshot"""
+    return sesion_principal.capturar_estado(sorted(modelo_activo.label_mapping))
+
+def registrar_evento(evento):
+    """Escribe un evento en el WAL y toma un snapshot cuando ya se acumularon suficientes"""
+    if bitacora_estado is not None and bitacora_estado.registrar(evento):
+        bitacora_estado.snapshot(capturar_estado())
+
+def registrar_iteracion(actualizadas):
+    """Evento de una iteración: estaciones cuyo estado cambió (el paso de difusión está implícito)"""
+    if bitacora_estado is None:
+        return
+    clases = sorted(modelo_activo.label_mapping)
+    cambios = {}
+    for est in actualizadas:
+        estado = sesion_principal.estado_estacion(est)
+        cambios[est] = {'p': [estado[c] for c in clases], 'hora': estado['hora']}
+    registrar_evento({'tipo': 'iteracion', 'estaciones': cambios})
+
+def restaurar_estado():
+    """Al arrancar: último snapshot + eventos posteriores del WAL (cuesta a lo más ESTADO_SNAPSHOT_CADA eventos)"""
+    global bitacora_estado
+    if not ESTADO_PERSISTENTE:
+        return
+    try:
+        bitacora_estado = BitacoraEstado(ESTADO_DIR, ESTADO_SNAPSHOT_CADA, ESTADO_FSYNC)
+    except DirectorioOcupado as e:
+        # Otro worker ya escribe el WAL: este arranca con estado en memoria, sin persistir
+        print(f"⚠️ Estado persistente desactivado en el worker {os.getpid()}: {e}")
+        return
+    inicio = time.perf_counter()
+    snapshot, eventos = bitacora_estado.recuperar()
+    clases = sorted(modelo_activo.label_mapping)
+    if snapshot is None and not eventos:
+        print(f"✅ Estado persistente en {ESTADO_DIR} (sin estado previo)")
+        bitacora_estado.snapshot(capturar_estado())
+        return
+    if snapshot is None or snapshot['clases'] != clases:
+        # Probabilidades de otro conjunto de clases: no se pueden reinterpretar
+        print("⚠️ El estado guardado es de otro mapeo de clases; se inicia desde cero")
+        bitacora_estado.snapshot(capturar_estado())
+        return
+
+    sesion_principal.restaurar(snapshot, eventos, clases)
+    print(f"✅ Estado restaurado: snapshot + {len(eventos)} eventos en {(time.perf_counter() - inicio) * 1e3:.0f} ms")
+
+def _instante(valor, nombre):
+    """'2024-05-01 13:00:00' (o ISO 8601) -> epoch; 400 si no se entiende"""
+    try:
+        return datetime.fromisoformat(valor).timestamp()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Fecha inválida en '{nombre}': '{valor}'")
+
+def recordar_prediccion(registro):
+    """Guarda las features de una predicción para poder recibir feedback sobre ella"""
+    prediccion_id = uuid.uuid4().hex
+    predicciones_recientes[prediccion_id] = registro
+    while len(predicciones_recientes) > PREDICCIONES_RECIENTES_MAX:
+        predicciones_recientes.popitem(last=False)
+    return prediccion_id
+
+def revisar_reentrenamiento():
+    """
+    Si el reentrenamiento lanzado ya terminó, guarda su código de salida y recalcula el
+    feedback pendiente desde el cursor: si falló, el cursor no avanzó y ese feedback
+    sigue contando para el siguiente intento.
+    """
+    global proceso_reentrenamiento, ultimo_codigo_reentrenamiento, feedback_pendiente
+    if proceso_reentrenamiento is None or proceso_reentrenamiento.poll() is None:
+        return
+    ultimo_codigo_reentrenamiento = proceso_reentrenamiento.returncode
+    proceso_reentrenamiento = None
+    feedback_pendiente = contar_feedback(leer_cursor()["posicion"])
+    if ultimo_codigo_reentrenamiento != 0:
+        print(f"⚠️ El reentrenamiento terminó con código {ultimo_codigo_reentrenamiento} "
+              f"(ver {REENTRENAMIENTO_LOG_PATH}); {feedback_pendiente} registros siguen pendientes")
+
+def estado_reentrenamiento():
+    revisar_reentrenamiento()
+    return {
+        "running": proceso_reentrenamiento is not None,
+        "last_exit_code": ultimo_codigo_reentrenamiento,
+        "pending_feedback": feedback_pendiente,
+    }
+
+def lanzar_reentrenamiento():
+    """Lanza el reentrenamiento en un proceso aparte para no afectar la latencia de la API"""
+    global proceso_reentrenamiento
+    revisar_reentrenamiento()
+    if proceso_reentrenamiento is not None:
+        return False
+    REENTRENAMIENTO_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(REENTRENAMIENTO_LOG_PATH, 'a', encoding='utf-8') as log:
+        proceso_reentrenamiento = subprocess.Popen(
+            [sys.executable, "-m", "src.training.retrain_feedback"],
+            cwd=BASE_DIR, stdout=log, stderr=subprocess.STDOUT
+        )
+    return True
+
+def _cargar_artefactos():
+    return cargar_modelo_activo(MODEL_CLASIFICACION_PATH, LABEL_ENCODING_PATH,
+                                PROYECCION_EMBEDDINGS_PATH, red.estaciones[0],
+                                deteccion_path=MODEL_DETECCION_PATH if CASCADA_ACTIVA else None)
+
+async def recargar_modelo(forzar=False):
+    """
+    Carga la versión nueva en un hilo aparte (sin bloquear peticiones), la valida con una
+    predicción de prueba y la publica. Si falla, se conserva la versión actual.
+    """
+    global modelo_activo, ultimo_error_recarga, firma_fallida
+    async with recarga_lock:
+        firma = firma_artefactos(RUTAS_ARTEFACTOS)
+        if not forzar and firma in (modelo_activo.firma, firma_fallida):
+            return False
+        try:
+            nuevo = await asyncio.get_running_loop().run_in_executor(None, _cargar_artefactos)
+        except Exception as e:
+            firma_fallida = firma
+            ultimo_error_recarga = f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}: {e}"
+            print(f"❌ Recarga de modelo descartada: {e}")
+            return False
+
+        anterior = modelo_activo
+        modelo_activo = nuevo
+        ultimo_error_recarga = None
+        if nuevo.label_mapping != anterior.label_mapping:
+            inicializar_estaciones()
+            abrir_historial()
+            if bitacora_estado is not None:
+                bitacora_estado.snapshot(capturar_estado())
+        print(f"🔄 Modelo recargado: {anterior.version} → {nuevo.version}")
+        return True
+
+async def vigilar_modelos():
+    """Revisa periódicamente si se publicó un modelo nuevo en disco"""
+    while True:
+        await asyncio.sleep(MODEL_RELOAD_INTERVAL)
+        await recargar_modelo()
 
 # ================= EVENTOS DE INICIO =================
 @app.on_event("startup")
 async def load_models():
     """Carga los modelos al iniciar la aplicación"""
-    global model_cb, embed_model, label_mapping
+    global modelo_activo, embed_model, reconocedor_estaciones, indice_geo, proveedor_contexto
+    global topologia, sesion_principal, sesiones, despachador_alertas, feedback_pendiente
 
     print("🚀 Iniciando API...")
     print(f"📁 Directorio base: {BASE_DIR}")
     print("📦 Cargando modelos...")
 
-    # Cargar modelo CatBoost
-    model_cb = CatBoostClassifier()
+    # Cargar modelo CatBoost, mapeo de etiquetas y proyección (si el modelo la espera)
     print(f"📂 Cargando modelo desde: {MODEL_CLASIFICACION_PATH}")
-    if not MODEL_CLASIFICACION_PATH.exists():
-        raise FileNotFoundError(f"No se encontró el modelo en: {MODEL_CLASIFICACION_PATH}")
-    model_cb.load_model(str(MODEL_CLASIFICACION_PATH))
-    print("✅ Modelo CatBoost cargado")
-
-    # Cargar modelo de embeddings
-    print(f"📂 Cargando modelo de embeddings: {EMBEDDING_MODEL_NAME}")
-    embed_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
-    print("✅ Modelo de embeddings cargado")
-
-    # Cargar mapeo de etiquetas
+    print(f"📂 Cargando mapeo de etiquetas desde: {LABEL_ENCODING_PATH}")
     try:
-        print(f"📂 Cargando mapeo de etiquetas desde: {LABEL_ENCODING_PATH}")
-        if not LABEL_ENCODING_PATH.exists():
-            raise FileNotFoundError(f"No se encontró el archivo en: {LABEL_ENCODING_PATH}")
-        with open(LABEL_ENCODING_PATH, 'r', encoding='utf-8') as f:
-            label_mapping_raw = json.load(f)
-        label_mapping = {int(k): v for k, v in label_mapping_raw.items()}
-        print(f"✅ Mapeo de etiquetas cargado: {label_mapping}")
+        modelo_activo = _cargar_artefactos()
     except FileNotFoundError as e:
         print(f"❌ Error: {e}")
         raise
+    print(f"✅ Modelo CatBoost cargado (versión {modelo_activo.version})")
+    if modelo_activo.deteccion is not None:
+        print(f"✅ Cascada activa: modelo de detección cargado (umbral {UMBRAL_DETECCION:g}%)")
+    if modelo_activo.proyeccion is not None:
+        proyeccion = modelo_activo.proyeccion
+        print(f"✅ Proyección cargada ({proyeccion.metodo}, {proyeccion.dim_entrada} → {proyeccion.dim_salida})")
+    print(f"✅ Mapeo de etiquetas cargado: {modelo_activo.label_mapping}")
+
+    # Cargar modelo de embeddings (no cambia entre versiones del modelo CatBoost)
+    if embed_model is None:
+        print(f"📂 Cargando modelo de embeddings: {EMBEDDING_MODEL_NAME} ({EMBEDDINGS_PRECISION})")
+        embed_model = ModeloEmbeddings(EMBEDDING_MODEL_NAME, EMBEDDINGS_PRECISION)
+        print(f"✅ Modelo de embeddings cargado (+{embed_model.memoria_carga_mb} MB)")
+    else:
+        print(f"✅ Modelo de embeddings precargado en el proceso maestro ({embed_model.precision}, pesos compartidos)")
+    if embed_model.precargado or EMBEDDINGS_HILOS > 0:
+        print(f"🧵 {configurar_hilos(EMBEDDINGS_HILOS)} hilos de torch en el worker {os.getpid()}")
+
+    # Reconocedor de estaciones (autómata sobre nombres y alias normalizados)
+    reconocedor_estaciones = ReconocedorEstaciones(red.estaciones, red.alias, red.requieren_contexto)
+    print(f"✅ Reconocedor de estaciones construido ({len(red.estaciones)} estaciones, {len(red.lineas)} líneas)")
+    indice_geo = IndiceEstacionesGeo(red.coordenadas, GEO_MAX_DISTANCIA_M)
+    print(f"✅ Índice espacial de estaciones construido (radio {GEO_MAX_DISTANCIA_M:g} m)")
+
+    # Contexto por (estación, hora); los nombres del archivo se traducen a los de la red
+    proveedor_contexto = ProveedorContexto(FuenteArchivo(CONTEXTO_PATH), CONTEXTO_TTL_S, canonizar=canonizador_estaciones(red))
+    celdas, cubiertas = proveedor_contexto.cobertura()
+    print(f"✅ Contexto indexado ({celdas} celdas estación-hora, {cubiertas} estaciones; el resto usa las medias)")
+
+    # Topología de la red para propagar riesgo entre estaciones vecinas
+    topologia = Topologia(red.lineas)
+    print(f"✅ Topología construida ({len(topologia.transbordos)} transbordos, difusión {RIESGO_DIFUSION:g})")
 
-    # Inicializar estado de estaciones
-    inicializar_estaciones()
+    # Inicializar estado de estaciones (simulación principal) y el almacén de sesiones
+    sesion_principal = crear_sesion(None)
     print("✅ Estado de estaciones inicializado")
+    restaurar_estado()
+    sesiones = AlmacenSesiones(crear_sesion, SESIONES_MAX, int(SESIONES_MAX_MB * 1024 * 1024), SESIONES_INACTIVIDAD_S)
+
+    abrir_historial()
+    if historial is not None:
+        print(f"✅ Historial abierto en {HISTORIAL_DIR} ({len(historial._segmentos)} segmentos)")
+
+    # Feedback que el último reentrenamiento todavía no consumió (sobrevive a reinicios)
+    feedback_pendiente = contar_feedback(leer_cursor()["posicion"])
+    if feedback_pendiente:
+        print(f"📝 {feedback_pendiente} registros de feedback pendientes de reentrenamiento")
+
+    despachador_alertas = crear_despachador()
+    if despachador_alertas is not None:
+        despachador_alertas.iniciar()
+        nombres = ', '.join(canal.sink.nombre for canal in despachador_alertas.canales)
+        print(f"✅ Despacho de alertas activo ({nombres}; cooldown {ALERTAS_COOLDOWN_S:g}s)")
+
+    if MODEL_RELOAD_INTERVAL > 0:
+        asyncio.create_task(vigilar_modelos())
+        print(f"👀 Revisando nuevas versiones del modelo cada {MODEL_RELOAD_INTERVAL:g}s")
     print(f"🎉 API lista para recibir peticiones en {HOST}:{PORT}!")
 
+@app.on_event("shutdown")
+async def cerrar_historial():
+    """Entrega las alertas pendientes, termina de escribir el historial y deja un snapshot del estado"""
+    if despachador_alertas is not None:
+        await despachador_alertas.detener()
+    explicador_alertas.cerrar()
+    if historial is not None:
+        historial.cerrar()
+    if bitacora_estado is not None:
+        bitacora_estado.cerrar(capturar_estado())
+
 # ================= ENDPOINTS =================
 @app.get("/")
 async def root():
     """Endpoint raíz con información de la API"""
     return {
-        "message": "API Simulación Metro CDMX - Línea 1",
+        "message": "API Simulación Metro CDMX",
         "version": "1.0.0",
         "environment": get_env("ENVIRONMENT", "development"),
         "endpoints": {
             "/": "Información de la API",
             "/health": "Health check endpoint",
-            "/iteracion": "Ejecuta una iteración de la simulación",
-            "/estado": "Obtiene el estado actual de todas las estaciones",
-            "/reset": "Reinicia el estado de todas las estaciones"
+            "/red": "Líneas y estaciones de la red",
+            "/iteracion": "Ejecuta una iteración de la simulación (filtros opcionales: linea, estacion, sesion)",
+            "/estado": "Obtiene el estado actual de las estaciones (filtros opcionales: linea, estacion, sesion)",
+            "/reset": "Reinicia el estado de todas las estaciones (de la sesión indicada, si hay)",
+            "/sesiones": "Crea (POST), lista (GET) o elimina (DELETE /sesiones/{id}) simulaciones independientes",
+            "/historial": "Evolución del riesgo por estación en un rango de tiempo (reducida por buckets)",
+            "/alertas/despacho": "Estado del despacho de alertas (entregas, reintentos, descartes por sink)",
+            "/alertas/cola": "Consume alertas de la cola local (sustituto de un broker de mensajes)",
+            "/alertas/{id}/explicacion": "Features que más contribuyeron a una alerta crítica (SHAP)",
+            "/feedback": "Confirma o corrige la clase de un tweet o alerta",
+            "/admin/recargar-modelo": "Recarga el modelo desde disco sin reiniciar la API"
         }
     }
 
@@ -183,181 +622,427 @@ async def health_check():
     return {
         "status": "healthy",
         "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-        "models_loaded": model_cb is not None and embed_model is not None,
-        "stations_initialized": len(estatus_estaciones) > 0
+        "models_loaded": modelo_activo is not None and embed_model is not None,
+        "stations_initialized": sesion_principal is not None,
+        "sessions": len(sesiones) if sesiones is not None else 0,
+        "model_version": modelo_activo.version if modelo_activo else None,
+        "model_loaded_at": modelo_activo.cargado_en if modelo_activo else None,
+        "last_reload_error": ultimo_error_recarga,
+        "embedding_model": embed_model.info() if embed_model is not None else None,
+        "retraining": estado_reentrenamiento(),
+        "memory": memoria_proceso()
+    }
+
+@app.get("/red")
+async def obtener_red():
+    """Líneas (en orden) y estaciones de la red, para que los clientes armen sus filtros"""
+    return {
+        "nombre": red.nombre,
+        "lineas": [
+            {"linea": linea, "nombre": red.nombres_lineas[linea], "estaciones": estaciones}
+            for linea, estaciones in red.lineas.items()
+        ],
+        "numero_estaciones": len(red.estaciones)
     }
 
 @app.get("/iteracion", response_model=IteracionResponse)
-async def ejecutar_iteracion():
+async def ejecutar_iteracion(filtro_linea: Optional[str] = Query(None, alias="linea", description="Líneas a reportar, p. ej. '1' o '1,3'"),
+                             filtro_estacion: Optional[str] = Query(None, alias="estacion", description="Estaciones a reportar, separadas por comas"),
+                             sesion_id: Optional[str] = Query(None, alias="sesion", description="Sesión de simulación (por defecto, la principal)")):
     """
     Ejecuta una iteración de la simulación:
     - Genera tweets aleatorios
     - Los clasifica con el modelo
     - Actualiza el estado de las estaciones
-    - Retorna los resultados
+    - Retorna los resultados (solo de las líneas/estaciones pedidas, si hay filtros)
+    Con `sesion` corre sobre una simulación independiente, que no toca a la principal
+    ni se guarda en el WAL o el historial.
     """
     timestamp_actual = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    sesion = obtener_sesion(sesion_id)
+    principal = sesion is sesion_principal
+    seleccion = seleccionar_estaciones(filtro_linea, filtro_estacion)
+    filtrar = filtro_linea is not None or filtro_estacion is not None
+    seleccion_set = set(seleccion)
+
+    # Toda la iteración usa la misma versión aunque se publique otra a la mitad
+    modelo = modelo_activo
+    label_mapping = modelo.label_mapping
 
     # Generar tweets
-    num_tweets_a_generar = random.randint(N_TWEETS[0], N_TWEETS[1])
-    tweets_generados = generar_tweet_simulado(num_tweets=num_tweets_a_generar)
+    num_tweets_a_generar = sesion.rng.randint(N_TWEETS[0], N_TWEETS[1])
+    tweets_generados = generar_tweet_simulado(num_tweets=num_tweets_a_generar, estaciones=red.estaciones, rng=sesion.rng)
 
     tweets_procesados = []
     alertas_criticas = []
+    tweets_por_etapa = {'duplicado': 0, 'prefiltro': 0, 'deteccion': 0, 'clasificacion': 0}
+    conteo_tweets = {}  # Tweets por estación en esta iteración (para el historial)
+    actualizadas = set()  # Estaciones cuyo estado cambió (para el WAL)
 
     for tweet_data in tweets_generados:
         tweet_text = tweet_data['text']
 
-        # Extraer estación del tweet
-        try:
-            estacion_match = tweet_text.split('**')[1]
-            estacion = estacion_match.split(',')[0].strip()
-            if estacion not in estaciones_L1:
-                estacion = random.choice(estaciones_L1)
-        except:
-            estacion = random.choice(estaciones_L1)
-
-        # Generar datos aleatorios para features
-        temp = random.uniform(15.0, 35.0)
-        humidity = random.uniform(40.0, 95.0)
-        precip_mm = random.choices([0.0, random.uniform(0.1, 10.0)], weights=[0.8, 0.2], k=1)[0]
-        traffic_jam_level = random.randint(0, 5)
-
-        # Vector embedding
-        vector = embed_model.encode(tweet_text).tolist()
-
-        # Preparar features para el modelo
-        features_dict = {
-            'station': estacion,
-            'temp': temp,
-            'humidity': humidity,
-            'precip_mm': precip_mm,
-            'traffic_jam_level': traffic_jam_level,
-        }
-        for i, val in enumerate(vector):
-            features_dict[f"embedding_{i}"] = val
+        # Reconocer la estación mencionada en el texto (una sola pasada); si no menciona
+        # ninguna, la estación más cercana a la ubicación del tweet (si está geolocalizado)
+        estacion, confianza_estacion, _ = reconocedor_estaciones.reconocer(tweet_text)
+        origen_estacion = 'texto' if estacion is not None else None
+        if estacion is None:
+            coordenadas = coordenadas_de(tweet_data)
+            if coordenadas is not None:
+                estacion, confianza_estacion, _ = indice_geo.estacion_cercana(*coordenadas)
+                origen_estacion = 'geo' if estacion is not None else None
+        if estacion is None:
+            estacion = ESTACION_DESCONOCIDA
+        conteo_tweets[estacion] = conteo_tweets.get(estacion, 0) + 1
+
+        # Casi duplicado de un tweet reciente de la misma estación: se reutiliza su
+        # predicción sin calcular el embedding. La estación vuelve a tomar esas
+        # probabilidades (el incidente sigue activo aunque otro tweet la haya cambiado),
+        # pero no cuenta como evidencia nueva: no genera otra alerta. La versión del
+        # modelo es parte del grupo para no reutilizar predicciones de un modelo anterior.
+        if DEDUP_ACTIVO:
+            huella = simhash(tweet_text)
+            grupo = (estacion, modelo.version)
+            copia = sesion.ventana_duplicados.buscar(huella, grupo)
+            if copia is not None:
+                tweets_por_etapa['duplicado'] += 1
+                tweet_original, probabilidades_dict = copia['payload']
+                estado = sesion.estado_estacion(estacion)
+                if estado is not None:
+                    estado.update(probabilidades_dict)
+                    estado['hora'] = datetime.now().strftime('%H:%M')
+                    sesion.propagador.observar(estacion, riesgo_observado(probabilidades_dict))
+                    actualizadas.add(estacion)
+                tweets_procesados.append(tweet_original.model_copy(update={
+                    'texto': tweet_text,
+                    'timestamp': timestamp_actual,
+                    'multiplicidad': copia['multiplicidad'],
+                    'duplicado': True,
+                }))
+                continue
+
+        # Contexto de la estación a esta hora (medias de entrenamiento si no hay datos)
+        contexto = proveedor_contexto.contexto(estacion)
+        temp = contexto['temp']
+        humidity = contexto['humidity']
+        precip_mm = contexto['precip_mm']
+        traffic_jam_level = contexto['traffic_jam_level']
+
+        # Etapa 0 (opcional): prefiltro por palabras clave; sin palabras de falla no se
+        # calcula el embedding ni se corre ningún modelo
+        etapa = 'clasificacion'
+        prob_falla_deteccion = None
+        if CASCADA_PREFILTRO and clasificar_por_palabras_clave(tweet_text) in (None, 0):
+            etapa = 'prefiltro'
+        else:
+            # Vector embedding (proyectado si el modelo usa dimensiones reducidas)
+            vector = embed_model.encode(tweet_text)
+            prefijo = modelo.prefijo
+            if modelo.proyeccion is not None:
+                vector = modelo.proyeccion.transformar(vector)
+            vector = vector.tolist()
 
-        # Crear DataFrame con el orden correcto de features
-        model_feature_names = model_cb.feature_names_
-        X_input = pd.DataFrame([features_dict], columns=model_feature_names)
+            # Preparar features para el modelo
+            features_dict = {
+                'station': estacion,
+                'temp': temp,
+                'humidity': humidity,
+                'precip_mm': precip_mm,
+                'traffic_jam_level': traffic_jam_level,
+            }
+            for i, val in enumerate(vector):
+                features_dict[f"{prefijo}{i}"] = val
 
-        # Predicción
-        probabilidades_raw = model_cb.predict_proba(X_input)[0]
-        probabilidades_dict = {i: prob * 100 for i, prob in enumerate(probabilidades_raw)}
+            # Etapa 1: detección binaria. Las filas se pasan como listas en el orden de
+            # features del modelo: armar un DataFrame de ~770 columnas cuesta más que predecir.
+            if modelo.deteccion is not None:
+                fila_deteccion = [features_dict[nombre] for nombre in modelo.deteccion.feature_names_]
+                prob_falla_deteccion = float(modelo.deteccion.predict_proba([fila_deteccion])[0][1]) * 100
+                if prob_falla_deteccion < UMBRAL_DETECCION:
+                    etapa = 'deteccion'
 
-        pred_clase_idx = model_cb.predict(X_input)[0]
-        pred_clase_label = label_mapping[int(pred_clase_idx)]
-        prob_falla_display = probabilidades_dict[int(pred_clase_idx)]
+        if etapa == 'clasificacion':
+            # Etapa 2: tipo de falla, solo para tweets marcados como falla
+            fila = [features_dict[nombre] for nombre in modelo.model.feature_names_]
+            probabilidades_raw = modelo.model.predict_proba([fila])[0]
+            probabilidades_dict = {i: prob * 100 for i, prob in enumerate(probabilidades_raw)}
+
+            pred_clase_idx = int(probabilidades_raw.argmax())
+            pred_clase_label = label_mapping[pred_clase_idx]
+            prob_falla_display = probabilidades_dict[pred_clase_idx]
+        else:
+            # Sin falla: la estación vuelve a su estado inicial
+            pred_clase_idx = None
+            pred_clase_label = CLASE_SIN_FALLA
+            prob_falla_display = 100.0 - prob_falla_deteccion if prob_falla_deteccion is not None else 100.0
+            probabilidades_dict = {k: v for k, v in get_initial_probs().items() if k != 'hora'}
+        tweets_por_etapa[etapa] += 1
 
         # Actualizar estado de la estación
-        estatus_estaciones[estacion].update(probabilidades_dict)
-        estatus_estaciones[estacion]['hora'] = datetime.now().strftime('%H:%M')
+        estado = sesion.estado_estacion(estacion)
+        if estado is not None:
+            estado.update(probabilidades_dict)
+            estado['hora'] = datetime.now().strftime('%H:%M')
+            sesion.propagador.observar(estacion, riesgo_observado(probabilidades_dict))
+            actualizadas.add(estacion)
+
+        prediccion_id = recordar_prediccion({
+            'texto': tweet_text,
+            'estacion': estacion,
+            'temp': temp,
+            'humidity': humidity,
+            'precip_mm': precip_mm,
+            'traffic_jam_level': traffic_jam_level,
+            'clase_predicha': pred_clase_label,
+            'etapa': etapa,
+        })
 
         # Agregar a tweets procesados
-        tweets_procesados.append(TweetProcesado(
+        tweet_procesado = TweetProcesado(
+            id=prediccion_id,
             texto=tweet_text,
             estacion=estacion,
+            confianza_estacion=confianza_estacion,
+            origen_estacion=origen_estacion,
             clase_predicha=pred_clase_label,
             probabilidad_clase=prob_falla_display,
-            timestamp=timestamp_actual
-        ))
+            timestamp=timestamp_actual,
+            etapa=etapa,
+            prob_falla_deteccion=prob_falla_deteccion
+        )
+        tweets_procesados.append(tweet_procesado)
+        if DEDUP_ACTIVO:
+            sesion.ventana_duplicados.agregar(huella, (tweet_procesado, probabilidades_dict), grupo)
 
         # Verificar si hay alerta crítica
-        if int(pred_clase_idx) != 0 and prob_falla_display > UMBRAL_ALERTA:
-            alertas_criticas.append(AlertaCritica(
+        if pred_clase_idx not in (None, 0) and prob_falla_display > UMBRAL_ALERTA:
+            alerta = AlertaCritica(
+                id=prediccion_id,
                 estacion=estacion,
                 tipo_falla=pred_clase_label,
                 certeza=prob_falla_display,
                 tweet=tweet_text,
-                timestamp=timestamp_actual
-            ))
-
-    # Construir estados de todas las estaciones
-    estados = []
-    for estacion in estaciones_L1:
-        datos = estatus_estaciones[estacion]
-
-        # Probabilidad de No Falla (clase 0)
-        prob_no_falla = datos.get(0, 0.0)
-
-        # Encontrar la falla más probable (excluyendo clase 0)
-        max_falla_prob = 0.0
-        max_falla_nombre = "N/A"
-
-        for class_idx in label_mapping.keys():
-            if class_idx != 0:
-                prob = datos.get(class_idx, 0.0)
-                if prob > max_falla_prob:
-                    max_falla_prob = prob
-                    max_falla_nombre = label_mapping[class_idx]
-
-        # Determinar si hay alerta
-        tiene_alerta = max_falla_prob > UMBRAL_ALERTA
+                timestamp=timestamp_actual,
+                prob_falla_deteccion=prob_falla_deteccion
+            )
+            alertas_criticas.append(alerta)
+            # Solo se guarda la fila; la explicación se calcula si alguien la pide
+            explicador_alertas.registrar(prediccion_id, modelo, fila, pred_clase_idx, pred_clase_label)
+            # Solo la simulación principal notifica a sistemas externos; encolar no espera la entrega
+            if principal and despachador_alertas is not None:
+                despachador_alertas.publicar(alerta.model_dump())
 
-        # Extraer solo las probabilidades (sin 'hora')
-        probabilidades_limpias = {k: v for k, v in datos.items() if k != 'hora'}
+    # Un paso de difusión del riesgo hacia las estaciones vecinas
+    sesion.propagador.paso()
+    sesion.iteraciones += 1
+    if principal:
+        registrar_iteracion(actualizadas)
+        registrar_historial(conteo_tweets, alertas_criticas)
 
-        estados.append(EstacionEstado(
-            estacion=estacion,
-            hora=datos['hora'],
-            probabilidades=probabilidades_limpias,
-            no_falla_prob=prob_no_falla,
-            falla_mas_probable=max_falla_nombre,
-            falla_mas_probable_prob=max_falla_prob,
-            alerta=tiene_alerta
-        ))
+    # Estados, tweets y alertas solo de las estaciones seleccionadas
+    estados = construir_estados(sesion, seleccion, label_mapping)
+    if filtrar:
+        tweets_procesados = [t for t in tweets_procesados if t.estacion in seleccion_set]
+        alertas_criticas = [a for a in alertas_criticas if a.estacion in seleccion_set]
 
     return IteracionResponse(
         timestamp=timestamp_actual,
         tweets_procesados=tweets_procesados,
         estados_estaciones=estados,
         alertas_criticas=alertas_criticas,
-        numero_tweets=num_tweets_a_generar
+        numero_tweets=num_tweets_a_generar,
+        version_modelo=modelo.version,
+        tweets_por_etapa=tweets_por_etapa,
+        sesion=sesion.id
     )
 
 @app.get("/estado")
-async def obtener_estado():
-    """Obtiene el estado actual de todas las estaciones sin ejecutar una nueva iteración"""
-    estados = []
-    for estacion in estaciones_L1:
-        datos = estatus_estaciones[estacion]
-
-        prob_no_falla = datos.get(0, 0.0)
+async def obtener_estado(filtro_linea: Optional[str] = Query(None, alias="linea", description="Líneas a reportar, p. ej. '1' o '1,3'"),
+                         filtro_estacion: Optional[str] = Query(None, alias="estacion", description="Estaciones a reportar, separadas por comas"),
+                         sesion_id: Optional[str] = Query(None, alias="sesion", description="Sesión de simulación (por defecto, la principal)")):
+    """Obtiene el estado actual de las estaciones sin ejecutar una nueva iteración"""
+    sesion = obtener_sesion(sesion_id)
+    seleccion = seleccionar_estaciones(filtro_linea, filtro_estacion)
+    estados = construir_estados(sesion, seleccion, modelo_activo.label_mapping)
 
-        max_falla_prob = 0.0
-        max_falla_nombre = "N/A"
+    return {
+        "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "estados_estaciones": estados,
+        "version_modelo": modelo_activo.version,
+        "sesion": sesion.id
+    }
 
-        for class_idx in label_mapping.keys():
-            if class_idx != 0:
-                prob = datos.get(class_idx, 0.0)
-                if prob > max_falla_prob:
-                    max_falla_prob = prob
-                    max_falla_nombre = label_mapping[class_idx]
+@app.get("/historial")
+async def obtener_historial(filtro_linea: Optional[str] = Query(None, alias="linea", description="Líneas, p. ej. '1' o '1,3'"),
+                            filtro_estacion: Optional[str] = Query(None, alias="estacion", description="Estaciones, separadas por comas"),
+                            desde: Optional[str] = Query(None, description="Inicio ('YYYY-MM-DD HH:MM:SS'); por defecto `hasta` - `horas`"),
+                            hasta: Optional[str] = Query(None, description="Fin; por defecto ahora"),
+                            horas: float = Query(3.0, gt=0, description="Tamaño del rango si no se indica `desde`"),
+                            bucket: Optional[float] = Query(None, gt=0, description="Segundos por punto; por defecto el rango entre HISTORIAL_MAX_BUCKETS"),
+                            probabilidades: bool = Query(False, description="Incluir la media por clase en cada bucket")):
+    """
+    Evolución de las estaciones pedidas: por bucket, min/max/media del riesgo propagado y
+    de la probabilidad de falla, tweets, alertas críticas y si hubo alerta. La reducción
+    se hace en el servidor, así que la respuesta no crece con el número de ticks.
+    """
+    if historial is None:
+        raise HTTPException(status_code=404, detail="El historial está desactivado (HISTORIAL_ACTIVO=false)")
+    if filtro_linea is None and filtro_estacion is None:
+        raise HTTPException(status_code=400, detail="Indica al menos una línea o estación")
+    seleccion = seleccionar_estaciones(filtro_linea, filtro_estacion)
 
-        tiene_alerta = max_falla_prob > UMBRAL_ALERTA
-        probabilidades_limpias = {k: v for k, v in datos.items() if k != 'hora'}
+    fin = _instante(hasta, 'hasta') if hasta else time.time()
+    inicio = _instante(desde, 'desde') if desde else fin - horas * 3600
+    if inicio >= fin:
+        raise HTTPException(status_code=400, detail="'desde' debe ser anterior a 'hasta'")
+    # El bucket nunca es tan chico que la respuesta pase de HISTORIAL_MAX_BUCKETS puntos
+    bucket_s = max(bucket or 0.0, (fin - inicio) / HISTORIAL_MAX_BUCKETS)
 
-        estados.append(EstacionEstado(
-            estacion=estacion,
-            hora=datos['hora'],
-            probabilidades=probabilidades_limpias,
-            no_falla_prob=prob_no_falla,
-            falla_mas_probable=max_falla_nombre,
-            falla_mas_probable_prob=max_falla_prob,
-            alerta=tiene_alerta
-        ))
+    series = historial.consultar(seleccion, inicio, fin, bucket_s, con_probabilidades=probabilidades)
+    label_mapping = modelo_activo.label_mapping
+    tiempos = None
+    for serie in series.values():
+        tiempos = serie.pop('t')
+        if serie['probabilidades'] is not None:
+            serie['probabilidades'] = {label_mapping.get(c, str(c)): v for c, v in serie['probabilidades'].items()}
 
     return {
-        "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-        "estados_estaciones": estados
+        "desde": datetime.fromtimestamp(inicio).strftime('%Y-%m-%d %H:%M:%S'),
+        "hasta": datetime.fromtimestamp(fin).strftime('%Y-%m-%d %H:%M:%S'),
+        "bucket_segundos": bucket_s,
+        "t": [datetime.fromtimestamp(t).strftime('%Y-%m-%d %H:%M:%S') for t in (tiempos or [])],
+        "estaciones": series
     }
 
 @app.post("/reset")
-async def reiniciar_estado():
+async def reiniciar_estado(sesion_id: Optional[str] = Query(None, alias="sesion", description="Sesión a reiniciar (por defecto, la principal)")):
     """Reinicia el estado de todas las estaciones a sus valores iniciales"""
-    inicializar_estaciones()
+    sesion = obtener_sesion(sesion_id)
+    sesion.reiniciar()
+    if sesion is sesion_principal:
+        reiniciar_historial()
+        registrar_evento({'tipo': 'reset', 'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')})
     return {
         "message": "Estado de estaciones reiniciado correctamente",
+        "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "sesion": sesion.id
+    }
+
+@app.post("/sesiones")
+async def crear_sesion_simulacion(peticion: Optional[SesionRequest] = None):
+    """
+    Crea una simulación independiente. Se usa pasando `?sesion=<id>` a /iteracion, /estado
+    y /reset; con `semilla` la secuencia de tweets es reproducible. Las sesiones viven en
+    memoria y se descartan tras SESIONES_INACTIVIDAD_S sin uso o, si se llega a
+    SESIONES_MAX o SESIONES_MAX_MB, empezando por la de uso menos reciente.
+    """
+    sesion = sesiones.crear(peticion.semilla if peticion else None)
+    return sesion.resumen()
+
+@app.get("/sesiones")
+async def listar_sesiones():
+    """Sesiones activas (de uso más reciente al final) y su memoria estimada"""
+    sesiones.purgar()
+    return {
+        "sesiones": [sesion.resumen() for sesion in sesiones],
+        "memoria_bytes": sesiones.memoria_bytes(),
+        "max_sesiones": SESIONES_MAX,
+        "max_bytes": sesiones.max_bytes,
+        "descartadas": sesiones.descartadas
+    }
+
+@app.delete("/sesiones/{sesion_id}")
+async def eliminar_sesion(sesion_id: str):
+    """Libera una sesión antes de que expire"""
+    if not sesiones.eliminar(sesion_id):
+        raise HTTPException(status_code=404, detail=f"Sesión no encontrada o expirada: '{sesion_id}'")
+    return {"message": "Sesión eliminada", "sesion": sesion_id}
+
+@app.get("/alertas/despacho")
+async def estado_despacho():
+    """Alertas publicadas, suprimidas por cooldown y, por sink, entregadas, reintentos, fallidas y en cola"""
+    if despachador_alertas is None:
+        raise HTTPException(status_code=404, detail="No hay sinks de alertas configurados")
+    return despachador_alertas.estadisticas()
+
+@app.get("/alertas/cola")
+async def consumir_cola_alertas(maximo: int = Query(100, ge=1, le=1000, description="Alertas a consumir")):
+    """Saca (en orden de llegada) hasta `maximo` alertas de la cola local"""
+    cola = despachador_alertas.sink('cola') if despachador_alertas is not None else None
+    if cola is None:
+        raise HTTPException(status_code=404, detail="La cola local de alertas está desactivada (ALERTAS_COLA_LOCAL=false)")
+    alertas = cola.consumir(maximo)
+    return {"alertas": alertas, "restantes": len(cola.alertas)}
+
+@app.get("/alertas/{alerta_id}/explicacion")
+async def explicar_alerta(alerta_id: str,
+                          espera: float = Query(2.0, ge=0, le=30, description="Segundos a esperar el cálculo antes de responder 202")):
+    """
+    Por qué se disparó una alerta: contribución SHAP (en log-odds de la clase predicha) de
+    la estación y de cada feature de contexto, y la del texto como un solo grupo. La
+    primera petición lanza el cálculo en segundo plano; si no termina en `espera`
+    segundos responde 202 y la explicación queda en caché para la siguiente.
+    """
+    explicacion = explicador_alertas.en_cache(alerta_id)
+    if explicacion is None:
+        futuro = explicador_alertas.solicitar(alerta_id)
+        if futuro is None:
+            raise HTTPException(status_code=404, detail=f"No hay una alerta reciente con id '{alerta_id}'")
+        try:
+            explicacion = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(futuro)), espera)
+        except asyncio.TimeoutError:
+            return JSONResponse(status_code=202, content={"id": alerta_id, "estado": "calculando"})
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"No se pudo calcular la explicación: {e}")
+    return {"estado": "lista", **explicacion}
+
+@app.post("/feedback")
+async def registrar_feedback_operador(feedback: FeedbackRequest):
+    """
+    Registra la clase confirmada o corregida por un operador para un tweet o alerta.
+    Al acumular suficiente feedback se lanza un reentrenamiento incremental en segundo plano.
+    """
+    global feedback_pendiente
+
+    prediccion = predicciones_recientes.get(feedback.id)
+    if prediccion is None:
+        raise HTTPException(status_code=404, detail=f"No se encontró una predicción reciente con id '{feedback.id}'")
+    # "Sin falla" corrige (o confirma) la detección; el resto, el tipo de falla
+    if feedback.clase_correcta != CLASE_SIN_FALLA and feedback.clase_correcta not in modelo_activo.label_mapping.values():
+        raise HTTPException(status_code=400, detail=f"Clase desconocida: '{feedback.clase_correcta}'")
+
+    timestamp_actual = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    registrar_feedback({
+        'id': feedback.id,
+        'timestamp': timestamp_actual,
+        **prediccion,
+        'clase_correcta': feedback.clase_correcta,
+    })
+    feedback_pendiente += 1
+    # El contador se recalcula desde el cursor cuando el reentrenamiento termina
+    revisar_reentrenamiento()
+
+    reentrenamiento_lanzado = False
+    if FEEDBACK_MIN_REENTRENAMIENTO > 0 and feedback_pendiente >= FEEDBACK_MIN_REENTRENAMIENTO:
+        reentrenamiento_lanzado = lanzar_reentrenamiento()
+
+    return {
+        "message": "Feedback registrado correctamente",
+        "confirmacion": feedback.clase_correcta == prediccion['clase_predicha'],
+        "reentrenamiento_lanzado": reentrenamiento_lanzado,
+        "timestamp": timestamp_actual,
+        "version_modelo": modelo_activo.version
+    }
+
+@app.post("/admin/recargar-modelo")
+async def recargar_modelo_admin():
+    """Fuerza la recarga del modelo desde disco (p. ej. después de un despliegue)"""
+    recargado = await recargar_modelo(forzar=True)
+    if not recargado:
+        raise HTTPException(status_code=500, detail=f"No se pudo recargar el modelo: {ultimo_error_recarga}")
+    return {
+        "message": "Modelo recargado correctamente",
+        "version_modelo": modelo_activo.version,
         "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     }
 
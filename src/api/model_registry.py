@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from catboost import CatBoostClassifier
+
+from src.features.feature_store import PREFIJO_EMBEDDING
+from src.features.projection import PREFIJO_PROYECCION, cargar_proyeccion, modelo_usa_proyeccion
+
+
+class ModeloActivo:
+    """
+    Conjunto de artefactos que sirve la API (modelo de clasificación, modelo de detección
+    opcional para la cascada, mapeo de etiquetas y proyección). No se modifica después
+    de cargarse: una recarga crea una instancia nueva y la API cambia la referencia
+    global, así que cada petición termina con la versión que tomó al empezar.
+    """
+
+    def __init__(self, model, label_mapping, proyeccion, version, firma, deteccion=None):
+        self.model = model
+        self.deteccion = deteccion
+        self.label_mapping = label_mapping
+        self.proyeccion = proyeccion
+        self.version = version
+        self.firma = firma
+        self.cargado_en = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    @property
+    def prefijo(self):
+        return PREFIJO_PROYECCION if self.proyeccion is not None else PREFIJO_EMBEDDING
+
+
+def firma_artefactos(rutas):
+    """(mtime_ns, tamaño) de cada archivo; cambia cuando se publica un artefacto nuevo"""
+    firma = []
+    for ruta in rutas:
+        try:
+            stat = os.stat(ruta)
+            firma.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            firma.append(None)
+    return tuple(firma)
+
+
+def rutas_artefactos(model_path, label_path, proyeccion_path, deteccion_path=None):
+    """Archivos que definen una versión (en el mismo orden que usa la firma)"""
+    return [ruta for ruta in (model_path, deteccion_path, label_path, proyeccion_path) if ruta is not None]
+
+
+def _version(rutas):
+    """Prefijo del sha256 del contenido de los artefactos"""
+    h = hashlib.sha256()
+    for ruta in rutas:
+        if os.path.exists(ruta):
+            with open(ruta, 'rb') as f:
+                for bloque in iter(lambda: f.read(1 << 20), b''):
+                    h.update(bloque)
+    return h.hexdigest()[:12]
+
+
+def _prediccion_de_prueba(model, n_clases, estacion):
+    """Predicción con una fila sintética para validar el modelo antes de publicarlo"""
+    fila = {nombre: 0.0 for nombre in model.feature_names_}
+    fila['station'] = estacion
+    probabilidades = model.predict_proba(pd.DataFrame([fila], columns=model.feature_names_))[0]
+    if len(probabilidades) != n_clases:
+        raise ValueError(f"El modelo predice {len(probabilidades)} clases pero se esperaban {n_clases}")
+    if not np.all(np.isfinite(probabilidades)) or not np.isclose(probabilidades.sum(), 1.0, atol=1e-3):
+        raise ValueError("La predicción de prueba regresó probabilidades inválidas")
+
+
+def cargar_modelo_activo(model_path, label_path, proyeccion_path, estacion_prueba, deteccion_path=None):
+    """
+    Carga y valida los artefactos. Lanza una excepción si algo falta o la predicción
+    de prueba falla, en cuyo caso la API conserva la versión anterior. Sin
+    `deteccion_path` (o si el archivo no existe) la cascada queda desactivada.
+    """
+    rutas = rutas_artefactos(model_path, label_path, proyeccion_path, deteccion_path)
+    firma = firma_artefactos(rutas)
+
+    if not model_path.exists():
+        raise FileNotFoundError(f"No se encontró el modelo en: {model_path}")
+    model = CatBoostClassifier()
+    model.load_model(str(model_path))
+
+    if not label_path.exists():
+        raise FileNotFoundError(f"No se encontró el archivo en: {label_path}")
+    with open(label_path, 'r', encoding='utf-8') as f:
+        label_mapping = {int(k): v for k, v in json.load(f).items()}
+
+    # La proyección solo se carga si el modelo la espera
+    proyeccion = None
+    if modelo_usa_proyeccion(model.feature_names_):
+        if not proyeccion_path.exists():
+            raise FileNotFoundError(f"No se encontró la proyección en: {proyeccion_path}")
+        proyeccion = cargar_proyeccion(proyeccion_path)
+
+    _prediccion_de_prueba(model, len(label_mapping), estacion_prueba)
+
+    # El modelo de detección comparte features (y proyección) con el de clasificación
+    deteccion = None
+    if deteccion_path is not None and deteccion_path.exists():
+        deteccion = CatBoostClassifier()
+        deteccion.load_model(str(deteccion_path))
+        if set(deteccion.feature_names_) != set(model.feature_names_):
+            raise ValueError("El modelo de detección no usa las mismas features que el de clasificación")
+        _prediccion_de_prueba(deteccion, 2, estacion_prueba)
+
+    return ModeloActivo(model, label_mapping, proyeccion, _version(rutas), firma, deteccion=deteccion)
@@ -0,0 +1,185 @@
+import random
+import sys
+import time
+import uuid
+from collections import OrderedDict
+
+from src.features.line_topology import PropagadorRiesgo
+
+# ================= CONFIGURACIÓN =================
+MAX_SESIONES = 100
+MAX_BYTES = 256 * 1024 * 1024     # Memoria estimada total de las sesiones
+INACTIVIDAD_SEGUNDOS = 1800.0     # Una sesión sin uso por más de esto se descarta
+BYTES_POR_DUPLICADO = 2048        # Estimado por entrada de la ventana de duplicados (hash, bandas y TweetProcesado)
+
+
+def riesgo_observado(probabilidades):
+    """Probabilidad de la falla más probable (sin la clase 0)"""
+    return max((p for k, p in probabilidades.items() if k != 0), default=0.0)
+
+
+def _tamano_estado(estado):
+    """Bytes de un dict de probabilidades de estación (el dict y sus valores; las claves son compartidas)"""
+    return sys.getsizeof(estado) + sum(sys.getsizeof(v) for v in estado.values())
+
+
+# ================= SESIÓN =================
+class SesionSimulacion:
+    """
+    Una simulación independiente: estado de cada estación (particionado por línea, con los
+    transbordos compartidos entre sus líneas), riesgo propagado, ventana de duplicados y su
+    propio generador aleatorio. La topología y los modelos se comparten entre sesiones; solo
+    esto es por sesión, así que crear una cuesta unos cuantos KB.
+    """
+
+    def __init__(self, sesion_id, red, topologia, probs_iniciales, ventana_duplicados,
+                 difusion, decaimiento, semilla=None):
+        self.id = sesion_id
+        self.red = red
+        self.semilla = semilla
+        self.rng = random.Random(semilla)
+        self.propagador = PropagadorRiesgo(topologia, difusion, decaimiento)
+        self.ventana_duplicados = ventana_duplicados
+        self._probs_iniciales = probs_iniciales
+        self.creada = time.time()
+        self.ultimo_uso = time.monotonic()
+        self.iteraciones = 0
+        self.reiniciar()
+
+    def reiniciar(self):
+        """Todas las estaciones a su estado inicial, sin riesgo propagado ni duplicados recientes"""
+        estados = {est: self._probs_iniciales() for est in self.red.estaciones}
+        self.estatus_por_linea = {
+            linea: {est: estados[est] for est in estaciones}
+            for linea, estaciones in self.red.lineas.items()
+        }
+        self.propagador.reiniciar()
+        # Una copia de un tweet anterior al reinicio se vuelve a evaluar como nueva
+        self.ventana_duplicados.limpiar()
+        # Las probabilidades se actualizan en sitio con las mismas claves: el tamaño no cambia
+        self._bytes_estado = (sum(_tamano_estado(e) for e in estados.values())
+                              + sum(sys.getsizeof(shard) for shard in self.estatus_por_linea.values()))
+
+    def estado_estacion(self, estacion):
+        """Estado de una estación (vía el shard de su primera línea) o None si no es de la red"""
+        lineas = self.red.lineas_de(estacion)
+        return self.estatus_por_linea[lineas[0]][estacion] if lineas else None
+
+    # ---------- estado persistente (snapshots y WAL) ----------
+    def capturar_estado(self, clases):
+        """Estado completo para un snapshot (probabilidades por estación y vectores de riesgo)"""
+        estaciones = self.propagador.topologia.estaciones
+        return {
+            'clases': clases,
+            'estaciones': {
+                est: {'p': [self.estado_estacion(est)[c] for c in clases], 'hora': self.estado_estacion(est)['hora']}
+                for est in self.red.estaciones
+            },
+            'observado': {est: float(v) for est, v in zip(estaciones, self.propagador.observado) if v},
+            'riesgo': {est: float(v) for est, v in zip(estaciones, self.propagador.riesgo) if v},
+        }
+
+    def aplicar_estaciones(self, estaciones, clases):
+        """Fija las probabilidades de las estaciones ({est: {'p', 'hora'}}) y su riesgo observado"""
+        for est, datos in estaciones.items():
+            estado = self.estado_estacion(est)
+            if estado is None:
+                continue  # Estación que ya no está en la red configurada
+            probabilidades = dict(zip(clases, datos['p']))
+            estado.update(probabilidades)
+            estado['hora'] = datos['hora']
+            self.propagador.observar(est, riesgo_observado(probabilidades))
+
+    def restaurar(self, snapshot, eventos, clases):
+        """Carga un snapshot y reaplica en orden los eventos del WAL que le siguen ('reset' e 'iteracion')"""
+        self.aplicar_estaciones(snapshot['estaciones'], clases)
+        indice = self.propagador.topologia.indice
+        for nombre, vector in (('observado', self.propagador.observado), ('riesgo', self.propagador.riesgo)):
+            for est, valor in snapshot[nombre].items():
+                if est in indice:
+                    vector[indice[est]] = valor
+        for evento in eventos:
+            if evento['tipo'] == 'reset':
+                self.reiniciar()
+            elif evento['tipo'] == 'iteracion':
+                self.aplicar_estaciones(evento['estaciones'], clases)
+                self.propagador.paso()
+
+    def memoria_bytes(self):
+        """Memoria estimada de la sesión (estado, vectores de riesgo y ventana de duplicados)"""
+        return (self._bytes_estado + self.propagador.observado.nbytes + self.propagador.riesgo.nbytes
+                + len(self.ventana_duplicados) * BYTES_POR_DUPLICADO)
+
+    def resumen(self):
+        return {
+            "sesion": self.id,
+            "semilla": self.semilla,
+            "creada": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.creada)),
+            "inactiva_segundos": round(time.monotonic() - self.ultimo_uso, 1),
+            "iteraciones": self.iteraciones,
+            "memoria_bytes": self.memoria_bytes(),
+        }
+
+
+# ================= ALMACÉN =================
+class AlmacenSesiones:
+    """
+    Sesiones en memoria, en orden LRU (OrderedDict). Se descartan las que llevan más de
+    `inactividad_s` sin usarse y, si aun así se pasa de `max_sesiones` o de `max_bytes`
+    estimados, las de uso menos reciente. `fabrica(sesion_id, semilla)` crea la sesión.
+    """
+
+    def __init__(self, fabrica, max_sesiones=MAX_SESIONES, max_bytes=MAX_BYTES,
+                 inactividad_s=INACTIVIDAD_SEGUNDOS):
+        self.fabrica = fabrica
+        self.max_sesiones = max_sesiones
+        self.max_bytes = max_bytes
+        self.inactividad_s = inactividad_s
+        self._sesiones = OrderedDict()
+        self.descartadas = 0
+
+    def __len__(self):
+        return len(self._sesiones)
+
+    def __iter__(self):
+        return iter(list(self._sesiones.values()))
+
+    def crear(self, semilla=None):
+        sesion = self.fabrica(uuid.uuid4().hex[:16], semilla)
+        self._sesiones[sesion.id] = sesion
+        self.purgar(conservar=sesion.id)
+        return sesion
+
+    def obtener(self, sesion_id):
+        """La sesión (marcada como usada) o None si no existe o ya se descartó"""
+        self.purgar()
+        sesion = self._sesiones.get(sesion_id)
+        if sesion is not None:
+            sesion.ultimo_uso = time.monotonic()
+            self._sesiones.move_to_end(sesion_id)
+        return sesion
+
+    def eliminar(self, sesion_id):
+        return self._sesiones.pop(sesion_id, None) is not None
+
+    def memoria_bytes(self):
+        return sum(sesion.memoria_bytes() for sesion in self._sesiones.values())
+
+    def purgar(self, conservar=None):
+        """Descarta sesiones inactivas y, si hace falta, las de uso menos reciente"""
+        limite = time.monotonic() - self.inactividad_s
+        for sesion_id, sesion in list(self._sesiones.items()):
+            if sesion.ultimo_uso >= limite:
+                break  # En orden LRU: las siguientes se usaron más recientemente
+            if sesion_id != conservar:
+                del self._sesiones[sesion_id]
+                self.descartadas += 1
+
+        memoria = self.memoria_bytes()
+        for sesion_id in list(self._sesiones):
+            if len(self._sesiones) <= self.max_sesiones and memoria <= self.max_bytes:
+                break
+            if sesion_id == conservar:
+                continue
+            memoria -= self._sesiones.pop(sesion_id).memoria_bytes()
+            self.descartadas += 1
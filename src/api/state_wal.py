@@ -0,0 +1,144 @@
+import json
+import os
+from pathlib import Path
+
+from src.api.dir_lock import bloquear_directorio
+
+# ================= FORMATO =================
+# El directorio de estado tiene:
+#   - snapshot_<n>.json : estado completo después del evento n (se escribe en un .tmp y se
+#                         publica con os.replace, así que nunca queda a medias)
+#   - wal_<n>.log       : eventos a partir del n, una línea JSON por evento
+# Al arrancar se carga el snapshot más reciente y se reaplican los eventos posteriores;
+# cada SNAPSHOT_CADA eventos se toma un snapshot nuevo y se borran los logs anteriores,
+# así que el arranque nunca reaplica más que eso sin importar cuánto lleve corriendo.
+ESTADO_DIR = "data/state"
+PREFIJO_SNAPSHOT = "snapshot_"
+PREFIJO_LOG = "wal_"
+SNAPSHOT_CADA = 1000
+
+
+def _numero(ruta, prefijo):
+    try:
+        return int(ruta.stem[len(prefijo):])
+    except ValueError:
+        return None
+
+
+def _escribir_atomico(ruta, contenido):
+    tmp = ruta.with_name(ruta.name + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(contenido)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, ruta)
+
+
+class BitacoraEstado:
+    """
+    Write-ahead log del estado de las estaciones. No sabe qué contiene cada evento: la API
+    le pasa diccionarios serializables y al arrancar recibe de vuelta el último snapshot y
+    los eventos que le siguen, en orden, para reaplicarlos.
+
+    Cada evento se escribe y se vacía al sistema operativo antes de responder (sobrevive
+    a que el proceso muera); con `fsync=True` también a un corte de energía, a cambio de
+    una escritura síncrona al disco por iteración. Una última línea cortada por una caída
+    se ignora al leer.
+    """
+
+    def __init__(self, directorio=ESTADO_DIR, snapshot_cada=SNAPSHOT_CADA, fsync=False):
+        self.directorio = Path(directorio)
+        # Un solo escritor: otro proceso con el mismo directorio lanza DirectorioOcupado
+        self._candado = bloquear_directorio(self.directorio)
+        self.snapshot_cada = snapshot_cada
+        self.fsync = fsync
+        self.secuencia = 0        # Número del último evento escrito
+        self.pendientes = 0       # Eventos desde el último snapshot
+        self._log = None
+
+    def _archivos(self, prefijo, extension):
+        archivos = []
+        for ruta in self.directorio.glob(f"{prefijo}*{extension}"):
+            n = _numero(ruta, prefijo)
+            if n is not None:
+                archivos.append((n, ruta))
+        return sorted(archivos)
+
+    def recuperar(self):
+        """
+        (snapshot, eventos): el snapshot más reciente (o None) y los eventos posteriores
+        en orden. Deja la bitácora lista para seguir escribiendo en un log nuevo.
+        """
+        snapshot = None
+        base = 0
+        for n, ruta in reversed(self._archivos(PREFIJO_SNAPSHOT, '.json')):
+            try:
+                with open(ruta, 'r', encoding='utf-8') as f:
+                    snapshot = json.load(f)
+                base = n
+                break
+            except (OSError, ValueError):
+                print(f"⚠️ Snapshot ilegible, se usa el anterior: {ruta.name}")
+
+        eventos = []
+        ultimo = base
+        for _, ruta in self._archivos(PREFIJO_LOG, '.log'):
+            with open(ruta, 'r', encoding='utf-8') as f:
+                for linea in f:
+                    try:
+                        evento = json.loads(linea)
+                    except ValueError:
+                        break  # Línea incompleta de una caída: el resto del archivo no es confiable
+                    if evento['n'] > ultimo:
+                        eventos.append(evento)
+                        ultimo = evento['n']
+
+        self.secuencia = ultimo
+        self.pendientes = len(eventos)
+        self._abrir_log()
+        return snapshot, eventos
+
+    def _abrir_log(self):
+        if self._log is not None:
+            self._log.close()
+        ruta = self.directorio / f"{PREFIJO_LOG}{self.secuencia + 1:012d}.log"
+        if ruta.exists():
+            # Mismo número que un log de un arranque anterior sin eventos nuevos: se quita
+            # una posible línea cortada para que la siguiente no quede pegada a ella
+            contenido = ruta.read_bytes()
+            with open(ruta, 'r+b') as f:
+                f.truncate(contenido.rfind(b'\n') + 1)
+        self._log = open(ruta, 'a', encoding='utf-8')
+
+    def registrar(self, evento):
+        """Agrega un evento al log (le asigna su número 'n'); regresa True si toca snapshot"""
+        self.secuencia += 1
+        self.pendientes += 1
+        self._log.write(json.dumps({'n': self.secuencia, **evento}, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self._log.flush()
+        if self.fsync:
+            os.fsync(self._log.fileno())
+        return self.pendientes >= self.snapshot_cada
+
+    def snapshot(self, estado):
+        """Guarda el estado completo y descarta los logs y snapshots que ya cubre"""
+        ruta = self.directorio / f"{PREFIJO_SNAPSHOT}{self.secuencia:012d}.json"
+        _escribir_atomico(ruta, json.dumps(estado, ensure_ascii=False, separators=(',', ':')))
+        self._abrir_log()
+        self.pendientes = 0
+
+        for n, anterior in self._archivos(PREFIJO_SNAPSHOT, '.json'):
+            if n < self.secuencia:
+                anterior.unlink(missing_ok=True)
+        for n, log in self._archivos(PREFIJO_LOG, '.log'):
+            if n <= self.secuencia:
+                log.unlink(missing_ok=True)
+
+    def cerrar(self, estado=None):
+        """Cierra el log; con `estado` deja un snapshot para que el próximo arranque no reaplique nada"""
+        if self._log is not None:
+            if estado is not None:
+                self.snapshot(estado)
+            self._log.close()
+            self._log = None
+        self._candado.close()
@@ -1,13 +1,17 @@
-import json
-import random
+import os
 import numpy as np
+import pandas as pd
 from sentence_transformers import SentenceTransformer
+from src.features.feature_store import FeatureStoreWriter
 
-# 1. Cargar modelo
-print("Cargando modelo de embeddings...")
-model = SentenceTransformer('xlm-roberta-base')
+# ================= CONFIG =================
+N_REGISTROS = int(os.getenv("N_REGISTROS", "1000"))  # Aumentamos a 1000 para que aprenda mejor la variabilidad
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "50000"))   # Filas por bloque escrito a disco (memoria acotada)
+RUIDO_STD = 0.02                                     # Ruido gaussiano: media 0, desviación 0.02
+SEED = int(os.getenv("SEED", "42"))
+OUTPUT_DIR = "datos_entrenamiento"
 
-# 2. SEMILLAS MEJORADAS Y AMPLIADAS
+# SEMILLAS MEJORADAS Y AMPLIADAS
 # Incluyen tus templates originales, los de la simulación y ejemplos reales de Twitter
 semillas = {
     0: [ # Normal
@@ -52,39 +56,68 @@ semillas = {
 estaciones = ["Observatorio", "Tacubaya", "Balderas", "Pino Suárez", "Pantitlán", "Merced", "Zaragoza"]
 dias = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
 
-datos_coherentes = []
-N_REGISTROS = 1000  # Aumentamos a 1000 para que aprenda mejor la variabilidad
-
-print(f"Generando {N_REGISTROS} registros con DATA AUGMENTATION...")
-
-for _ in range(N_REGISTROS):
-    # 1. Elegir categoría y frase base
-    target = random.randint(0, 4)
-    frase_base = random.choice(semillas[target])
-    
-    # 2. Generar vector base
-    vector = model.encode(frase_base).tolist()
-    
-    # 3. DATA AUGMENTATION (El secreto para que funcione)
-    # Añadimos un poco de ruido aleatorio al vector.
-    # Esto simula que la frase es "ligeramente diferente" (sinónimos, typos, etc.)
-    # Ruido gaussiano: media 0, desviación 0.02
-    ruido = np.random.normal(0, 0.02, size=len(vector))
-    vector_con_ruido = (np.array(vector) + ruido).tolist()
-    
-    dato = {
-        "vector_tweet": vector_con_ruido, # Usamos el vector "sucio" para entrenar robustez
-        "estacion_tweet": random.choice(estaciones),
-        "hora_tweet": random.randint(5, 23),
-        "dia_semana": random.choice(dias),
-        "target_falla": target
-    }
-    datos_coherentes.append(dato)
-
-# Guardar
-with open('datos_entrenamiento.json', 'w', encoding='utf-8') as f:
-    json.dump(datos_coherentes, f)
-
-print("✅ Archivo 'datos_entrenamiento.json' mejorado generado.")
-print("   Ahora entrena tu modelo de nuevo. La precisión bajará del 100% (quizás al 95%),")
-print("   pero funcionará MUCHO mejor en la simulación real.")
\ No newline at end of file
+
+def embeber_semillas(model):
+    """
+    Codifica cada frase semilla UNA sola vez en un único batch.
+    Regresa la matriz de embeddings (una fila por semilla) y, por clase,
+    el desplazamiento y el número de semillas dentro de esa matriz.
+    """
+    clases = sorted(semillas.keys())
+    frases = [frase for clase in clases for frase in semillas[clase]]
+    tamanos = np.array([len(semillas[clase]) for clase in clases])
+    offsets = np.concatenate([[0], np.cumsum(tamanos)[:-1]])
+
+    print(f"Codificando {len(frases)} semillas únicas en un solo batch...")
+    emb_semillas = model.encode(frases, batch_size=64, convert_to_numpy=True).astype(np.float32)
+    return emb_semillas, offsets, tamanos
+
+
+def generar_datos(emb_semillas, offsets, tamanos, n_registros=N_REGISTROS,
+                  output_dir=OUTPUT_DIR, chunk_size=CHUNK_SIZE, seed=SEED):
+    """
+    Genera los registros por bloques y los escribe en un feature store binario.
+    La augmentación se aplica vectorizada sobre todo el bloque.
+    """
+    rng = np.random.default_rng(seed)
+    n_clases = len(tamanos)
+    dim = emb_semillas.shape[1]
+
+    with FeatureStoreWriter(output_dir, dim, columnas_categoricas=['estacion_tweet', 'dia_semana']) as writer:
+        for inicio in range(0, n_registros, chunk_size):
+            n = min(chunk_size, n_registros - inicio)
+
+            # 1. Elegir categoría y frase base (índice dentro de la matriz de semillas)
+            targets = rng.integers(0, n_clases, size=n)
+            idx_frase = offsets[targets] + (rng.random(n) * tamanos[targets]).astype(np.int64)
+
+            # 2. DATA AUGMENTATION (El secreto para que funcione)
+            # Añadimos un poco de ruido aleatorio al vector.
+            # Esto simula que la frase es "ligeramente diferente" (sinónimos, typos, etc.)
+            vectores = emb_semillas[idx_frase]
+            vectores += RUIDO_STD * rng.standard_normal(vectores.shape, dtype=np.float32)
+
+            metadata = pd.DataFrame({
+                "estacion_tweet": np.asarray(estaciones)[rng.integers(0, len(estaciones), size=n)],
+                "hora_tweet": rng.integers(5, 24, size=n),
+                "dia_semana": np.asarray(dias)[rng.integers(0, len(dias), size=n)],
+                "target_falla": targets,
+            })
+            # Usamos el vector "sucio" para entrenar robustez
+            writer.agregar(vectores, metadata)
+
+    return writer.n_filas
+
+
+if __name__ == '__main__':
+    print("Cargando modelo de embeddings...")
+    model = SentenceTransformer('xlm-roberta-base')
+
+    emb_semillas, offsets, tamanos = embeber_semillas(model)
+
+    print(f"Generando {N_REGISTROS} registros con DATA AUGMENTATION (bloques de {CHUNK_SIZE})...")
+    n_filas = generar_datos(emb_semillas, offsets, tamanos)
+
+    print(f"✅ Feature store '{OUTPUT_DIR}/' generado con {n_filas} registros.")
+    print("   Ahora entrena tu modelo de nuevo. La precisión bajará del 100% (quizás al 95%),")
+    print("   pero funcionará MUCHO mejor en la simulación real.")
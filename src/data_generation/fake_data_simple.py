@@ -1,26 +1,25 @@
-import json
 import numpy as np
-import random
+import pandas as pd
+from src.features.feature_store import FeatureStoreWriter
 
 # Generamos 1000 datos falsos
-datos_fake = []
+N_REGISTROS = 1000
 estaciones = ["Tacubaya", "Polanco", "Mixcoac", "Barranca", "Zapata"]
 dias = ["Lunes", "Martes", "Miercoles", "Jueves", "Viernes"]
 
-for i in range(1000):
-    # Simulamos vector de 768 dimensiones
-    vector = np.random.rand(768).tolist() 
-    
-    dato = {
-        "vector_tweet": vector,
-        "estacion_tweet": random.choice(estaciones),
-        "hora_tweet": random.randint(5, 23),
-        "dia_semana": random.choice(dias),
-        "target_falla": random.randint(0, 4) # 5 clases de falla
-    }
-    datos_fake.append(dato)
+rng = np.random.default_rng()
 
-with open('datos_entrenamiento.json', 'w') as f:
-    json.dump(datos_fake, f)
+# Simulamos vectores de 768 dimensiones (todo el bloque de una vez)
+vectores = rng.random((N_REGISTROS, 768), dtype=np.float32)
 
-print("✅ Archivo 'datos_entrenamiento.json' generado con 1000 registros pesados.")
\ No newline at end of file
+metadata = pd.DataFrame({
+    "estacion_tweet": np.asarray(estaciones)[rng.integers(0, len(estaciones), size=N_REGISTROS)],
+    "hora_tweet": rng.integers(5, 24, size=N_REGISTROS),
+    "dia_semana": np.asarray(dias)[rng.integers(0, len(dias), size=N_REGISTROS)],
+    "target_falla": rng.integers(0, 5, size=N_REGISTROS),  # 5 clases de falla
+})
+
+with FeatureStoreWriter('datos_entrenamiento', 768, columnas_categoricas=['estacion_tweet', 'dia_semana']) as writer:
+    writer.agregar(vectores, metadata)
+
+print(f"✅ Feature store 'datos_entrenamiento/' generado con {N_REGISTROS} registros pesados.")
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+from src.features.corpus_reader import iterar_registros
+
+# ================= CONFIGURACIÓN =================
+# Raíz del proyecto (dos niveles arriba de este archivo)
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+FEATURES_JSON_PATH = BASE_DIR / "data/processed/features.json"
+PHRASE_BANK_PATH = BASE_DIR / "data/processed/phrase_bank.json"
+
+# Versión del formato del artefacto; si cambia la lógica de extracción se incrementa
+# para forzar la reconstrucción de bancos viejos.
+PHRASE_BANK_VERSION = 1
+
+TTL_SEGUNDOS = 300.0     # Cada cuánto se revisa si features.json cambió
+
+LONGITUD_MIN_FRASE = 20
+LONGITUD_MAX_FRASE = 150
+
+# Palabras clave por clase, en orden de prioridad (la primera clase que coincide gana).
+# 0:Normal/Saturación, 1:Humo, 2:Agua, 3:Eléctrica, 4:Mecánica
+PALABRAS_CLAVE = {
+    1: ['humo', 'quemado', 'flama', 'llama'],
+    2: ['agua', 'inundada', 'filtración', 'inundación', 'lluvia', 'charco'],
+    3: ['eléctric', 'chispazo', 'apagón', 'luz', 'voltaje', 'corto'],
+    4: ['mecánic', 'freno', 'puerta', 'ruido', 'motor', 'frenado'],
+    0: ['saturación', 'lleno', 'gente', 'fila', 'espera', 'retraso'],
+}
+
+# Una sola alternancia compilada por clase en lugar de escanear palabra por palabra
+PATRONES_CLASE = {
+    clase: re.compile('|'.join(re.escape(palabra) for palabra in palabras))
+    for clase, palabras in PALABRAS_CLAVE.items()
+}
+
+_SEPARADOR_ORACIONES = re.compile(r'[.!?]')
+
+# Bancos cargados en memoria por (fuente, artefacto): {firma, revisado, frases}
+_bancos = {}
+_banco_lock = threading.Lock()
+
+
+# ================= CLASIFICACIÓN POR PALABRAS CLAVE =================
+def clasificar_por_palabras_clave(texto):
+    """
+    Devuelve la clase (0-4) cuya alternancia de palabras clave coincide primero
+    con el texto, o None si ninguna coincide.
+    """
+    texto_lower = texto.lower()
+    for clase, patron in PATRONES_CLASE.items():
+        if patron.search(texto_lower):
+            return clase
+    return None
+
+
+# ================= HUELLA DEL ARCHIVO FUENTE =================
+def _stat_fuente(json_path):
+    stat = os.stat(json_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _sha256_archivo(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for bloque in iter(lambda: f.read(chunk_size), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+# ================= CONSTRUCCIÓN DEL BANCO =================
+def _extraer_frases(json_path):
+    """Recorre el corpus y agrupa oraciones únicas por clase"""
+    frases_por_tipo = {clase: set() for clase in sorted(PALABRAS_CLAVE)}
+
+    # Lectura incremental: nunca se carga el corpus completo en memoria
+    for item in iterar_registros(json_path):
+        resumen = item['X_features'].get('resumen_para_roberta') or ''
+        for oracion in _SEPARADOR_ORACIONES.split(resumen):
+            oracion = oracion.strip()
+            if len(oracion) < LONGITUD_MIN_FRASE or len(oracion) > LONGITUD_MAX_FRASE:
+                continue
+            clase = clasificar_por_palabras_clave(oracion)
+            if clase is not None:
+                frases_por_tipo[clase].add(oracion)
+
+    # Orden estable para que el artefacto sea reproducible
+    return {clase: sorted(frases) for clase, frases in frases_por_tipo.items()}
+
+
+def construir_banco_frases(json_path=FEATURES_JSON_PATH, output_path=PHRASE_BANK_PATH):
+    """
+    Paso de construcción explícito: extrae las frases del corpus y guarda un
+    artefacto compacto con frases deduplicadas por clase y la huella de la fuente.
+    """
+    json_path = Path(json_path)
+    output_path = Path(output_path)
+
+    frases_por_tipo = _extraer_frases(json_path)
+    artefacto = {
+        "version": PHRASE_BANK_VERSION,
+        "fuente": {
+            **_stat_fuente(json_path),
+            "sha256": _sha256_archivo(json_path),
+        },
+        "frases": {str(clase): frases for clase, frases in frases_por_tipo.items()},
+    }
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_suffix(output_path.suffix + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(artefacto, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, output_path)
+
+    total = sum(len(frases) for frases in frases_por_tipo.values())
+    print(f"✅ Banco de frases construido: {total} frases en '{output_path}'")
+    return frases_por_tipo
+
+
+def _leer_artefacto_vigente(json_path, output_path):
+    """Regresa las frases del artefacto si sigue vigente respecto a la fuente, o None"""
+    try:
+        with open(output_path, 'r', encoding='utf-8') as f:
+            artefacto = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if artefacto.get("version") != PHRASE_BANK_VERSION:
+        return None
+
+    fuente = artefacto.get("fuente", {})
+    stat_actual = _stat_fuente(json_path)
+    if (fuente.get("size"), fuente.get("mtime_ns")) != (stat_actual["size"], stat_actual["mtime_ns"]):
+        # El stat cambió (p. ej. tras un checkout): solo invalidamos si cambió el contenido
+        if fuente.get("sha256") != _sha256_archivo(json_path):
+            return None
+
+    return {int(clase): frases for clase, frases in artefacto["frases"].items()}
+
+
+def _firma_fuente(json_path):
+    try:
+        stat = _stat_fuente(json_path)
+    except FileNotFoundError:
+        return None
+    return (stat["size"], stat["mtime_ns"])
+
+
+def cargar_banco_frases(json_path=FEATURES_JSON_PATH, output_path=PHRASE_BANK_PATH, ttl_s=TTL_SEGUNDOS):
+    """
+    Carga perezosa del banco de frases. Usa el artefacto precompilado si está
+    vigente y lo reconstruye si el JSON fuente cambió. Devuelve un dict vacío si
+    no existe el corpus fuente.
+
+    El banco queda en memoria por fuente; el stat de la fuente se revisa a lo más una
+    vez cada `ttl_s` segundos, así que un proceso largo (la API) ve un features.json
+    nuevo (o uno que antes faltaba) sin reiniciarse.
+    """
+    clave = (str(json_path), str(output_path))
+    banco = _bancos.get(clave)
+    if banco is not None and time.monotonic() - banco["revisado"] <= ttl_s:
+        return banco["frases"]
+
+    with _banco_lock:
+        banco = _bancos.get(clave)
+        if banco is not None and time.monotonic() - banco["revisado"] <= ttl_s:
+            return banco["frases"]
+
+        firma = _firma_fuente(json_path)
+        if banco is not None and firma == banco["firma"]:
+            banco["revisado"] = time.monotonic()
+            return banco["frases"]
+
+        if firma is None:
+            print("⚠️  No se encontró features.json. Usando solo frases sintéticas.")
+            frases = {}
+        else:
+            frases = _leer_artefacto_vigente(json_path, output_path)
+            if frases is None:
+                frases = construir_banco_frases(json_path, output_path)
+
+        _bancos[clave] = {"firma": firma, "revisado": time.monotonic(), "frases": frases}
+        return frases
+
+
+def invalidar_cache():
+    """Descarta los bancos en memoria para forzar una nueva carga en el siguiente uso"""
+    with _banco_lock:
+        _bancos.clear()
+
+
+if __name__ == '__main__':
+    construir_banco_frases()
@@ -1,16 +1,18 @@
+import math
 import random
 import json
-import re
+from src.data_generation.phrase_bank import FEATURES_JSON_PATH, cargar_banco_frases
+from src.features.metro_network import cargar_red
 
 # ================= 1. COMPONENTES EXTRAÍDOS DEL DATASET REAL (DATOS_CRUDOS) =================
 
-# A. ESTACIONES REALES DE LA LÍNEA 1
-estaciones_L1 = [
-    "Observatorio", "Tacubaya", "Juanacatlán", "Chapultepec", "Sevilla",
-    "Insurgentes", "Cuauhtémoc", "Balderas", "Salto del Agua", "Isabel la Católica",
-    "Pino Suárez", "Merced", "Candelaria", "San Lázaro", "Moctezuma", "Balbuena",
-    "Boulevard Puerto Aéreo", "Gómez Farías", "Zaragoza", "Pantitlán"
-]
+# A. ESTACIONES REALES (definición compartida de la red: todas las líneas)
+RED = cargar_red()
+
+# Dispersión (metros) de la ubicación de un tweet geolocalizado alrededor de su estación
+DISPERSION_GEO_M = 150.0
+# Fracción de tweets geolocalizados que no nombran la estación ("aquí en el andén...")
+PROB_GEO_SIN_ESTACION = 0.3
 
 # B. EMOCIONES / RUIDO (Comentarios sobre congestión, quejas y vida diaria)
 emociones_ruido = [
@@ -68,67 +70,29 @@ tipos_usuario = [
 
 # ================= NUEVO: COMPONENTES DEL JSON =================
 
-def cargar_frases_json(json_path="data/processed/features.json"):
+def coordenadas_cerca_de(estacion, dispersion_m=DISPERSION_GEO_M, rng=random):
+    """Punto aleatorio (normal) alrededor de la estación, como lo reportaría un teléfono"""
+    lat, lon = RED.coordenadas[estacion]
+    dlat = rng.gauss(0.0, dispersion_m) / 111_320.0
+    dlon = rng.gauss(0.0, dispersion_m) / (111_320.0 * math.cos(math.radians(lat)))
+    return {"lat": round(lat + dlat, 6), "lon": round(lon + dlon, 6)}
+
+def cargar_frases_json(json_path=FEATURES_JSON_PATH):
     """
-    Carga y extrae frases reales del JSON para enriquecer los reportes
+    Carga las frases reales del JSON para enriquecer los reportes.
+    Usa el banco precompilado (ver phrase_bank.py) y solo reprocesa el JSON si cambió.
     """
-    try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            datos = json.load(f)
-        
-        frases_por_tipo = {
-            0: [],  # Normal/Saturación
-            1: [],  # Humo
-            2: [],  # Agua  
-            3: [],  # Eléctrica
-            4: []   # Mecánica
-        }
-        
-        for item in datos:
-            resumen = item['X_features']['resumen_para_roberta']
-            
-            # Extraer frases cortas y clasificarlas
-            oraciones = re.split(r'[.!?]', resumen)
-            for oracion in oraciones:
-                oracion = oracion.strip()
-                if len(oracion) < 20 or len(oracion) > 150:
-                    continue
-                    
-                # Clasificar por palabras clave (igual que tu lógica actual)
-                oracion_lower = oracion.lower()
-                
-                if any(palabra in oracion_lower for palabra in ['humo', 'quemado', 'flama', 'llama']):
-                    frases_por_tipo[1].append(oracion)
-                elif any(palabra in oracion_lower for palabra in ['agua', 'inundada', 'filtración', 'inundación', 'lluvia', 'charco']):
-                    frases_por_tipo[2].append(oracion)
-                elif any(palabra in oracion_lower for palabra in ['eléctric', 'chispazo', 'apagón', 'luz', 'voltaje', 'corto']):
-                    frases_por_tipo[3].append(oracion)
-                elif any(palabra in oracion_lower for palabra in ['mecánic', 'freno', 'puerta', 'ruido', 'motor', 'frenado']):
-                    frases_por_tipo[4].append(oracion)
-                elif any(palabra in oracion_lower for palabra in ['saturación', 'lleno', 'gente', 'fila', 'espera', 'retraso']):
-                    frases_por_tipo[0].append(oracion)
-        
-        # Limpiar frases duplicadas
-        for tipo in frases_por_tipo:
-            frases_por_tipo[tipo] = list(set(frases_por_tipo[tipo]))
-            
-        print(f"✅ Cargadas {sum(len(frases) for frases in frases_por_tipo.values())} frases reales del JSON")
-        return frases_por_tipo
-        
-    except FileNotFoundError:
-        print("⚠️  No se encontró features.json. Usando solo frases sintéticas.")
-        return None
-
-# Cargar frases del JSON al inicio
-frases_json = cargar_frases_json()
+    return cargar_banco_frases(json_path=json_path) or None
 
-def obtener_reporte_mejorado(clase_falla):
+def obtener_reporte_mejorado(clase_falla, rng=random):
     """
     Obtiene un reporte que puede venir del JSON o de las frases sintéticas
     """
-    # 60% de probabilidad de usar frases del JSON si están disponibles
-    if frases_json and random.random() < 0.6 and frases_json[clase_falla]:
-        frase_json = random.choice(frases_json[clase_falla])
+    # 60% de probabilidad de usar frases del JSON si están disponibles.
+    # El banco se carga de forma perezosa en el primer uso, no al importar el módulo.
+    frases_json = cargar_banco_frases()
+    if frases_json and rng.random() < 0.6 and frases_json[clase_falla]:
+        frase_json = rng.choice(frases_json[clase_falla])
         
         # Acortar y adaptar frases largas del JSON
         if len(frase_json) > 120:
@@ -150,15 +114,18 @@ def obtener_reporte_mejorado(clase_falla):
         return frase_json
     else:
         # Fallback a frases sintéticas originales
-        return random.choice(reportes_falla[clase_falla])
+        return rng.choice(reportes_falla[clase_falla])
 
 # ================= 2. LÓGICA DE COMBINACIÓN (MEJORADA) =================
 
-def generar_tweet_simulado(num_tweets=15):
+def generar_tweet_simulado(num_tweets=15, estaciones=None, rng=random):
     """
     Genera una lista de tweets simulados combinando componentes aleatorios 
     de estaciones, reportes de falla y ruido emocional.
+    `estaciones` limita las estaciones posibles (por defecto, toda la red).
+    `rng` (un random.Random con semilla) hace reproducible la secuencia de tweets.
     """
+    estaciones = estaciones or RED.estaciones
     tweets_simulados = []
     
     # Garantizamos al menos 2 reportes de cada clase crítica (1, 2, 3, 4)
@@ -167,29 +134,37 @@ def generar_tweet_simulado(num_tweets=15):
     
     clases_extra = [0] * (num_tweets - len(base_clases))
     clases_a_generar = base_clases + clases_extra
-    random.shuffle(clases_a_generar)
+    rng.shuffle(clases_a_generar)
 
     for i in range(num_tweets):
         # 1. Seleccionar la clase de falla y el reporte base (C)
-        clase_falla = clases_a_generar[i] if i < len(clases_a_generar) else random.randint(0, 4)
-        reporte_base = obtener_reporte_mejorado(clase_falla)
+        clase_falla = clases_a_generar[i] if i < len(clases_a_generar) else rng.randint(0, 4)
+        reporte_base = obtener_reporte_mejorado(clase_falla, rng)
         
         # 2. Seleccionar componentes aleatorios
-        estacion = random.choice(estaciones_L1) # A
-        ruido = random.choice(emociones_ruido)  # B
-        usuario = random.choice(tipos_usuario)  # D
+        estacion = rng.choice(estaciones) # A
+        ruido = rng.choice(emociones_ruido)  # B
+        usuario = rng.choice(tipos_usuario)  # D
         
-        # 3. Construir el texto final (Formato típico de reporte)
-        tweet_text = f"@MetroCDMX en **{estacion}**, {reporte_base}. {ruido}"
+        geo_enabled = rng.choice([True, False, False])
+
+        # 3. Construir el texto final (Formato típico de reporte). Algunos tweets
+        # geolocalizados no nombran la estación: solo la ubicación la identifica.
+        if geo_enabled and rng.random() < PROB_GEO_SIN_ESTACION:
+            tweet_text = f"@MetroCDMX aquí, {reporte_base}. {ruido}"
+        else:
+            tweet_text = f"@MetroCDMX en **{estacion}**, {reporte_base}. {ruido}"
         
         # 4. Construir el JSON simulado (Añadiendo la etiqueta 'clase_real' para validación)
         tweet_json = {
             "source": "Twitter",
-            "user": f"{usuario}_{random.randint(100, 999)}",
+            "user": f"{usuario}_{rng.randint(100, 999)}",
             "text": tweet_text,
-            "geo_enabled": random.choice([True, False, False]),
+            "geo_enabled": geo_enabled,
+            "coordinates": coordenadas_cerca_de(estacion, rng=rng) if geo_enabled else None,
             # ESTO ES SOLO PARA VALIDACIÓN, NO SE LO PASES AL MODELO EN PRODUCCIÓN:
-            "clase_real": clase_falla
+            "clase_real": clase_falla,
+            "estacion_real": estacion
         }
         tweets_simulados.append(tweet_json)
         
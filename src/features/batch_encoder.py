@@ -0,0 +1,115 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Modelo del proceso actual (el proceso principal o cada worker del pool)
+_modelo_local = None
+_modelo_local_nombre = None
+
+
+def _cargar_modelo(model_name):
+    global _modelo_local, _modelo_local_nombre
+    if _modelo_local is None or _modelo_local_nombre != model_name:
+        from sentence_transformers import SentenceTransformer
+        print(f"Cargando modelo de embeddings ({model_name}) en el proceso {os.getpid()}...")
+        _modelo_local = SentenceTransformer(model_name)
+        _modelo_local_nombre = model_name
+    return _modelo_local
+
+
+# ================= WORKERS =================
+def _inicializar_worker(model_name, hilos_por_worker):
+    """Cada worker carga su propia copia del modelo con un presupuesto fijo de hilos"""
+    try:
+        import torch
+        torch.set_num_threads(hilos_por_worker)
+    except ImportError:
+        pass
+    _cargar_modelo(model_name)
+
+
+def _max_seq_length_worker():
+    return _modelo_local.max_seq_length
+
+
+def _codificar_batch_worker(textos):
+    return _modelo_local.encode(textos, batch_size=len(textos), convert_to_numpy=True).astype(np.float32)
+
+
+# ================= PLANEACIÓN POR LONGITUD =================
+def longitudes_tokens(tokenizer, textos):
+    """Número de tokens (con tokens especiales y sin truncar) de cada texto"""
+    ids = tokenizer(list(textos), add_special_tokens=True, truncation=False)['input_ids']
+    return np.fromiter((len(x) for x in ids), dtype=np.int64, count=len(textos))
+
+
+def planear_batches(longitudes, batch_size):
+    """
+    Ordena los textos por longitud y los parte en batches consecutivos, de modo que
+    cada batch agrupa textos de longitud parecida y el padding es mínimo.
+    """
+    orden = np.argsort(longitudes, kind='stable')
+    return [orden[i:i + batch_size] for i in range(0, len(orden), batch_size)]
+
+
+def _estadisticas(longitudes, batches, max_seq_length, segundos):
+    efectivas = np.minimum(longitudes, max_seq_length)
+    tokens = int(efectivas.sum())
+    tokens_truncados = int(np.maximum(longitudes - max_seq_length, 0).sum())
+    tokens_con_padding = int(sum(efectivas[idx].max() * len(idx) for idx in batches))
+    return {
+        "textos": int(len(longitudes)),
+        "tokens": tokens,
+        "tokens_por_segundo": tokens / segundos if segundos > 0 else 0.0,
+        "fraccion_truncada": tokens_truncados / max(int(longitudes.sum()), 1),
+        "fraccion_padding": 1.0 - tokens / max(tokens_con_padding, 1),
+        "segundos": segundos,
+    }
+
+
+# ================= CODIFICACIÓN =================
+def codificar_por_buckets(textos, model_name, batch_size=32, n_workers=0):
+    """
+    Codifica `textos` en batches agrupados por longitud. Con `n_workers > 0` reparte
+    los batches en un pool de procesos (un modelo por worker).
+    Regresa (matriz float32 alineada con `textos`, estadísticas).
+    """
+    textos = list(textos)
+    inicio = time.perf_counter()
+
+    if n_workers > 0:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        longitudes = longitudes_tokens(tokenizer, textos)
+        batches = planear_batches(longitudes, batch_size)
+
+        hilos_por_worker = max(1, (os.cpu_count() or 1) // n_workers)
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=n_workers, mp_context=contexto,
+                                 initializer=_inicializar_worker,
+                                 initargs=(model_name, hilos_por_worker)) as executor:
+            max_seq_length = executor.submit(_max_seq_length_worker).result()
+            resultados = executor.map(_codificar_batch_worker,
+                                      [[textos[i] for i in idx] for idx in batches])
+            vectores_batches = list(resultados)
+    else:
+        model = _cargar_modelo(model_name)
+        max_seq_length = model.max_seq_length
+        longitudes = longitudes_tokens(model.tokenizer, textos)
+        batches = planear_batches(longitudes, batch_size)
+        vectores_batches = [
+            model.encode([textos[i] for i in idx], batch_size=len(idx), convert_to_numpy=True)
+            for idx in batches
+        ]
+
+    # Regresar cada vector a la posición original de su texto
+    dim = vectores_batches[0].shape[1] if vectores_batches else 0
+    matriz = np.empty((len(textos), dim), dtype=np.float32)
+    for idx, vectores in zip(batches, vectores_batches):
+        matriz[idx] = vectores
+
+    stats = _estadisticas(longitudes, batches, max_seq_length, time.perf_counter() - inicio)
+    return matriz, stats
@@ -0,0 +1,134 @@
+import os
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+from src.features.corpus_reader import iterar_registros
+
+# ================= CONFIGURACIÓN =================
+FEATURES_CONTEXTO = ('temp', 'humidity', 'precip_mm', 'traffic_jam_level')
+CONTEXTO_PATH = 'data/processed/features.json'
+TTL_SEGUNDOS = 300.0     # Cada cuánto se revisa si la fuente cambió
+
+# Solo si la fuente no trae ningún valor de una feature (p. ej. no hay features.json)
+MEDIAS_POR_DEFECTO = {'temp': 25.0, 'humidity': 67.5, 'precip_mm': 0.0, 'traffic_jam_level': 2.5}
+
+
+def hora_de_timeframe(timeframe):
+    """'07:00-08:00' -> 7 (hora de inicio del bloque); None si no se entiende"""
+    try:
+        return int(str(timeframe).split(':', 1)[0]) % 24
+    except ValueError:
+        return None
+
+
+# ================= FUENTES =================
+class FuenteContexto(ABC):
+    """
+    Origen de los valores de contexto. Una fuente produce (estacion, hora, valores) con la
+    hora del día (0-23) a la que corresponden y `firma()` cambia cuando hay datos nuevos;
+    el proveedor solo vuelve a leerla entonces. Hoy la única es el archivo de features de
+    entrenamiento; un feed local de clima/tráfico sería otra subclase con la misma interfaz.
+    """
+
+    @abstractmethod
+    def firma(self):
+        ...
+
+    @abstractmethod
+    def registros(self):
+        ...
+
+
+class FuenteArchivo(FuenteContexto):
+    """`features_numericas_promedio` de cada registro de features.json, por estación y `batch_meta.timeframe`"""
+
+    def __init__(self, ruta=CONTEXTO_PATH):
+        self.ruta = ruta
+
+    def firma(self):
+        try:
+            estado = os.stat(self.ruta)
+        except FileNotFoundError:
+            return None
+        return (estado.st_mtime_ns, estado.st_size)
+
+    def registros(self):
+        if not os.path.exists(self.ruta):
+            return
+        for registro in iterar_registros(self.ruta):
+            x_features = registro['X_features']
+            hora = hora_de_timeframe(registro.get('batch_meta', {}).get('timeframe'))
+            yield x_features.get('station'), hora, x_features.get('features_numericas_promedio') or {}
+
+
+# ================= PROVEEDOR =================
+class ProveedorContexto:
+    """
+    Contexto (clima y tráfico) para puntuar un tweet: el promedio de la fuente para su
+    (estación, hora del día), con búsqueda O(1) en un índice en memoria. Si no hay datos
+    para esa celda, o falta alguna feature, se usa la media de la feature sobre todos los
+    registros, que es el valor con el que SimpleImputer(strategy='mean') imputa los
+    faltantes al entrenar (src/training/dataset.py).
+
+    El índice se reconstruye solo si la firma de la fuente cambió, y se revisa a lo más
+    una vez cada `ttl_s` segundos. `canonizar` traduce los nombres de estación de la
+    fuente a los de la red (p. ej. "Insurgentes (Línea 1)" -> "Insurgentes"); los que
+    regresan None se descartan del índice, pero sí cuentan para las medias.
+    """
+
+    def __init__(self, fuente=None, ttl_s=TTL_SEGUNDOS, canonizar=None):
+        self.fuente = fuente or FuenteArchivo()
+        self.ttl_s = ttl_s
+        self.canonizar = canonizar
+        self.indice = {}
+        self.medias = dict(MEDIAS_POR_DEFECTO)
+        self._firma = None
+        self._revisado = None
+        self.refrescar()
+
+    def refrescar(self, forzar=False):
+        """Reconstruye el índice si la fuente cambió; regresa True si lo reconstruyó"""
+        self._revisado = time.monotonic()
+        firma = self.fuente.firma()
+        if not forzar and firma is not None and firma == self._firma:
+            return False
+
+        sumas, conteos = {}, {}
+        celdas = {}
+        for estacion, hora, valores in self.fuente.registros():
+            if self.canonizar is not None and estacion is not None:
+                estacion = self.canonizar(estacion)
+            celda = celdas.setdefault((estacion, hora), ({}, {})) if estacion is not None and hora is not None else None
+            for feature in FEATURES_CONTEXTO:
+                valor = valores.get(feature)
+                if valor is None:
+                    continue
+                sumas[feature] = sumas.get(feature, 0.0) + valor
+                conteos[feature] = conteos.get(feature, 0) + 1
+                if celda is not None:
+                    celda[0][feature] = celda[0].get(feature, 0.0) + valor
+                    celda[1][feature] = celda[1].get(feature, 0) + 1
+
+        medias = dict(MEDIAS_POR_DEFECTO)
+        medias.update({f: sumas[f] / conteos[f] for f in sumas})
+        # Cada celda queda completa (las features sin datos toman la media) para no
+        # resolver faltantes en cada consulta
+        indice = {}
+        for clave, (suma, conteo) in celdas.items():
+            indice[clave] = {f: suma[f] / conteo[f] if f in suma else medias[f] for f in FEATURES_CONTEXTO}
+
+        self.indice, self.medias, self._firma = indice, medias, firma
+        return True
+
+    def contexto(self, estacion, cuando=None):
+        """{feature: valor} para la estación a la hora `cuando` (datetime; por defecto ahora)"""
+        if time.monotonic() - self._revisado > self.ttl_s:
+            self.refrescar()
+        hora = (cuando or datetime.now()).hour
+        valores = self.indice.get((estacion, hora))
+        return dict(valores if valores is not None else self.medias)
+
+    def cobertura(self):
+        """Celdas (estación, hora) con datos y estaciones distintas que cubren"""
+        return len(self.indice), len({estacion for estacion, _ in self.indice})
@@ -0,0 +1,81 @@
+import json
+
+# Tamaño de lectura del archivo (caracteres); el buffer nunca crece mucho más que
+# esto más el registro más grande del corpus.
+TAMANO_LECTURA = 1 << 16
+
+_ESPACIOS = ' \t\r\n'
+
+
+def _iterar_arreglo_json(f, primer_bloque):
+    """Decodifica uno a uno los elementos de un arreglo JSON de nivel superior"""
+    decoder = json.JSONDecoder()
+    buffer = primer_bloque
+    pos = buffer.index('[') + 1
+    fin_archivo = False
+
+    while True:
+        # Saltar espacios y comas entre elementos
+        while True:
+            while pos < len(buffer) and buffer[pos] in _ESPACIOS + ',':
+                pos += 1
+            if pos < len(buffer) or fin_archivo:
+                break
+            buffer, pos = f.read(TAMANO_LECTURA), 0
+            fin_archivo = not buffer
+
+        if pos >= len(buffer):
+            raise ValueError("Arreglo JSON sin cerrar: falta ']'")
+        if buffer[pos] == ']':
+            return
+
+        try:
+            elemento, fin = decoder.raw_decode(buffer, pos)
+            completo = fin < len(buffer) or fin_archivo
+        except json.JSONDecodeError:
+            if fin_archivo:
+                raise
+            completo = False
+
+        if not completo:
+            # El elemento está partido entre lecturas: descartar lo consumido y leer más
+            bloque = f.read(TAMANO_LECTURA)
+            fin_archivo = not bloque
+            buffer, pos = buffer[pos:] + bloque, 0
+            continue
+
+        yield elemento
+        pos = fin
+        if pos > TAMANO_LECTURA:
+            buffer, pos = buffer[pos:], 0
+
+
+def iterar_registros(json_path):
+    """
+    Lee `json_path` de forma incremental y produce uno a uno los registros que
+    tienen `X_features` (con su `Y_labels` y `batch_meta` si existen).
+    Acepta un arreglo JSON de nivel superior o JSONL (un registro por línea).
+    """
+    with open(json_path, 'r', encoding='utf-8') as f:
+        primer_bloque = f.read(TAMANO_LECTURA)
+        if primer_bloque.lstrip(_ESPACIOS + '\ufeff').startswith('['):
+            registros = _iterar_arreglo_json(f, primer_bloque)
+        else:
+            f.seek(0)
+            registros = (json.loads(linea) for linea in f if linea.strip())
+
+        for registro in registros:
+            if isinstance(registro, dict) and 'X_features' in registro:
+                yield registro
+
+
+def iterar_bloques(json_path, tamano_bloque=1000):
+    """Agrupa los registros de `iterar_registros` en listas de tamaño fijo"""
+    bloque = []
+    for registro in iterar_registros(json_path):
+        bloque.append(registro)
+        if len(bloque) >= tamano_bloque:
+            yield bloque
+            bloque = []
+    if bloque:
+        yield bloque
@@ -0,0 +1,182 @@
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+
+from src.features.feature_store import EscritorNpy
+
+# ================= FORMATO =================
+# La caché es un directorio con:
+#   - claves.npy   : hash (hex, S64) de (modelo, texto) por fila, ORDENADAS
+#   - vectores.npy : matriz float32 con el embedding de cada clave (misma fila)
+#   - meta.json    : versión, número de entradas y dimensión
+# Al estar ordenadas, las claves se buscan con búsqueda binaria sobre el memmap,
+# sin cargar la caché completa en un diccionario.
+EMBEDDING_CACHE_DIR = "data/processed/embedding_cache"
+CLAVES_FILE = "claves.npy"
+VECTORES_FILE = "vectores.npy"
+META_FILE = "meta.json"
+CACHE_VERSION = 2
+
+# Archivos de trabajo de la corrida actual (se consolidan al cerrar)
+_STAGING_CLAVES = "staging_claves.npy"
+_STAGING_VECTORES = "staging_vectores.npy"
+
+# Filas copiadas por bloque al consolidar la caché
+_BLOQUE_CONSOLIDACION = 10000
+
+
+def clave_embedding(texto, model_name):
+    """Clave de contenido: sha256 del nombre del modelo y el texto"""
+    h = hashlib.sha256()
+    h.update(model_name.encode('utf-8'))
+    h.update(b'\0')
+    h.update(texto.encode('utf-8'))
+    return h.hexdigest().encode('ascii')
+
+
+def _buscar(claves_ordenadas, claves):
+    """Fila de cada clave en `claves_ordenadas` o -1 si no está"""
+    claves = np.asarray(claves, dtype='S64')
+    if claves_ordenadas is None or len(claves_ordenadas) == 0 or len(claves) == 0:
+        return np.full(len(claves), -1, dtype=np.int64)
+    pos = np.searchsorted(claves_ordenadas, claves)
+    pos_valida = np.minimum(pos, len(claves_ordenadas) - 1)
+    return np.where(claves_ordenadas[pos_valida] == claves, pos_valida, -1)
+
+
+# ================= CACHÉ INCREMENTAL =================
+class EmbeddingCache:
+    """
+    Caché de embeddings direccionada por contenido que se consume por bloques.
+    Cada bloque se resuelve contra la caché anterior (solo se codifican los textos
+    nuevos o modificados) y se anota en archivos de trabajo; al cerrar, la caché se
+    reemplaza por exactamente las claves usadas en la corrida (recolección de basura).
+    """
+
+    def __init__(self, model_name, directorio=EMBEDDING_CACHE_DIR):
+        self.model_name = model_name
+        self.directorio = Path(directorio)
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self.codificados = 0
+
+        self._claves, self._vectores = self._abrir_cache()
+        self._staging_claves = None
+        self._staging_vectores = None
+
+    def _abrir_cache(self):
+        try:
+            with open(self.directorio / META_FILE, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get("version") != CACHE_VERSION:
+                return None, None
+            claves = np.load(self.directorio / CLAVES_FILE, mmap_mode='r')
+            vectores = np.load(self.directorio / VECTORES_FILE, mmap_mode='r')
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None, None
+
+        if len(claves) != vectores.shape[0]:
+            print(f"⚠️  Caché de embeddings inconsistente en '{self.directorio}', se descarta.")
+            return None, None
+        return claves, vectores
+
+    def embeber(self, textos, codificar):
+        """
+        Regresa la matriz float32 de embeddings alineada con `textos`. Solo se
+        llama `codificar(lista_de_textos)` con los textos que no están en caché.
+        """
+        if len(textos) == 0:
+            dim = 0 if self._vectores is None else self._vectores.shape[1]
+            return np.empty((0, dim), dtype=np.float32)
+
+        claves = np.array([clave_embedding(texto, self.model_name) for texto in textos], dtype='S64')
+        filas = _buscar(self._claves, claves)
+
+        faltan = filas < 0
+        if faltan.any():
+            # Textos únicos faltantes de este bloque
+            _, idx_primero, inversa = np.unique(
+                claves[faltan], return_index=True, return_inverse=True)
+            textos_faltantes = [textos[i] for i in np.flatnonzero(faltan)[idx_primero]]
+            vectores_nuevos = np.asarray(codificar(textos_faltantes), dtype=np.float32)
+            self.codificados += len(textos_faltantes)
+            dim = vectores_nuevos.shape[1]
+        else:
+            dim = self._vectores.shape[1]
+
+        matriz = np.empty((len(textos), dim), dtype=np.float32)
+        if (~faltan).any():
+            matriz[~faltan] = self._vectores[filas[~faltan]]
+        if faltan.any():
+            matriz[faltan] = vectores_nuevos[inversa.ravel()]
+
+        self._anotar(claves, matriz)
+        return matriz
+
+    def _anotar(self, claves, matriz):
+        if self._staging_claves is None:
+            self._staging_claves = EscritorNpy(self.directorio / _STAGING_CLAVES, 'S64')
+            self._staging_vectores = EscritorNpy(
+                self.directorio / _STAGING_VECTORES, np.float32, (matriz.shape[1],))
+        self._staging_claves.agregar(claves)
+        self._staging_vectores.agregar(matriz)
+
+    def cerrar(self):
+        """
+        Consolida la caché con las claves únicas usadas en la corrida y regresa las
+        estadísticas (reutilizados, recalculados, eliminados).
+        """
+        n_anterior = 0 if self._claves is None else len(self._claves)
+        if self._staging_claves is None:
+            return {"reutilizados": 0, "recalculados": 0, "eliminados": n_anterior,
+                    "codificados": self.codificados}
+
+        self._staging_claves.cerrar()
+        self._staging_vectores.cerrar()
+        staging_claves = np.load(self.directorio / _STAGING_CLAVES)
+        staging_vectores = np.load(self.directorio / _STAGING_VECTORES, mmap_mode='r')
+
+        # Claves únicas ordenadas (las repetidas comparten embedding)
+        claves_unicas, idx_primero = np.unique(staging_claves, return_index=True)
+        reutilizados = int((_buscar(self._claves, claves_unicas) >= 0).sum())
+
+        # Liberar los memmaps de la caché anterior antes de reemplazarla
+        self._claves = self._vectores = None
+
+        escritor_claves = EscritorNpy(self.directorio / CLAVES_FILE, 'S64')
+        escritor_vectores = EscritorNpy(self.directorio / VECTORES_FILE, np.float32,
+                                        (staging_vectores.shape[1],))
+        for inicio in range(0, len(claves_unicas), _BLOQUE_CONSOLIDACION):
+            fin = inicio + _BLOQUE_CONSOLIDACION
+            escritor_claves.agregar(claves_unicas[inicio:fin])
+            escritor_vectores.agregar(staging_vectores[idx_primero[inicio:fin]])
+        escritor_claves.cerrar()
+        escritor_vectores.cerrar()
+
+        with open(self.directorio / META_FILE, 'w', encoding='utf-8') as f:
+            json.dump({"version": CACHE_VERSION, "n_entradas": int(len(claves_unicas)),
+                       "dim": int(staging_vectores.shape[1])}, f, indent=4)
+
+        del staging_vectores
+        (self.directorio / _STAGING_CLAVES).unlink()
+        (self.directorio / _STAGING_VECTORES).unlink()
+
+        return {
+            "reutilizados": reutilizados,
+            "recalculados": int(len(claves_unicas)) - reutilizados,
+            "eliminados": n_anterior - reutilizados,
+            "codificados": self.codificados,
+        }
+
+
+def embeber_incremental(textos, model_name, codificar, directorio=EMBEDDING_CACHE_DIR):
+    """
+    Atajo para un solo bloque: resuelve `textos` contra la caché y la consolida.
+    Regresa (matriz float32 alineada con `textos`, estadísticas).
+    """
+    cache = EmbeddingCache(model_name, directorio)
+    matriz = cache.embeber(textos, codificar)
+    stats = cache.cerrar()
+    stats["registros"] = len(textos)
+    return matriz, stats
@@ -1,57 +1,84 @@
-
-import json
+import os
 import pandas as pd
-from sentence_transformers import SentenceTransformer
-import numpy as np
-
-# 1. Cargar modelo de embeddings
-print("Cargando modelo de embeddings...")
-model = SentenceTransformer('xlm-roberta-base')
-
-# 2. Cargar datos del archivo JSON
-print("Cargando features.json...")
-with open('data/processed/features.json', 'r', encoding='utf-8') as f:
-    data = json.load(f)
-
-# 3. Procesar datos y generar embeddings
-processed_data = []
-print(f"Procesando {len(data)} registros...")
-
-for entry in data:
-    # Ignorar batch_meta
-    if 'X_features' in entry:
-        x_features = entry['X_features']
-        
-        # Extraer el texto a procesar
-        texto_a_procesar = x_features.get('resumen_para_roberta', '')
-        
-        # Generar embedding
-        embedding = model.encode(texto_a_procesar).tolist()
-        
-        # Preparar los datos para el CSV
-        record = {}
-        
-        # Añadir features de X_features
-        record['station'] = x_features.get('station')
-        record.update(x_features.get('features_numericas_promedio', {}))
-
-        # Añadir el embedding como columnas separadas
-        embedding_dict = {f'embedding_{i}': val for i, val in enumerate(embedding)}
-        record.update(embedding_dict)
-        
-        # Añadir Y_labels
-        if 'Y_labels' in entry:
-            record.update(entry['Y_labels'])
-
-        processed_data.append(record)
-
-# 4. Convertir a DataFrame de pandas
-print("Convirtiendo datos a DataFrame...")
-df = pd.DataFrame(processed_data)
-
-# 5. Guardar en un archivo CSV
-output_filename = 'data/processed/features_embeddings.csv'
-print(f"Guardando datos en {output_filename}...")
-df.to_csv(output_filename, index=False, encoding='utf-8')
-
-print(f"✅ Proceso completado. Archivo '{output_filename}' generado con éxito.")
+from src.features.batch_encoder import codificar_por_buckets
+from src.features.corpus_reader import iterar_bloques
+from src.features.embedding_cache import EmbeddingCache
+from src.features.feature_store import FEATURE_STORE_DIR, FeatureStoreWriter
+
+EMBEDDING_MODEL_NAME = 'xlm-roberta-base'
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))  # Textos por batch (agrupados por longitud)
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "0"))         # 0 = sin pool de procesos
+BLOQUE_REGISTROS = int(os.getenv("BLOQUE_REGISTROS", "1000"))  # Registros leídos y escritos por bloque
+FEATURES_JSON_PATH = 'data/processed/features.json'
+
+# Columnas fijas de metadatos para que todos los bloques del CSV sean consistentes
+COLUMNAS_METADATA = ['station', 'temp', 'humidity', 'precip_mm', 'traffic_jam_level',
+                     'falla_detectada', 'target_falla']
+
+
+def codificar(textos):
+    """Codifica los textos nuevos en batches por longitud y reporta el rendimiento"""
+    matriz, stats = codificar_por_buckets(
+        textos, EMBEDDING_MODEL_NAME, batch_size=EMBED_BATCH_SIZE, n_workers=EMBED_WORKERS)
+    print(f"Codificación: {stats['textos']} textos, {stats['tokens_por_segundo']:.0f} tokens/s, "
+          f"{stats['fraccion_truncada']:.1%} de tokens truncados, "
+          f"{stats['fraccion_padding']:.1%} de padding ({stats['segundos']:.1f}s)")
+    return matriz
+
+
+def registro_a_metadata(entry):
+    """Fila de metadatos (estación, clima y etiquetas) de un registro del corpus"""
+    x_features = entry['X_features']
+    record = {}
+
+    # Añadir features de X_features
+    record['station'] = x_features.get('station')
+    record.update(x_features.get('features_numericas_promedio', {}))
+
+    # Añadir Y_labels
+    if 'Y_labels' in entry:
+        record.update(entry['Y_labels'])
+    return record
+
+
+def procesar_features(json_path=FEATURES_JSON_PATH, tamano_bloque=BLOQUE_REGISTROS):
+    # 1. Leer features.json (arreglo JSON o JSONL) de forma incremental, por bloques,
+    # para que la memoria no crezca con el tamaño del corpus
+    print(f"Procesando {json_path} en bloques de {tamano_bloque} registros...")
+
+    # 2. Los embeddings se resuelven contra la caché direccionada por contenido:
+    # cada embedding se identifica por el hash de (texto, modelo), así que solo se
+    # recalculan los resúmenes nuevos o modificados. El modelo de embeddings solo
+    # se carga si hay algo que codificar.
+    cache = EmbeddingCache(EMBEDDING_MODEL_NAME)
+    writer = None
+    n_registros = 0
+
+    for bloque in iterar_bloques(json_path, tamano_bloque):
+        textos = [entry['X_features'].get('resumen_para_roberta') or '' for entry in bloque]
+        matriz_embeddings = cache.embeber(textos, codificar)
+
+        # 3. Anexar el bloque al feature store binario (matriz float32 + metadatos)
+        if writer is None:
+            writer = FeatureStoreWriter(FEATURE_STORE_DIR, matriz_embeddings.shape[1],
+                                        columnas_categoricas=['station'])
+        writer.agregar(matriz_embeddings, pd.DataFrame([registro_a_metadata(entry) for entry in bloque],
+                                                       columns=COLUMNAS_METADATA))
+        n_registros += len(bloque)
+        print(f"  {n_registros} registros procesados...")
+
+    stats = cache.cerrar()
+    print(f"Embeddings: {stats['reutilizados']} reutilizados, {stats['recalculados']} recalculados, "
+          f"{stats['eliminados']} entradas obsoletas eliminadas de la caché.")
+
+    if writer is None:
+        print("⚠️ No se encontraron registros con 'X_features'.")
+        return
+    writer.cerrar()
+
+    print(f"✅ Proceso completado. Feature store '{FEATURE_STORE_DIR}' generado con éxito.")
+
+
+if __name__ == '__main__':
+    # El guard es necesario: con EMBED_WORKERS > 0 los workers se crean con 'spawn'
+    procesar_features()
@@ -0,0 +1,185 @@
+import json
+import os
+import struct
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# ================= FORMATO =================
+# Un feature store es un directorio con:
+#   - embeddings.npy : matriz float32 contigua (n_filas x dim), memory-mappable
+#   - metadata.csv   : tabla pequeña con estación, clima y etiquetas (una fila por registro)
+#   - schema.json    : número de filas, dimensión y columnas categóricas
+FEATURE_STORE_DIR = "data/processed/feature_store"
+EMBEDDINGS_FILE = "embeddings.npy"
+METADATA_FILE = "metadata.csv"
+SCHEMA_FILE = "schema.json"
+FEATURE_STORE_VERSION = 1
+
+# Nombre de las columnas de embedding en los DataFrames que consumen los modelos
+PREFIJO_EMBEDDING = "embedding_"
+
+# Cabecera .npy de tamaño fijo para poder reescribir la forma final al cerrar
+# sin mover los datos ya escritos (128 bytes alcanzan para cualquier forma 2D).
+_NPY_MAGIC = b'\x93NUMPY\x01\x00'
+_NPY_HEADER_SIZE = 128
+
+
+def _cabecera_npy(descr, forma):
+    dict_cabecera = repr({'descr': descr, 'fortran_order': False, 'shape': tuple(forma)})
+    espacio = _NPY_HEADER_SIZE - len(_NPY_MAGIC) - 2
+    cuerpo = dict_cabecera.encode('latin1')
+    cuerpo = cuerpo + b' ' * (espacio - len(cuerpo) - 1) + b'\n'
+    return _NPY_MAGIC + struct.pack('<H', espacio) + cuerpo
+
+
+class EscritorNpy:
+    """
+    Escribe un .npy anexando filas por bloques sin conocer el total de antemano.
+    El archivo se publica (rename atómico) al cerrar.
+    """
+
+    def __init__(self, ruta, dtype, forma_fila=()):
+        self.ruta = Path(ruta)
+        self.dtype = np.dtype(dtype)
+        self.forma_fila = tuple(forma_fila)
+        self.n_filas = 0
+        self._ruta_tmp = self.ruta.with_name(self.ruta.name + '.tmp')
+        self._f = open(self._ruta_tmp, 'wb')
+        self._f.write(_cabecera_npy(self.dtype.str, (0,) + self.forma_fila))
+
+    def agregar(self, filas):
+        filas = np.ascontiguousarray(filas, dtype=self.dtype)
+        if filas.shape[1:] != self.forma_fila:
+            raise ValueError(f"Se esperaban filas de forma {self.forma_fila}, llegó {filas.shape[1:]}")
+        self._f.write(filas.tobytes())
+        self.n_filas += filas.shape[0]
+
+    def cerrar(self):
+        self._f.seek(0)
+        self._f.write(_cabecera_npy(self.dtype.str, (self.n_filas,) + self.forma_fila))
+        self._f.close()
+        os.replace(self._ruta_tmp, self.ruta)
+
+    def descartar(self):
+        self._f.close()
+        if self._ruta_tmp.exists():
+            self._ruta_tmp.unlink()
+
+
+# ================= ESCRITURA =================
+class FeatureStoreWriter:
+    """
+    Escribe un feature store por bloques: cada llamada a `agregar` anexa las filas
+    de embeddings al .npy y las de metadatos al CSV, así la memoria queda acotada
+    al tamaño del bloque sin importar el total de registros.
+    """
+
+    def __init__(self, directorio, dim, columnas_categoricas=()):
+        self.directorio = Path(directorio)
+        self.dim = int(dim)
+        self.columnas_categoricas = list(columnas_categoricas)
+        self.n_filas = 0
+        self._columnas_metadata = None
+
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self._embeddings = EscritorNpy(self.directorio / EMBEDDINGS_FILE, np.float32, (self.dim,))
+        self._ruta_metadata_tmp = self.directorio / (METADATA_FILE + '.tmp')
+        if self._ruta_metadata_tmp.exists():
+            self._ruta_metadata_tmp.unlink()
+
+    def agregar(self, embeddings, metadata):
+        """Anexa un bloque de filas (embeddings n x dim y su DataFrame de metadatos)"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim != 2 or embeddings.shape[1] != self.dim:
+            raise ValueError(f"Se esperaban embeddings de forma (n, {self.dim}), llegó {embeddings.shape}")
+        if len(metadata) != embeddings.shape[0]:
+            raise ValueError("El bloque de metadatos y el de embeddings tienen distinto número de filas")
+
+        if self._columnas_metadata is None:
+            self._columnas_metadata = list(metadata.columns)
+
+        self._embeddings.agregar(embeddings)
+        metadata.to_csv(
+            self._ruta_metadata_tmp,
+            mode='a',
+            header=self.n_filas == 0,
+            index=False,
+            encoding='utf-8',
+            columns=self._columnas_metadata,
+        )
+        self.n_filas += embeddings.shape[0]
+
+    def cerrar(self):
+        """Escribe la forma final en la cabecera y publica los archivos de forma atómica"""
+        self._embeddings.cerrar()
+
+        if self.n_filas == 0:
+            pd.DataFrame(columns=self._columnas_metadata or []).to_csv(
+                self._ruta_metadata_tmp, index=False, encoding='utf-8')
+
+        os.replace(self._ruta_metadata_tmp, self.directorio / METADATA_FILE)
+
+        schema = {
+            "version": FEATURE_STORE_VERSION,
+            "n_filas": self.n_filas,
+            "dim": self.dim,
+            "columnas_metadata": self._columnas_metadata or [],
+            "columnas_categoricas": self.columnas_categoricas,
+        }
+        with open(self.directorio / SCHEMA_FILE, 'w', encoding='utf-8') as f:
+            json.dump(schema, f, ensure_ascii=False, indent=4)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.cerrar()
+        else:
+            self._embeddings.descartar()
+        return False
+
+
+# ================= LECTURA =================
+def leer_schema(directorio):
+    with open(Path(directorio) / SCHEMA_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def cargar_feature_store(directorio, mmap=True):
+    """
+    Carga un feature store. Los embeddings se abren como memmap (sin parsear texto;
+    las páginas se leen del disco al usarlas) y los metadatos como DataFrame con las
+    columnas categóricas ya tipadas. Regresa (embeddings, metadata).
+    """
+    directorio = Path(directorio)
+    schema = leer_schema(directorio)
+
+    embeddings = np.load(directorio / EMBEDDINGS_FILE, mmap_mode='r' if mmap else None)
+    metadata = pd.read_csv(directorio / METADATA_FILE, encoding='utf-8')
+    for col in schema.get("columnas_categoricas", []):
+        if col in metadata.columns:
+            metadata[col] = metadata[col].astype('category')
+
+    if embeddings.shape[0] != len(metadata):
+        raise ValueError(f"Feature store inconsistente en '{directorio}': "
+                         f"{embeddings.shape[0]} embeddings vs {len(metadata)} filas de metadatos")
+    return embeddings, metadata
+
+
+def construir_dataframe(embeddings, metadata, columnas_metadata, prefijo=PREFIJO_EMBEDDING):
+    """
+    Arma el DataFrame de features que espera CatBoost: primero las columnas de
+    metadatos indicadas y después una columna por dimensión del embedding.
+    La matriz float32 no pasa por texto, pero el concat sí la copia completa a un
+    bloque nuevo en memoria: el DataFrame resultante no es una vista del memmap.
+    """
+    df_embeddings = pd.DataFrame(
+        embeddings,
+        columns=[f"{prefijo}{i}" for i in range(embeddings.shape[1])],
+        index=metadata.index,
+        copy=False,
+    )
+    return pd.concat([metadata[list(columnas_metadata)], df_embeddings], axis=1)
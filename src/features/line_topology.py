@@ -0,0 +1,110 @@
+import numpy as np
+from scipy import sparse
+
+# ================= CONFIGURACIÓN =================
+PESO_TRAMO = 1.0        # Estaciones consecutivas de una misma línea
+DIFUSION = 0.5          # Fracción del riesgo de la peor vecina que llega a una estación por paso
+DECAIMIENTO = 0.8       # El riesgo propagado se atenúa así en cada paso si la fuente se apaga
+
+
+# ================= TOPOLOGÍA =================
+class Topologia:
+    """
+    Red como grafo: cada estación es un nodo (una estación de transbordo que aparece en
+    varias líneas es un solo nodo) y cada tramo entre estaciones consecutivas una arista.
+    La adyacencia se guarda como matriz dispersa CSR, así que propagar cuesta O(aristas).
+    """
+
+    def __init__(self, lineas, peso_tramo=PESO_TRAMO):
+        self.lineas = {linea: list(estaciones) for linea, estaciones in lineas.items()}
+        self.estaciones = []
+        self.indice = {}
+        for estaciones in self.lineas.values():
+            for estacion in estaciones:
+                if estacion not in self.indice:
+                    self.indice[estacion] = len(self.estaciones)
+                    self.estaciones.append(estacion)
+
+        filas, columnas = [], []
+        for estaciones in self.lineas.values():
+            for a, b in zip(estaciones, estaciones[1:]):
+                filas += [self.indice[a], self.indice[b]]
+                columnas += [self.indice[b], self.indice[a]]
+        n = len(self.estaciones)
+        adyacencia = sparse.csr_matrix((np.full(len(filas), peso_tramo), (filas, columnas)), shape=(n, n))
+        # Dos líneas que comparten el mismo tramo no duplican su peso
+        adyacencia.data = np.minimum(adyacencia.data, peso_tramo)
+        self.adyacencia = adyacencia
+
+    @property
+    def transbordos(self):
+        """Estaciones que pertenecen a más de una línea"""
+        conteo = {}
+        for estaciones in self.lineas.values():
+            for estacion in set(estaciones):
+                conteo[estacion] = conteo.get(estacion, 0) + 1
+        return [e for e, n in conteo.items() if n > 1]
+
+    def vecinas(self, estacion):
+        i = self.indice[estacion]
+        inicio, fin = self.adyacencia.indptr[i], self.adyacencia.indptr[i + 1]
+        return [self.estaciones[j] for j in self.adyacencia.indices[inicio:fin]]
+
+
+# ================= PROPAGACIÓN DE RIESGO =================
+class PropagadorRiesgo:
+    """
+    Riesgo (0-100) por estación. `observado` es la probabilidad de falla que reportan los
+    tweets de cada estación; `riesgo` le agrega lo que se propaga desde la peor vecina:
+
+        riesgo_i ← max(observado_i, decaimiento · max(riesgo_i, difusion · max_j A_ij·riesgo_j))
+
+    Una inundación en Balderas eleva a Cuauhtémoc y Salto del Agua (y en menor medida a
+    las siguientes) y, cuando la fuente se normaliza, el riesgo propagado se extingue
+    geométricamente. Se toma el máximo sobre las vecinas y no la suma: con la suma, un
+    transbordo de grado ≥ 3 amplifica el riesgo en cada vuelta y la red nunca se apaga.
+    Con el máximo la ganancia por paso es a lo más `decaimiento` < 1, así que el riesgo
+    nunca supera al observado máximo y, sin fuentes, decae a 0.
+    """
+
+    def __init__(self, topologia, difusion=DIFUSION, decaimiento=DECAIMIENTO):
+        if not 0.0 <= difusion <= 1.0:
+            raise ValueError(f"La difusión debe estar entre 0 y 1 (se recibió {difusion})")
+        if not 0.0 <= decaimiento < 1.0:
+            raise ValueError(f"El decaimiento debe estar en [0, 1) (se recibió {decaimiento})")
+        self.topologia = topologia
+        self.difusion = difusion
+        self.decaimiento = decaimiento
+        n = len(topologia.estaciones)
+        self.observado = np.zeros(n)
+        self.riesgo = np.zeros(n)
+        # Inicio de cada fila no vacía de la adyacencia (para el máximo por vecinas con reduceat)
+        indptr = topologia.adyacencia.indptr
+        self._con_vecinas = np.flatnonzero(np.diff(indptr) > 0)
+        self._inicios = indptr[self._con_vecinas]
+
+    def observar(self, estacion, riesgo):
+        i = self.topologia.indice.get(estacion)
+        if i is not None:
+            self.observado[i] = riesgo
+
+    def paso(self):
+        """Un tick de difusión (vectorizado); regresa el vector de riesgo actualizado"""
+        adyacencia = self.topologia.adyacencia
+        entrante = np.zeros_like(self.riesgo)
+        if len(self._inicios):
+            contribuciones = adyacencia.data * self.riesgo[adyacencia.indices]
+            entrante[self._con_vecinas] = np.maximum.reduceat(contribuciones, self._inicios)
+        np.multiply(entrante, self.difusion, out=entrante)
+        np.maximum(entrante, self.riesgo, out=entrante)
+        np.multiply(entrante, self.decaimiento, out=entrante)
+        np.maximum(entrante, self.observado, out=entrante)
+        np.minimum(entrante, 100.0, out=self.riesgo)
+        return self.riesgo
+
+    def riesgo_de(self, estacion):
+        return float(self.riesgo[self.topologia.indice[estacion]])
+
+    def reiniciar(self):
+        self.observado[:] = 0.0
+        self.riesgo[:] = 0.0
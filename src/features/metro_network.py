@@ -0,0 +1,94 @@
+import json
+import os
+from functools import lru_cache
+from pathlib import Path
+
+# ================= CONFIGURACIÓN =================
+# Raíz del proyecto (dos niveles arriba de este archivo)
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+RED_METRO_PATH = BASE_DIR / os.getenv("RED_METRO_PATH", "data/network/red_metro_cdmx.json")
+
+
+# ================= RED =================
+class RedMetro:
+    """
+    Definición de la red (líneas en orden, coordenadas y alias de cada estación). Se lee
+    una sola vez del archivo y la comparten la API, los simuladores y el generador. Una
+    estación de transbordo aparece en varias líneas pero es una sola estación.
+    """
+
+    def __init__(self, definicion, lineas=None):
+        todas = definicion['lineas']
+        if lineas:
+            desconocidas = [l for l in lineas if l not in todas]
+            if desconocidas:
+                raise ValueError(f"Líneas desconocidas en la red: {desconocidas}")
+        claves = list(lineas) if lineas else list(todas)
+
+        self.nombre = definicion.get('nombre', '')
+        self.lineas = {l: list(todas[l]['estaciones']) for l in claves}
+        self.nombres_lineas = {l: todas[l].get('nombre', l) for l in claves}
+
+        self.estaciones = []
+        self._lineas_por_estacion = {}
+        for linea, estaciones in self.lineas.items():
+            for estacion in estaciones:
+                if estacion not in self._lineas_por_estacion:
+                    self.estaciones.append(estacion)
+                    self._lineas_por_estacion[estacion] = []
+                self._lineas_por_estacion[estacion].append(linea)
+
+        datos = definicion['estaciones']
+        faltantes = [e for e in self.estaciones if e not in datos]
+        if faltantes:
+            raise ValueError(f"Estaciones sin definición en la red: {faltantes}")
+        self.coordenadas = {e: (datos[e]['lat'], datos[e]['lon']) for e in self.estaciones}
+        self.alias = {e: datos[e]['alias'] for e in self.estaciones if datos[e].get('alias')}
+        self.requieren_contexto = {e for e in self.estaciones if datos[e].get('requiere_contexto')}
+
+    def lineas_de(self, estacion):
+        return self._lineas_por_estacion.get(estacion, [])
+
+    def estaciones_de(self, lineas=None, estaciones=None):
+        """
+        Estaciones seleccionadas por filtros de línea y/o estación (en el orden de la red).
+        Lanza KeyError si una línea o estación no existe.
+        """
+        if lineas:
+            for linea in lineas:
+                if linea not in self.lineas:
+                    raise KeyError(f"Línea desconocida: '{linea}'")
+            seleccion = []
+            vistas = set()
+            for linea in lineas:
+                for estacion in self.lineas[linea]:
+                    if estacion not in vistas:
+                        vistas.add(estacion)
+                        seleccion.append(estacion)
+        else:
+            seleccion = self.estaciones
+        if estaciones:
+            for estacion in estaciones:
+                if estacion not in self._lineas_por_estacion:
+                    raise KeyError(f"Estación desconocida: '{estacion}'")
+            pedidas = set(estaciones)
+            seleccion = [e for e in seleccion if e in pedidas]
+        return seleccion
+
+
+@lru_cache(maxsize=None)
+def _leer_definicion(ruta):
+    with open(ruta, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def cargar_red(lineas=None, ruta=RED_METRO_PATH):
+    """Red completa o solo las líneas indicadas (p. ej. ["1", "3"]); el archivo se lee una vez"""
+    return RedMetro(_leer_definicion(str(ruta)), lineas)
+
+
+def lineas_desde_env(valor):
+    """'1,3,B' -> ['1', '3', 'B']; vacío -> None (toda la red)"""
+    lineas = [l.strip() for l in (valor or '').split(',') if l.strip()]
+    return lineas or None
@@ -0,0 +1,127 @@
+import hashlib
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from src.features.station_matcher import normalizar
+
+# ================= CONFIGURACIÓN =================
+BITS_SIMHASH = 64
+_POSICIONES_BITS = np.arange(BITS_SIMHASH, dtype=np.uint64)
+
+# Menciones y URLs no aportan contenido; se omiten antes de calcular la huella
+_PREFIJOS_IGNORADOS = ('@', 'http')
+
+
+# ================= SIMHASH =================
+def _hash_64(token):
+    return int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _tokens(texto):
+    palabras = [p for p in texto.split() if not p.lower().startswith(_PREFIJOS_IGNORADOS)]
+    # Sin acentos, signos ni emojis: "😭" vs "😡" o "Suárez" vs "Suarez" no cambian la huella
+    palabras = normalizar(' '.join(palabras)).split()
+    # Palabras y bigramas: los bigramas conservan algo del orden
+    return palabras + [f"{a} {b}" for a, b in zip(palabras, palabras[1:])]
+
+
+def simhash(texto):
+    """Huella de 64 bits; textos casi iguales difieren en pocos bits"""
+    tokens = _tokens(texto)
+    if not tokens:
+        return 0
+    hashes = np.fromiter((_hash_64(t) for t in tokens), dtype=np.uint64, count=len(tokens))
+    bits = (hashes[:, None] >> _POSICIONES_BITS) & np.uint64(1)
+    votos = bits.sum(axis=0, dtype=np.int64) * 2 - len(tokens)
+    return int(np.packbits((votos > 0)[::-1].astype(np.uint8)).view('>u8')[0])
+
+
+def distancia_hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+# ================= VENTANA DE DUPLICADOS =================
+class VentanaDuplicados:
+    """
+    Índice de las huellas recientes (acotado por tamaño y antigüedad). La búsqueda usa
+    LSH por bandas: la huella se parte en `max_distancia + 1` bandas, así que dos huellas
+    a distancia <= max_distancia comparten al menos una banda exacta (principio del
+    palomar) y solo se comparan contra esos candidatos.
+    """
+
+    def __init__(self, max_elementos=1000, max_distancia=4, max_segundos=900):
+        self.max_elementos = max_elementos
+        self.max_distancia = max_distancia
+        self.max_segundos = max_segundos
+        self.n_bandas = max_distancia + 1
+        self._ancho_banda = -(-BITS_SIMHASH // self.n_bandas)
+        self._entradas = OrderedDict()  # clave -> {huella, grupo, payload, multiplicidad, visto}
+        self._bandas = [{} for _ in range(self.n_bandas)]
+        self._siguiente_clave = 0
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def _valores_banda(self, huella):
+        mascara = (1 << self._ancho_banda) - 1
+        return [(huella >> (i * self._ancho_banda)) & mascara for i in range(self.n_bandas)]
+
+    def _expirar(self, ahora):
+        while self._entradas:
+            clave, entrada = next(iter(self._entradas.items()))
+            if len(self._entradas) <= self.max_elementos and ahora - entrada['visto'] <= self.max_segundos:
+                break
+            self._eliminar(clave)
+
+    def _eliminar(self, clave):
+        entrada = self._entradas.pop(clave)
+        for banda, valor in zip(self._bandas, self._valores_banda(entrada['huella'])):
+            claves = banda.get(valor)
+            if claves is not None:
+                claves.discard(clave)
+                if not claves:
+                    del banda[valor]
+
+    def buscar(self, huella, grupo=None):
+        """
+        Regresa la entrada casi duplicada más cercana (misma `grupo`, p. ej. la estación)
+        o None. Si la encuentra incrementa su multiplicidad y la renueva en la ventana.
+        """
+        ahora = time.monotonic()
+        self._expirar(ahora)
+
+        mejor, mejor_distancia = None, self.max_distancia + 1
+        for banda, valor in zip(self._bandas, self._valores_banda(huella)):
+            for clave in banda.get(valor, ()):
+                entrada = self._entradas[clave]
+                if entrada['grupo'] != grupo:
+                    continue
+                distancia = distancia_hamming(huella, entrada['huella'])
+                if distancia < mejor_distancia:
+                    mejor, mejor_distancia = clave, distancia
+        if mejor is None:
+            return None
+
+        entrada = self._entradas[mejor]
+        entrada['multiplicidad'] += 1
+        entrada['visto'] = ahora
+        self._entradas.move_to_end(mejor)
+        return entrada
+
+    def agregar(self, huella, payload, grupo=None):
+        clave = self._siguiente_clave
+        self._siguiente_clave += 1
+        self._entradas[clave] = {
+            'huella': huella, 'grupo': grupo, 'payload': payload,
+            'multiplicidad': 1, 'visto': time.monotonic(),
+        }
+        for banda, valor in zip(self._bandas, self._valores_banda(huella)):
+            banda.setdefault(valor, set()).add(clave)
+        self._expirar(time.monotonic())
+
+    def limpiar(self):
+        """Olvida todas las huellas (p. ej. al reiniciar la simulación)"""
+        self._entradas.clear()
+        self._bandas = [{} for _ in range(self.n_bandas)]
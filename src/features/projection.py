@@ -0,0 +1,94 @@
+from pathlib import Path
+
+import numpy as np
+
+# ================= CONFIGURACIÓN =================
+# Artefacto guardado junto a los .cbm cuando el modelo se entrena con embeddings reducidos
+PROYECCION_PATH = "models/proyeccion_embeddings.npz"
+
+# Nombre de las columnas proyectadas; así el modelo "dice" si espera proyección
+PREFIJO_PROYECCION = "proy_"
+
+METODOS = ('pca', 'random')
+
+# Filas por bloque al proyectar matrices grandes (p. ej. un memmap del feature store)
+_BLOQUE_TRANSFORMACION = 50000
+
+
+class Proyeccion:
+    """Proyección lineal de embeddings: (X - media) @ componentes"""
+
+    def __init__(self, media, componentes, metodo):
+        self.media = np.asarray(media, dtype=np.float32)
+        self.componentes = np.ascontiguousarray(componentes, dtype=np.float32)
+        self.metodo = metodo
+
+    @property
+    def dim_entrada(self):
+        return self.componentes.shape[0]
+
+    @property
+    def dim_salida(self):
+        return self.componentes.shape[1]
+
+    def transformar(self, embeddings):
+        """Proyecta una matriz (n x dim_entrada) o un solo vector"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim == 1:
+            return (embeddings - self.media) @ self.componentes
+
+        salida = np.empty((embeddings.shape[0], self.dim_salida), dtype=np.float32)
+        for inicio in range(0, embeddings.shape[0], _BLOQUE_TRANSFORMACION):
+            bloque = np.asarray(embeddings[inicio:inicio + _BLOQUE_TRANSFORMACION], dtype=np.float32)
+            salida[inicio:inicio + len(bloque)] = (bloque - self.media) @ self.componentes
+        return salida
+
+    def guardar(self, ruta=PROYECCION_PATH):
+        ruta = Path(ruta)
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(ruta, media=self.media, componentes=self.componentes, metodo=np.array(self.metodo))
+
+
+def ajustar_proyeccion(embeddings, dim, metodo='pca', seed=42):
+    """
+    Ajusta una proyección a `dim` dimensiones.
+    - 'pca': componentes principales (eigenvectores de la covarianza, D x D).
+    - 'random': proyección aleatoria gaussiana (no depende de los datos).
+    """
+    if metodo not in METODOS:
+        raise ValueError(f"Método de proyección desconocido: {metodo}. Opciones: {METODOS}")
+
+    dim_entrada = embeddings.shape[1]
+    if dim >= dim_entrada:
+        raise ValueError(f"La dimensión objetivo ({dim}) debe ser menor que la original ({dim_entrada})")
+
+    if metodo == 'random':
+        rng = np.random.default_rng(seed)
+        componentes = rng.standard_normal((dim_entrada, dim)).astype(np.float32) / np.sqrt(dim)
+        return Proyeccion(np.zeros(dim_entrada, dtype=np.float32), componentes, metodo)
+
+    # PCA acumulando la covarianza por bloques (no requiere la matriz completa en RAM)
+    n = embeddings.shape[0]
+    suma = np.zeros(dim_entrada, dtype=np.float64)
+    for inicio in range(0, n, _BLOQUE_TRANSFORMACION):
+        suma += np.asarray(embeddings[inicio:inicio + _BLOQUE_TRANSFORMACION], dtype=np.float64).sum(axis=0)
+    media = suma / n
+
+    covarianza = np.zeros((dim_entrada, dim_entrada), dtype=np.float64)
+    for inicio in range(0, n, _BLOQUE_TRANSFORMACION):
+        bloque = np.asarray(embeddings[inicio:inicio + _BLOQUE_TRANSFORMACION], dtype=np.float64) - media
+        covarianza += bloque.T @ bloque
+
+    valores, vectores = np.linalg.eigh(covarianza)
+    componentes = vectores[:, np.argsort(valores)[::-1][:dim]]
+    return Proyeccion(media, componentes, metodo)
+
+
+def cargar_proyeccion(ruta=PROYECCION_PATH):
+    with np.load(ruta) as datos:
+        return Proyeccion(datos['media'], datos['componentes'], str(datos['metodo']))
+
+
+def modelo_usa_proyeccion(feature_names):
+    """True si el modelo fue entrenado con columnas proyectadas"""
+    return any(nombre.startswith(PREFIJO_PROYECCION) for nombre in feature_names)
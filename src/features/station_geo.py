@@ -0,0 +1,60 @@
+import numpy as np
+from sklearn.neighbors import KDTree
+
+# ================= CONFIGURACIÓN =================
+RADIO_TIERRA_M = 6_371_000.0
+MAX_DISTANCIA_M = 1000.0  # Más lejos que esto el tweet no se asigna a ninguna estación
+
+
+def coordenadas_de(tweet):
+    """(lat, lon) de un tweet geolocalizado o None"""
+    if not tweet.get('geo_enabled'):
+        return None
+    coordenadas = tweet.get('coordinates')
+    if not coordenadas:
+        return None
+    return coordenadas['lat'], coordenadas['lon']
+
+
+# ================= ÍNDICE ESPACIAL =================
+class IndiceEstacionesGeo:
+    """
+    KD-tree sobre las coordenadas de las estaciones: la estación más cercana a un punto
+    se obtiene en O(log n), así que escala a la red completa. Las coordenadas se proyectan
+    a metros (equirrectangular alrededor de la latitud media); a escala de una ciudad el
+    error frente a la distancia haversine es despreciable y la consulta es euclidiana.
+    """
+
+    def __init__(self, coordenadas, max_distancia_m=MAX_DISTANCIA_M):
+        self.estaciones = list(coordenadas)
+        self.max_distancia_m = max_distancia_m
+        puntos = np.array([coordenadas[e] for e in self.estaciones], dtype=float)
+        self._cos_lat = np.cos(np.radians(puntos[:, 0].mean()))
+        self._arbol = KDTree(self._a_metros(puntos[:, 0], puntos[:, 1]))
+
+    def _a_metros(self, lats, lons):
+        lats = np.radians(np.asarray(lats, dtype=float))
+        lons = np.radians(np.asarray(lons, dtype=float))
+        return np.column_stack([lats * RADIO_TIERRA_M, lons * self._cos_lat * RADIO_TIERRA_M])
+
+    def estaciones_cercanas(self, lats, lons):
+        """
+        Versión vectorizada para lotes de tweets. Regresa (estaciones, distancias_m);
+        la estación es None cuando el punto está a más de `max_distancia_m`.
+        """
+        distancias, indices = self._arbol.query(self._a_metros(lats, lons), k=1)
+        distancias = distancias[:, 0]
+        estaciones = [self.estaciones[i] if d <= self.max_distancia_m else None
+                      for i, d in zip(indices[:, 0], distancias)]
+        return estaciones, distancias
+
+    def estacion_cercana(self, lat, lon):
+        """
+        Regresa (estacion, confianza, distancia_m). La confianza baja linealmente con la
+        distancia hasta 0 en `max_distancia_m`; fuera de ese radio regresa (None, 0.0, d).
+        """
+        estaciones, distancias = self.estaciones_cercanas([lat], [lon])
+        estacion, distancia = estaciones[0], float(distancias[0])
+        if estacion is None:
+            return None, 0.0, distancia
+        return estacion, 1.0 - distancia / self.max_distancia_m, distancia
@@ -0,0 +1,172 @@
+import unicodedata
+from collections import deque, namedtuple
+
+# ================= CONFIGURACIÓN =================
+# Peso de cada tipo de alias en la confianza de una mención
+PESO_NOMBRE = 1.0        # "Pino Suárez", "pino suarez"
+PESO_COMPACTO = 0.9      # "#PinoSuarez", "pinosuarez"
+PESO_ABREVIATURA = 0.7   # Alias manuales ("Blvd Puerto Aéreo", "Pantitlan")
+
+# Bonos cuando la mención viene marcada como estación en el texto
+BONO_MARCADO = 0.5       # **Estación** (formato del generador)
+BONO_CONTEXTO = 0.25     # "en X", "estación X", "#X"
+PALABRAS_CONTEXTO = ('en', 'estacion', 'metro')
+
+
+Mencion = namedtuple('Mencion', ['estacion', 'inicio', 'fin', 'peso'])
+
+
+# ================= NORMALIZACIÓN =================
+_cache_caracteres = {}
+
+
+def _normalizar_caracter(c):
+    """Minúscula sin acento; todo lo que no es letra o dígito se vuelve espacio"""
+    normal = _cache_caracteres.get(c)
+    if normal is None:
+        base = unicodedata.normalize('NFD', c.lower())[0]
+        normal = base if base.isalnum() else ' '
+        _cache_caracteres[c] = normal
+    return normal
+
+
+def normalizar(texto):
+    """Normaliza carácter por carácter, así las posiciones coinciden con el texto original"""
+    return ''.join(_normalizar_caracter(c) for c in texto)
+
+
+def _normalizar_alias(alias):
+    return ' '.join(normalizar(alias).split())
+
+
+# ================= AUTÓMATA AHO-CORASICK =================
+class ReconocedorEstaciones:
+    """
+    Autómata Aho-Corasick sobre los nombres normalizados de las estaciones y sus alias.
+    Se construye una vez y recorre cada texto en una sola pasada, con costo lineal en
+    la longitud del tweet sin importar cuántas estaciones haya. Los alias y las estaciones
+    cuyo nombre también es una palabra común ("Normal", "Universidad"), que solo cuentan
+    con contexto (**X**, #X, "en X"), vienen de la definición de la red (`RedMetro`).
+    """
+
+    def __init__(self, estaciones, alias=None, requieren_contexto=()):
+        alias = alias or {}
+        self.estaciones = list(estaciones)
+        self.requieren_contexto = set(requieren_contexto)
+        self._transiciones = [{}]
+        self._fallo = [0]
+        self._salidas = [[]]  # (estacion, longitud, peso) por nodo
+
+        for estacion in self.estaciones:
+            nombre = _normalizar_alias(estacion)
+            self._agregar(nombre, estacion, PESO_NOMBRE)
+            if ' ' in nombre:
+                self._agregar(nombre.replace(' ', ''), estacion, PESO_COMPACTO)
+            for abreviatura in alias.get(estacion, []):
+                self._agregar(_normalizar_alias(abreviatura), estacion, PESO_ABREVIATURA)
+        self._construir_fallos()
+
+    def _agregar(self, patron, estacion, peso):
+        nodo = 0
+        for c in patron:
+            siguiente = self._transiciones[nodo].get(c)
+            if siguiente is None:
+                siguiente = len(self._transiciones)
+                self._transiciones[nodo][c] = siguiente
+                self._transiciones.append({})
+                self._fallo.append(0)
+                self._salidas.append([])
+            nodo = siguiente
+        # Si dos alias de la misma estación coinciden se conserva el de mayor peso
+        previas = [s for s in self._salidas[nodo] if s[0] == estacion]
+        if not previas or previas[0][2] < peso:
+            self._salidas[nodo] = [s for s in self._salidas[nodo] if s[0] != estacion]
+            self._salidas[nodo].append((estacion, len(patron), peso))
+
+    def _construir_fallos(self):
+        # Recorrido por niveles: los hijos de la raíz fallan a la raíz
+        cola = deque(self._transiciones[0].values())
+        while cola:
+            nodo = cola.popleft()
+            for c, hijo in self._transiciones[nodo].items():
+                cola.append(hijo)
+                fallo = self._fallo[nodo]
+                while fallo and c not in self._transiciones[fallo]:
+                    fallo = self._fallo[fallo]
+                if nodo != 0:
+                    self._fallo[hijo] = self._transiciones[fallo].get(c, 0)
+                # Un nodo también emite lo que emite su enlace de fallo (sufijos)
+                self._salidas[hijo] = self._salidas[hijo] + self._salidas[self._fallo[hijo]]
+
+    def buscar(self, texto):
+        """Todas las menciones de estaciones en el texto (con límites de palabra)"""
+        normal = normalizar(texto)
+        n = len(normal)
+        menciones = []
+        nodo = 0
+        for i, c in enumerate(normal):
+            while nodo and c not in self._transiciones[nodo]:
+                nodo = self._fallo[nodo]
+            nodo = self._transiciones[nodo].get(c, 0)
+            for estacion, longitud, peso in self._salidas[nodo]:
+                inicio = i - longitud + 1
+                # Solo palabras completas: "Merced" no debe coincidir dentro de "Mercedes"
+                if (inicio == 0 or normal[inicio - 1] == ' ') and (i + 1 == n or normal[i + 1] == ' '):
+                    bono = self._bono(texto, normal, inicio, i + 1)
+                    if bono == 0.0 and estacion in self.requieren_contexto:
+                        continue
+                    menciones.append(Mencion(estacion, inicio, i + 1, peso + bono))
+
+        # Se descartan menciones contenidas en otra más larga ("Puerto Aéreo" dentro de
+        # "Boulevard Puerto Aéreo")
+        menciones.sort(key=lambda m: (m.inicio, -m.fin))
+        sin_anidadas = []
+        fin_actual = -1
+        for mencion in menciones:
+            if mencion.fin > fin_actual:
+                sin_anidadas.append(mencion)
+                fin_actual = mencion.fin
+        return sin_anidadas
+
+    @staticmethod
+    def _bono(texto, normal, inicio, fin):
+        if texto[max(0, inicio - 2):inicio] == '**' and texto[fin:fin + 2] == '**':
+            return BONO_MARCADO
+        if inicio > 0 and texto[inicio - 1] == '#':
+            return BONO_CONTEXTO
+        anterior = normal[max(0, inicio - 12):inicio].split()
+        if anterior and anterior[-1] in PALABRAS_CONTEXTO:
+            return BONO_CONTEXTO
+        return 0.0
+
+    def reconocer(self, texto):
+        """
+        Regresa (estacion, confianza, menciones). La estación es la de mayor puntaje
+        acumulado (empates: la primera mencionada). La confianza es su fracción del
+        puntaje total, así que baja cuando el tweet menciona varias estaciones, por
+        la calidad de su mejor mención (nombre completo > compacto > abreviatura).
+        Sin menciones regresa (None, 0.0, []).
+        """
+        menciones = self.buscar(texto)
+        if not menciones:
+            return None, 0.0, []
+
+        puntajes = {}
+        for mencion in menciones:
+            puntajes[mencion.estacion] = puntajes.get(mencion.estacion, 0.0) + mencion.peso
+        # max() conserva la primera en caso de empate (los dicts respetan el orden de inserción)
+        estacion = max(puntajes, key=puntajes.get)
+        calidad = min(1.0, max(m.peso for m in menciones if m.estacion == estacion) / PESO_NOMBRE)
+        confianza = puntajes[estacion] / sum(puntajes.values()) * calidad
+        return estacion, confianza, menciones
+
+
+def canonizador_estaciones(red):
+    """
+    Traduce a nombres de la red los nombres de estación de una fuente tabular (p. ej.
+    "Insurgentes (Línea 1)" -> "Insurgentes"); None si no reconoce ninguna. Como el campo
+    ya es una estación, no se exige contexto a las que en un tweet sí lo necesitan
+    ("Insurgentes", "Merced"): con el reconocedor de tweets esas se descartarían.
+    """
+    reconocedor = ReconocedorEstaciones(red.estaciones, red.alias)
+    return lambda nombre: reconocedor.reconocer(nombre)[0]
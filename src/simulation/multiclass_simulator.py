@@ -7,6 +7,12 @@ from sentence_transformers import SentenceTransformer
 from catboost import CatBoostClassifier
 import json 
 from src.data_generation.realistic_tweet_generator import generar_tweet_simulado 
+from src.features.context_provider import ProveedorContexto
+from src.features.feature_store import PREFIJO_EMBEDDING
+from src.features.metro_network import cargar_red
+from src.features.projection import PREFIJO_PROYECCION, PROYECCION_PATH, cargar_proyeccion, modelo_usa_proyeccion
+from src.features.station_geo import IndiceEstacionesGeo, coordenadas_de
+from src.features.station_matcher import ReconocedorEstaciones, canonizador_estaciones
 
 # ================= CONFIG =================
 INTERVALO = 5  # Más rápido para ver las alertas (5 segundos)
@@ -14,19 +20,23 @@ UMBRAL_ALERTA = 80.0  # % para activar alarma
 N_TWEETS = (1, 3) 
 
 # ================= DATOS =================
-estaciones_L1 = [
-    "Observatorio", "Tacubaya", "Juanacatlán", "Chapultepec", "Sevilla",
-    "Insurgentes", "Cuauhtémoc", "Balderas", "Salto del Agua", "Isabel la Católica",
-    "Pino Suárez", "Merced", "Candelaria", "San Lázaro", "Moctezuma", "Balbuena",
-    "Boulevard Puerto Aéreo", "Gómez Farías", "Zaragoza", "Pantitlán"
-]
+# Línea que muestra el tablero (de la definición compartida de la red)
+LINEA = os.getenv("SIMULADOR_LINEA", "1")
+red = cargar_red([LINEA])
+estaciones_linea = red.lineas[LINEA]
 dias_semana = ['Lunes','Martes','Miércoles','Jueves','Viernes','Sábado','Domingo']
+reconocedor_estaciones = ReconocedorEstaciones(estaciones_linea, red.alias, red.requieren_contexto)
+indice_geo = IndiceEstacionesGeo(red.coordenadas)
+# Clima y tráfico por estación y hora (de features.json; medias de entrenamiento si no hay datos)
+proveedor_contexto = ProveedorContexto(canonizar=canonizador_estaciones(red))
 
 # ================= CARGAR MODELOS =================
 print("Cargando cerebro...")
 model_cb = CatBoostClassifier()
 model_cb.load_model("models/modelo_clasificacion_falla.cbm") # Usar el modelo de clasificación de falla
 embed_model = SentenceTransformer('xlm-roberta-base')
+# Proyección de embeddings solo si el modelo se entrenó con dimensiones reducidas
+proyeccion = cargar_proyeccion(PROYECCION_PATH) if modelo_usa_proyeccion(model_cb.feature_names_) else None
 
 # Cargar el mapeo de etiquetas
 try:
@@ -58,7 +68,7 @@ def get_initial_probs():
     initial_probs['hora'] = '-'
     return initial_probs
 
-estatus_estaciones = {est: get_initial_probs() for est in estaciones_L1}
+estatus_estaciones = {est: get_initial_probs() for est in estaciones_linea}
 
 print("✅ Sistemas listos. Iniciando monitoreo...")
 
@@ -68,7 +78,7 @@ def limpiar_consola():
 
 def mostrar_tablero():
     print("\n" + "="*85)
-    print(f"   MONITOREO LÍNEA 1 - {datetime.now().strftime('%H:%M:%S')}")
+    print(f"   MONITOREO LÍNEA {LINEA} - {datetime.now().strftime('%H:%M:%S')}")
     print("="*85)
     
     # 1. Cabecera con un resumen de fallas
@@ -77,7 +87,7 @@ def mostrar_tablero():
     print("-" * 85)
     
     # 2. Iterar sobre TODAS las estaciones
-    for estacion in estaciones_L1:
+    for estacion in estaciones_linea:
         datos = estatus_estaciones[estacion]
         
         # Probabilidad de No Falla (clase 0)
@@ -119,30 +129,35 @@ try:
     while True:
         # CAMBIO PRINCIPAL: Usar tu generador mejorado en lugar de generar_tweet()
         num_tweets_a_generar = random.randint(N_TWEETS[0], N_TWEETS[1])
-        tweets_generados = generar_tweet_simulado(num_tweets=num_tweets_a_generar)
+        tweets_generados = generar_tweet_simulado(num_tweets=num_tweets_a_generar, estaciones=estaciones_linea)
         
         nuevos_reportes = []
 
         for tweet_data in tweets_generados:
             tweet_text = tweet_data['text']
             
-            # Extraer estación del tweet (formato: @MetroCDMX en **Estacion**, ...)
-            try:
-                estacion_match = tweet_text.split('**')[1] 
-                estacion = estacion_match.split(',')[0].strip()
-                if estacion not in estaciones_L1:
-                    estacion = random.choice(estaciones_L1)
-            except:
-                estacion = random.choice(estaciones_L1)
+            # Reconocer la estación mencionada (o la más cercana a la ubicación del tweet);
+            # sin estación conocida el tweet no actualiza el tablero
+            estacion, _, _ = reconocedor_estaciones.reconocer(tweet_text)
+            if estacion is None and coordenadas_de(tweet_data) is not None:
+                estacion, _, _ = indice_geo.estacion_cercana(*coordenadas_de(tweet_data))
+            if estacion is None:
+                continue
             
-            # Generar datos aleatorios para las nuevas features
-            temp = random.uniform(15.0, 35.0)
-            humidity = random.uniform(40.0, 95.0)
-            precip_mm = random.choices([0.0, random.uniform(0.1, 10.0)], weights=[0.8, 0.2], k=1)[0] # Mostly no rain
-            traffic_jam_level = random.randint(0, 5) # Scale of 0-5
+            # Contexto de la estación a esta hora
+            contexto = proveedor_contexto.contexto(estacion)
+            temp = contexto['temp']
+            humidity = contexto['humidity']
+            precip_mm = contexto['precip_mm']
+            traffic_jam_level = contexto['traffic_jam_level'] # Scale of 0-5
             
-            # 1. Vector embedding
-            vector = embed_model.encode(tweet_text).tolist()
+            # 1. Vector embedding (proyectado si el modelo usa dimensiones reducidas)
+            vector = embed_model.encode(tweet_text)
+            prefijo = PREFIJO_EMBEDDING
+            if proyeccion is not None:
+                vector = proyeccion.transformar(vector)
+                prefijo = PREFIJO_PROYECCION
+            vector = vector.tolist()
 
             # 2. Preparar todas las features para el modelo
             features_dict = {
@@ -154,7 +169,7 @@ try:
             }
             # Add embedding features
             for i, val in enumerate(vector):
-                features_dict[f"embedding_{i}"] = val
+                features_dict[f"{prefijo}{i}"] = val
             
             # Crear DataFrame con todas las features, asegurando el orden correcto
             model_feature_names = model_cb.feature_names_
@@ -199,7 +214,6 @@ try:
                 print(f"   Tipo de Falla: {nombre_falla_display}")
                 print(f"   Certeza del modelo: {prob_falla_display:.2f}%")
                 print(f"   Tweet origen: \"{tweet_text}\"\n")
-                time.sleep(2)
 
         # Mostrar tablero actualizado
         # limpiar_consola() # Descomenta si quieres que se limpie la pantalla
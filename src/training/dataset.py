@@ -0,0 +1,73 @@
+import hashlib
+from pathlib import Path
+
+import numpy as np
+from sklearn.impute import SimpleImputer
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import LabelEncoder
+
+from src.features.feature_store import (EMBEDDINGS_FILE, FEATURE_STORE_DIR, METADATA_FILE, SCHEMA_FILE,
+                                        cargar_feature_store, construir_dataframe)
+from src.features.projection import PREFIJO_PROYECCION
+
+OBJETIVOS = ('deteccion', 'clasificacion')
+COLUMNAS_ETIQUETA = ['falla_detectada', 'target_falla']
+
+
+def huella_feature_store(directorio=FEATURE_STORE_DIR):
+    """sha256 del contenido del feature store (embeddings, metadatos y esquema)"""
+    h = hashlib.sha256()
+    for nombre in (SCHEMA_FILE, METADATA_FILE, EMBEDDINGS_FILE):
+        with open(Path(directorio) / nombre, 'rb') as f:
+            for bloque in iter(lambda: f.read(1 << 20), b''):
+                h.update(bloque)
+    return h.hexdigest()
+
+
+def preparar_datos(objetivo='deteccion', directorio=FEATURE_STORE_DIR, proyeccion=None):
+    """
+    Arma (X, y, índices de columnas categóricas, preprocesamiento) desde el feature store
+    con la misma preparación que train_multiclass_models.py:
+    - 'deteccion': todos los registros, y = falla_detectada (0/1).
+    - 'clasificacion': solo registros con falla, y = target_falla codificado.
+    `preprocesamiento` contiene el imputer ajustado y las clases del LabelEncoder.
+    Si se pasa una `proyeccion`, los embeddings se reducen antes de armar X.
+    """
+    if objetivo not in OBJETIVOS:
+        raise ValueError(f"Objetivo desconocido: {objetivo}. Opciones: {OBJETIVOS}")
+
+    embeddings, df = cargar_feature_store(directorio)
+    if 'station' in df.columns:
+        df['station'] = df['station'].astype('category')
+
+    columnas_contexto = [col for col in df.columns if col not in COLUMNAS_ETIQUETA]
+    if proyeccion is not None:
+        X = construir_dataframe(proyeccion.transformar(embeddings), df, columnas_contexto,
+                                prefijo=PREFIJO_PROYECCION)
+    else:
+        X = construir_dataframe(embeddings, df, columnas_contexto)
+
+    clases = None
+    if objetivo == 'deteccion':
+        y = df['falla_detectada'].astype(int).to_numpy()
+    else:
+        mascara = (df['falla_detectada'] == True) & df['target_falla'].notna()
+        X = X.loc[mascara].reset_index(drop=True)
+        le = LabelEncoder()
+        y = le.fit_transform(df.loc[mascara, 'target_falla'])
+        clases = [str(clase) for clase in le.classes_]
+
+    numericas = X.select_dtypes(include=np.number).columns.tolist()
+    imputer = SimpleImputer(strategy='mean')
+    X[numericas] = imputer.fit_transform(X[numericas])
+
+    cat_features = [i for i, col in enumerate(X.columns) if X[col].dtype.name == 'category']
+    return X, y, cat_features, {"imputer": imputer, "clases": clases}
+
+
+def dividir(y, test_size=0.25, random_state=42):
+    """Índices de entrenamiento y prueba, estratificados cuando todas las clases lo permiten"""
+    _, conteos = np.unique(y, return_counts=True)
+    estratificar = y if conteos.min() >= 2 else None
+    return train_test_split(np.arange(len(y)), test_size=test_size,
+                            random_state=random_state, stratify=estratificar)
@@ -0,0 +1,312 @@
+import json
+import os
+import random
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import average_precision_score, roc_auc_score
+
+from src.api.model_registry import cargar_modelo_activo
+from src.data_generation.phrase_bank import clasificar_por_palabras_clave
+from src.data_generation.realistic_tweet_generator import generar_tweet_simulado
+from src.features.batch_encoder import codificar_por_buckets
+from src.features.context_provider import FEATURES_CONTEXTO, FuenteArchivo, ProveedorContexto
+from src.features.feature_processor import EMBED_BATCH_SIZE, EMBED_WORKERS, EMBEDDING_MODEL_NAME
+from src.features.embedding_cache import EmbeddingCache
+from src.features.feature_store import construir_dataframe
+from src.features.metro_network import cargar_red
+from src.features.station_geo import IndiceEstacionesGeo, coordenadas_de
+from src.features.station_matcher import ReconocedorEstaciones, canonizador_estaciones
+
+# ================= CONFIG =================
+EVAL_TWEETS = int(os.getenv("EVAL_TWEETS", "200000"))
+EVAL_SEED = int(os.getenv("EVAL_SEED", "42"))
+# Tweets por llamada al generador: cada llamada trae 8 fallas, así que esto fija la
+# proporción de fallas del corpus (20 -> 40%)
+EVAL_TWEETS_POR_LLAMADA = int(os.getenv("EVAL_TWEETS_POR_LLAMADA", "20"))
+EVAL_BLOQUE = int(os.getenv("EVAL_BLOQUE", "50000"))  # Tweets embebidos y puntuados a la vez (cota de memoria)
+EVAL_EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", EMBEDDING_MODEL_NAME)
+
+# Mismos artefactos y umbrales que la API (para evaluar un candidato basta con apuntar las rutas a él)
+MODEL_CLASIFICACION_PATH = Path(os.getenv("MODEL_CLASIFICACION_PATH", "models/modelo_clasificacion_falla.cbm"))
+MODEL_DETECCION_PATH = Path(os.getenv("MODEL_DETECCION_PATH", "models/modelo_deteccion_falla.cbm"))
+LABEL_ENCODING_PATH = Path(os.getenv("LABEL_ENCODING_PATH", "data/processed/label_encoding.json"))
+PROYECCION_EMBEDDINGS_PATH = Path(os.getenv("PROYECCION_EMBEDDINGS_PATH", "models/proyeccion_embeddings.npz"))
+CONTEXTO_PATH = os.getenv("CONTEXTO_PATH", "data/processed/features.json")
+CASCADA_ACTIVA = os.getenv("CASCADA_ACTIVA", "true").lower() == "true"
+CASCADA_PREFILTRO = os.getenv("CASCADA_PREFILTRO", "false").lower() == "true"
+UMBRAL_DETECCION = float(os.getenv("UMBRAL_DETECCION", "50.0"))
+UMBRAL_ALERTA = float(os.getenv("UMBRAL_ALERTA", "80.0"))
+GEO_MAX_DISTANCIA_M = float(os.getenv("GEO_MAX_DISTANCIA_M", "1000"))
+
+UMBRALES = [float(u) for u in range(0, 100, 5)]  # % de probabilidad / certeza
+N_BINS_CALIBRACION = 10
+
+# Caché propia: al cerrarse, EmbeddingCache se queda solo con las claves de la corrida,
+# así que compartir la de entrenamiento la vaciaría. Con la misma semilla y tamaño el
+# corpus es idéntico y los siguientes candidatos no codifican nada.
+EVAL_CACHE_DIR = "data/processed/eval_embedding_cache"
+REPORTE_DIR = "logs/evaluacion"
+
+# Clases del generador (clase_real) y valores que usa la API
+NOMBRES_CLASE_REAL = {0: 'NORMAL', 1: 'HUMO', 2: 'AGUA', 3: 'ELEC', 4: 'MEC'}
+CLASE_SIN_FALLA = "Sin falla"
+ESTACION_DESCONOCIDA = "Sin estación"
+
+
+# ================= CORPUS =================
+def generar_corpus(n_tweets=EVAL_TWEETS, seed=EVAL_SEED, tweets_por_llamada=EVAL_TWEETS_POR_LLAMADA):
+    """
+    Corpus etiquetado con `generar_tweet_simulado`. La estación y el contexto se resuelven
+    como en la API (texto, luego ubicación; contexto de la estación a una hora al azar),
+    así que las features son las que vería el modelo en serving. Misma semilla, mismo corpus.
+    """
+    red = cargar_red()
+    rng = random.Random(seed)
+    reconocedor = ReconocedorEstaciones(red.estaciones, red.alias, red.requieren_contexto)
+    indice_geo = IndiceEstacionesGeo(red.coordenadas, GEO_MAX_DISTANCIA_M)
+    proveedor = ProveedorContexto(FuenteArchivo(CONTEXTO_PATH), canonizar=canonizador_estaciones(red))
+
+    textos, clases, estaciones, estaciones_reales = [], [], [], []
+    contexto = np.empty((n_tweets, len(FEATURES_CONTEXTO)), dtype=np.float32)
+    while len(textos) < n_tweets:
+        llamada = min(tweets_por_llamada, n_tweets - len(textos))
+        for tweet in generar_tweet_simulado(num_tweets=llamada, estaciones=red.estaciones, rng=rng):
+            estacion = reconocedor.reconocer(tweet['text'])[0]
+            if estacion is None:
+                coordenadas = coordenadas_de(tweet)
+                if coordenadas is not None:
+                    estacion = indice_geo.estacion_cercana(*coordenadas)[0]
+            estacion = estacion or ESTACION_DESCONOCIDA
+
+            valores = proveedor.contexto(estacion, datetime(2024, 1, 1, rng.randrange(24)))
+            contexto[len(textos)] = [valores[f] for f in FEATURES_CONTEXTO]
+            textos.append(tweet['text'])
+            clases.append(tweet['clase_real'])
+            estaciones.append(estacion)
+            estaciones_reales.append(tweet['estacion_real'])
+
+    return {
+        'textos': textos,
+        'clase_real': np.asarray(clases, dtype=np.int8),
+        'estacion': estaciones,
+        'estacion_real': estaciones_reales,
+        'contexto': contexto,
+    }
+
+
+# ================= PUNTUACIÓN =================
+def _codificar(textos):
+    matriz, stats = codificar_por_buckets(textos, EVAL_EMBEDDING_MODEL, batch_size=EMBED_BATCH_SIZE,
+                                          n_workers=EMBED_WORKERS)
+    print(f"  Codificados {stats['textos']} textos nuevos ({stats['tokens_por_segundo']:.0f} tokens/s, "
+          f"{stats['segundos']:.1f}s)")
+    return matriz
+
+
+def _predecir(model, X):
+    """predict_proba de todo el bloque con todos los núcleos, con las columnas en el orden del modelo"""
+    return model.predict_proba(X[model.feature_names_], thread_count=-1)
+
+
+def puntuar_corpus(corpus, modelo, bloque=EVAL_BLOQUE, cache_dir=EVAL_CACHE_DIR):
+    """
+    Probabilidades de los modelos de serving para todo el corpus, por bloques: cada bloque
+    se embebe contra la caché (solo se codifican textos nuevos), se proyecta si el modelo
+    lo usa y se predice en una sola llamada por modelo. Regresa (prob_deteccion o None,
+    matriz de probabilidades de clasificación, estadísticas de la caché).
+    """
+    n = len(corpus['textos'])
+    prob_deteccion = np.empty(n, dtype=np.float32) if modelo.deteccion is not None else None
+    prob_clasificacion = np.empty((n, len(modelo.label_mapping)), dtype=np.float32)
+
+    cache = EmbeddingCache(EVAL_EMBEDDING_MODEL, cache_dir)
+    for inicio in range(0, n, bloque):
+        fin = min(inicio + bloque, n)
+        embeddings = cache.embeber(corpus['textos'][inicio:fin], _codificar)
+        if modelo.proyeccion is not None:
+            embeddings = modelo.proyeccion.transformar(embeddings)
+
+        metadata = pd.DataFrame(corpus['contexto'][inicio:fin], columns=list(FEATURES_CONTEXTO))
+        metadata.insert(0, 'station', corpus['estacion'][inicio:fin])
+        X = construir_dataframe(embeddings, metadata, ['station', *FEATURES_CONTEXTO], prefijo=modelo.prefijo)
+
+        if prob_deteccion is not None:
+            prob_deteccion[inicio:fin] = _predecir(modelo.deteccion, X)[:, 1]
+        prob_clasificacion[inicio:fin] = _predecir(modelo.model, X)
+        print(f"  {fin}/{n} tweets puntuados")
+
+    return prob_deteccion, prob_clasificacion, cache.cerrar()
+
+
+# ================= MÉTRICAS =================
+def _precision_recall(predichos, verdad):
+    tp = int((predichos & verdad).sum())
+    n_predichos, n_verdad = int(predichos.sum()), int(verdad.sum())
+    return {
+        'precision': tp / n_predichos if n_predichos else None,
+        'recall': tp / n_verdad if n_verdad else None,
+        'tasa_alertas': n_predichos / len(verdad) if len(verdad) else None,
+    }
+
+
+def curva_umbrales(puntaje, verdad, umbrales=UMBRALES, elegibles=None):
+    """Precisión, recall y tasa de alertas de `puntaje > umbral` para cada umbral"""
+    elegibles = np.ones(len(verdad), dtype=bool) if elegibles is None else elegibles
+    return [{'umbral': u, **_precision_recall(elegibles & (puntaje > u), verdad)} for u in umbrales]
+
+
+def curva_calibracion(prob, verdad, n_bins=N_BINS_CALIBRACION):
+    """
+    Diagrama de confiabilidad: por bin de probabilidad predicha (0-1), la media predicha y
+    la fracción real de positivos; más el error de calibración esperado (ECE) y el Brier.
+    """
+    bins = np.minimum((prob * n_bins).astype(np.int64), n_bins - 1)
+    conteos = np.bincount(bins, minlength=n_bins)
+    suma_prob = np.bincount(bins, weights=prob, minlength=n_bins)
+    suma_verdad = np.bincount(bins, weights=verdad, minlength=n_bins)
+
+    curva = []
+    ece = 0.0
+    for b in range(n_bins):
+        if conteos[b] == 0:
+            continue
+        media, fraccion = suma_prob[b] / conteos[b], suma_verdad[b] / conteos[b]
+        ece += conteos[b] / len(prob) * abs(media - fraccion)
+        curva.append({'desde': b / n_bins, 'hasta': (b + 1) / n_bins, 'n': int(conteos[b]),
+                      'prob_media': float(media), 'fraccion_real': float(fraccion)})
+    return {'curva': curva, 'ece': float(ece), 'brier': float(np.mean((prob - verdad) ** 2)) if len(prob) else None}
+
+
+def matriz_confusion(clase_real, predichas, etiquetas_predichas):
+    """Filas: clase del generador; columnas: etiqueta predicha (conteos)"""
+    tabla = pd.crosstab(pd.Categorical([NOMBRES_CLASE_REAL[c] for c in clase_real],
+                                       categories=list(NOMBRES_CLASE_REAL.values())),
+                        pd.Categorical(predichas, categories=etiquetas_predichas), dropna=False)
+    return {real: {pred: int(v) for pred, v in fila.items()} for real, fila in tabla.iterrows()}
+
+
+def evaluar(corpus, prob_deteccion, prob_clasificacion, label_mapping):
+    """
+    Métricas contra `clase_real`. El generador tiene 5 clases gruesas (normal, humo, agua,
+    eléctrica, mecánica) y el clasificador predice las causas de label_encoding.json, que
+    no se corresponden una a una; por eso la verdad de las alertas es `clase_real > 0` y la
+    matriz de confusión por clase cruza las clases del generador con las etiquetas predichas.
+    """
+    clase_real = corpus['clase_real']
+    verdad = clase_real > 0
+    reporte = {}
+
+    # Etapas de la cascada, igual que en la API
+    pasa = np.ones(len(clase_real), dtype=bool)
+    if CASCADA_PREFILTRO:
+        pasa &= np.fromiter((clasificar_por_palabras_clave(t) not in (None, 0) for t in corpus['textos']),
+                            dtype=bool, count=len(clase_real))
+
+    if prob_deteccion is not None:
+        detectados = pasa & (prob_deteccion * 100 >= UMBRAL_DETECCION)
+        reporte['deteccion'] = {
+            'umbral': UMBRAL_DETECCION,
+            'roc_auc': float(roc_auc_score(verdad, prob_deteccion)) if 0 < verdad.sum() < len(verdad) else None,
+            'average_precision': float(average_precision_score(verdad, prob_deteccion)) if verdad.any() else None,
+            'confusion': matriz_confusion(clase_real, np.where(detectados, 'Falla', CLASE_SIN_FALLA),
+                                          [CLASE_SIN_FALLA, 'Falla']),
+            'calibracion': curva_calibracion(prob_deteccion.astype(np.float64), verdad),
+            'curva_umbrales': curva_umbrales(prob_deteccion * 100, verdad, elegibles=pasa),
+        }
+        pasa = detectados
+
+    # Clasificación y alertas: en la API hay alerta si el tweet llega a clasificación, la
+    # clase no es la 0 y su probabilidad supera UMBRAL_ALERTA
+    pred_idx = prob_clasificacion.argmax(axis=1)
+    certeza = prob_clasificacion.max(axis=1) * 100
+    candidatas = pasa & (pred_idx != 0)
+    etiquetas = np.asarray([label_mapping[i] for i in range(len(label_mapping))], dtype=object)
+    predichas = np.where(pasa, etiquetas[pred_idx], CLASE_SIN_FALLA)
+    reporte['clasificacion'] = {
+        'confusion': matriz_confusion(clase_real, predichas, [CLASE_SIN_FALLA, *etiquetas]),
+        # ¿Qué tan seguido es una falla real una alerta dada su certeza?
+        'calibracion_certeza': curva_calibracion(certeza[candidatas] / 100, verdad[candidatas]),
+    }
+    reporte['alertas'] = {
+        'umbral': UMBRAL_ALERTA,
+        **_precision_recall(candidatas & (certeza > UMBRAL_ALERTA), verdad),
+        'recall_por_clase': {
+            NOMBRES_CLASE_REAL[c]: float((candidatas & (certeza > UMBRAL_ALERTA))[clase_real == c].mean())
+            for c in NOMBRES_CLASE_REAL if c > 0 and (clase_real == c).any()
+        },
+        'curva_umbrales': curva_umbrales(certeza, verdad, elegibles=candidatas),
+    }
+
+    estaciones = np.asarray(corpus['estacion'], dtype=object)
+    reporte['estaciones'] = {
+        'acierto': float(np.mean(estaciones == np.asarray(corpus['estacion_real'], dtype=object))),
+        'sin_estacion': float(np.mean(estaciones == ESTACION_DESCONOCIDA)),
+    }
+    reporte['corpus'] = {
+        'tweets': int(len(clase_real)),
+        'por_clase': {NOMBRES_CLASE_REAL[c]: int((clase_real == c).sum()) for c in NOMBRES_CLASE_REAL},
+    }
+    return reporte
+
+
+# ================= CORRIDA =================
+def ejecutar_evaluacion(n_tweets=EVAL_TWEETS, seed=EVAL_SEED):
+    tiempos = {}
+    red = cargar_red()
+    inicio = time.perf_counter()
+    modelo = cargar_modelo_activo(MODEL_CLASIFICACION_PATH, LABEL_ENCODING_PATH, PROYECCION_EMBEDDINGS_PATH,
+                                  red.estaciones[0],
+                                  deteccion_path=MODEL_DETECCION_PATH if CASCADA_ACTIVA else None)
+    print(f"✅ Modelo {modelo.version} cargado ({len(modelo.label_mapping)} clases, "
+          f"cascada {'activa' if modelo.deteccion is not None else 'desactivada'})")
+
+    print(f"Generando {n_tweets} tweets (semilla {seed})...")
+    corpus = generar_corpus(n_tweets, seed)
+    tiempos['generacion_s'] = time.perf_counter() - inicio
+
+    print(f"Puntuando en bloques de {EVAL_BLOQUE}...")
+    inicio = time.perf_counter()
+    prob_deteccion, prob_clasificacion, stats_cache = puntuar_corpus(corpus, modelo)
+    tiempos['puntuacion_s'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    reporte = evaluar(corpus, prob_deteccion, prob_clasificacion, modelo.label_mapping)
+    tiempos['metricas_s'] = time.perf_counter() - inicio
+
+    reporte.update({
+        'version_modelo': modelo.version,
+        'semilla': seed,
+        'tweets_por_llamada': EVAL_TWEETS_POR_LLAMADA,
+        'cache_embeddings': stats_cache,
+        'tiempos': tiempos,
+        'fecha': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    })
+    return reporte
+
+
+def _tabla_umbrales(curva):
+    return pd.DataFrame(curva).to_string(index=False, float_format=lambda v: f"{v:.4f}")
+
+
+if __name__ == '__main__':
+    reporte = ejecutar_evaluacion()
+
+    if 'deteccion' in reporte:
+        deteccion = reporte['deteccion']
+        print(f"\nDetección: ROC AUC={deteccion['roc_auc']}, ECE={deteccion['calibracion']['ece']:.4f}")
+        print(_tabla_umbrales(deteccion['curva_umbrales']))
+    alertas = reporte['alertas']
+    print(f"\nAlertas (certeza > umbral): en {alertas['umbral']:g}% precisión={alertas['precision']} "
+          f"recall={alertas['recall']}")
+    print(_tabla_umbrales(alertas['curva_umbrales']))
+    print(f"\nTiempos: {', '.join(f'{k}={v:.1f}' for k, v in reporte['tiempos'].items())}")
+
+    os.makedirs(REPORTE_DIR, exist_ok=True)
+    ruta = os.path.join(REPORTE_DIR, f"{reporte['version_modelo']}_{reporte['corpus']['tweets']}_{reporte['semilla']}.json")
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(reporte, f, ensure_ascii=False, indent=4)
+    print(f"\n✅ Reporte guardado en '{ruta}'")
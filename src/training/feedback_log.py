@@ -0,0 +1,86 @@
+import json
+import os
+import threading
+from pathlib import Path
+
+# ================= CONFIGURACIÓN =================
+# Raíz del proyecto (dos niveles arriba de este archivo)
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+FEEDBACK_LOG_PATH = BASE_DIR / os.getenv("FEEDBACK_LOG_PATH", "data/feedback/feedback.jsonl")
+
+# Posición (en bytes) hasta donde el reentrenamiento ya consumió el log
+FEEDBACK_CURSOR_PATH = FEEDBACK_LOG_PATH.with_name("cursor.json")
+
+_log_lock = threading.Lock()
+
+
+# ================= ESCRITURA =================
+def registrar_feedback(registro, ruta=FEEDBACK_LOG_PATH):
+    """
+    Agrega un registro al log (JSONL, solo se agrega al final). Se hace fsync en cada
+    escritura para que una confirmación del operador no se pierda si el proceso cae.
+    """
+    ruta = Path(ruta)
+    linea = json.dumps(registro, ensure_ascii=False) + "\n"
+    with _log_lock:
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        with open(ruta, 'a', encoding='utf-8') as f:
+            f.write(linea)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+# ================= LECTURA =================
+def leer_feedback(desde_byte=0, ruta=FEEDBACK_LOG_PATH):
+    """
+    Regresa (registros, posicion_final) con los registros completos escritos después de
+    `desde_byte`. Una línea a medio escribir al final del archivo se deja para la
+    siguiente lectura.
+    """
+    ruta = Path(ruta)
+    if not ruta.exists():
+        return [], desde_byte
+
+    registros = []
+    posicion = desde_byte
+    with open(ruta, 'rb') as f:
+        f.seek(desde_byte)
+        for linea in f:
+            if not linea.endswith(b"\n"):
+                break
+            posicion += len(linea)
+            if linea.strip():
+                registros.append(json.loads(linea))
+    return registros, posicion
+
+
+def contar_feedback(desde_byte=0, ruta=FEEDBACK_LOG_PATH):
+    """Número de registros completos después de `desde_byte` (sin decodificarlos)"""
+    ruta = Path(ruta)
+    if not ruta.exists():
+        return 0
+    total = 0
+    with open(ruta, 'rb') as f:
+        f.seek(desde_byte)
+        for linea in f:
+            if linea.endswith(b"\n") and linea.strip():
+                total += 1
+    return total
+
+
+def leer_cursor(ruta=FEEDBACK_CURSOR_PATH):
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"posicion": 0, "registros_consumidos": 0}
+
+
+def guardar_cursor(cursor, ruta=FEEDBACK_CURSOR_PATH):
+    ruta = Path(ruta)
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = ruta.with_suffix(ruta.suffix + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(cursor, f, indent=4)
+    os.replace(tmp_path, ruta)
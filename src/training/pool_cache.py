@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+import joblib
+import numpy as np
+from catboost import Pool
+
+from src.features.feature_store import FEATURE_STORE_DIR, cargar_feature_store
+from src.features.projection import ajustar_proyeccion, cargar_proyeccion
+from src.training.dataset import dividir, huella_feature_store, preparar_datos
+
+# ================= CONFIGURACIÓN =================
+POOL_CACHE_DIR = "data/processed/pool_cache"
+
+# Si cambia la preparación de los datos se incrementa para invalidar las entradas viejas
+POOL_CACHE_VERSION = 2
+
+# Bordes por feature numérica al cuantizar (valor por defecto de CatBoost en CPU)
+BORDER_COUNT = 254
+
+TRAIN_POOL_FILE = "train.qpool"
+X_TEST_FILE = "x_test.joblib"
+BORDERS_FILE = "borders.tsv"
+Y_TEST_FILE = "y_test.npy"
+PREPROCESAMIENTO_FILE = "preprocesamiento.joblib"
+PROYECCION_FILE = "proyeccion.npz"
+INFO_FILE = "info.json"
+
+
+def clave_pools(huella_datos, objetivo, con_prueba, proyeccion_dim, proyeccion_metodo, border_count):
+    contenido = json.dumps({
+        "version": POOL_CACHE_VERSION,
+        "datos": huella_datos,
+        "objetivo": objetivo,
+        "con_prueba": con_prueba,
+        "proyeccion": [proyeccion_dim, proyeccion_metodo] if proyeccion_dim > 0 else None,
+        "border_count": border_count,
+    }, sort_keys=True)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+# ================= CONSTRUCCIÓN =================
+def _construir_entrada(destino, objetivo, directorio, con_prueba, proyeccion_dim, proyeccion_metodo,
+                       border_count):
+    """Prepara los datos, cuantiza los pools y guarda todo en `destino`"""
+    destino.mkdir(parents=True)
+
+    proyeccion = None
+    if proyeccion_dim > 0:
+        # Se ajusta con todos los embeddings, igual que train_multiclass_models.py
+        embeddings, _ = cargar_feature_store(directorio)
+        proyeccion = ajustar_proyeccion(embeddings, proyeccion_dim, metodo=proyeccion_metodo)
+        proyeccion.guardar(destino / PROYECCION_FILE)
+
+    X, y, cat_features, preprocesamiento = preparar_datos(objetivo, directorio, proyeccion=proyeccion)
+    if con_prueba:
+        idx_train, idx_test = dividir(y)
+    else:
+        idx_train, idx_test = np.arange(len(y)), None
+
+    # Solo se cuantiza el entrenamiento. La prueba se guarda cruda: un pool cuantizado por
+    # separado (aunque sea con los mismos bordes) no reproduce los hashes de las categorías
+    # de `station`, y el eval_set y las métricas de prueba saldrían corrompidos.
+    pool_train = Pool(X.iloc[idx_train], y[idx_train], cat_features=cat_features)
+    pool_train.quantize(border_count=border_count)
+    pool_train.save_quantization_borders(str(destino / BORDERS_FILE))
+    pool_train.save(str(destino / TRAIN_POOL_FILE))
+
+    if idx_test is not None:
+        joblib.dump(X.iloc[idx_test], destino / X_TEST_FILE)
+        np.save(destino / Y_TEST_FILE, y[idx_test])
+
+    # Una fila sin cuantizar para medir latencia de inferencia como en la API
+    preprocesamiento["muestra"] = X.iloc[[idx_test[0] if idx_test is not None else 0]]
+    joblib.dump(preprocesamiento, destino / PREPROCESAMIENTO_FILE)
+
+    with open(destino / INFO_FILE, 'w', encoding='utf-8') as f:
+        json.dump({
+            "objetivo": objetivo,
+            "feature_names": list(X.columns),
+            "cat_features": cat_features,
+            "clases": preprocesamiento["clases"],
+            "n_train": len(idx_train),
+            "n_test": 0 if idx_test is None else len(idx_test),
+        }, f, ensure_ascii=False, indent=4)
+
+
+# ================= CARGA =================
+def cargar_pools(objetivo='deteccion', directorio=FEATURE_STORE_DIR, con_prueba=True, proyeccion_dim=0,
+                 proyeccion_metodo='pca', border_count=BORDER_COUNT, cache_dir=POOL_CACHE_DIR):
+    """
+    Regresa los pools cuantizados de CatBoost para el objetivo dado. La primera vez se
+    construyen desde el feature store (DataFrame, imputación, proyección y cuantización)
+    y se guardan bajo una clave derivada de la huella de los datos; las siguientes veces
+    se leen directamente del disco.
+
+    Regresa un dict con: train (cuantizado), test (pool crudo o None), X_test, y_test,
+    feature_names, cat_features, clases, imputer, muestra, proyeccion (o None) y desde_cache.
+    """
+    clave = clave_pools(huella_feature_store(directorio), objetivo, con_prueba,
+                        proyeccion_dim, proyeccion_metodo, border_count)
+    entrada = Path(cache_dir) / clave
+
+    desde_cache = (entrada / INFO_FILE).exists()
+    if not desde_cache:
+        # Se construye en un directorio temporal y se publica con un rename atómico
+        temporal = Path(cache_dir) / f"{clave}.tmp{os.getpid()}"
+        shutil.rmtree(temporal, ignore_errors=True)
+        try:
+            _construir_entrada(temporal, objetivo, directorio, con_prueba, proyeccion_dim,
+                               proyeccion_metodo, border_count)
+            os.replace(temporal, entrada)
+        except OSError:
+            # Otro proceso publicó la misma entrada primero
+            shutil.rmtree(temporal, ignore_errors=True)
+            if not (entrada / INFO_FILE).exists():
+                raise
+
+    with open(entrada / INFO_FILE, 'r', encoding='utf-8') as f:
+        info = json.load(f)
+    preprocesamiento = joblib.load(entrada / PREPROCESAMIENTO_FILE)
+
+    con_test = (entrada / X_TEST_FILE).exists()
+    X_test = joblib.load(entrada / X_TEST_FILE) if con_test else None
+    y_test = np.load(entrada / Y_TEST_FILE) if con_test else None
+    return {
+        "train": Pool(f"quantized://{entrada / TRAIN_POOL_FILE}"),
+        "test": Pool(X_test, y_test, cat_features=info["cat_features"]) if con_test else None,
+        "X_test": X_test,
+        "y_test": y_test,
+        "feature_names": info["feature_names"],
+        "cat_features": info["cat_features"],
+        "clases": info["clases"],
+        "imputer": preprocesamiento["imputer"],
+        "muestra": preprocesamiento["muestra"],
+        "proyeccion": cargar_proyeccion(entrada / PROYECCION_FILE) if proyeccion_dim > 0 else None,
+        "desde_cache": desde_cache,
+    }
+
+
+def predecir_prueba(model, datos):
+    """Clases predichas para el conjunto de prueba crudo de `datos` (el dict de cargar_pools)"""
+    return np.asarray(model.predict(datos["X_test"])).ravel()
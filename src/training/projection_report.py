@@ -0,0 +1,87 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+from catboost import CatBoostClassifier
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import accuracy_score
+from src.features.feature_store import FEATURE_STORE_DIR, PREFIJO_EMBEDDING, cargar_feature_store, construir_dataframe
+from src.features.projection import PREFIJO_PROYECCION, ajustar_proyeccion
+from src.training.serving_metrics import medir_latencia_ms, tamano_modelo_kb
+
+# ================= CONFIG =================
+# Dimensiones a comparar (0 = embeddings completos, sin proyección)
+DIMENSIONES = [int(d) for d in os.getenv("REPORTE_DIMENSIONES", "0,256,128,64,32").split(",")]
+METODOS = os.getenv("REPORTE_METODOS", "pca,random").split(",")
+ITERACIONES = int(os.getenv("REPORTE_ITERACIONES", "300"))
+REPORTE_PATH = "logs/projection_report.csv"
+
+
+def evaluar_configuracion(embeddings, df, columnas_contexto, y, idx_train, idx_test, dim, metodo):
+    proyeccion = None
+    if dim > 0:
+        # La proyección se ajusta solo con el conjunto de entrenamiento
+        proyeccion = ajustar_proyeccion(embeddings[idx_train], dim, metodo=metodo)
+        X = construir_dataframe(proyeccion.transformar(embeddings), df, columnas_contexto,
+                                prefijo=PREFIJO_PROYECCION)
+    else:
+        X = construir_dataframe(embeddings, df, columnas_contexto, prefijo=PREFIJO_EMBEDDING)
+
+    cat_features = [i for i, col in enumerate(X.columns) if X[col].dtype.name == 'category']
+    model = CatBoostClassifier(
+        iterations=ITERACIONES,
+        learning_rate=0.05,
+        depth=6,
+        loss_function='Logloss',
+        verbose=0,
+        cat_features=cat_features,
+        early_stopping_rounds=50
+    )
+    X_train, X_test = X.iloc[idx_train], X.iloc[idx_test]
+    inicio = time.perf_counter()
+    model.fit(X_train, y[idx_train], eval_set=(X_test, y[idx_test]))
+    segundos_entrenamiento = time.perf_counter() - inicio
+
+    # Para la latencia se incluye el costo de proyectar el embedding de un tweet
+    transformar = None
+    if proyeccion is not None:
+        embedding = np.asarray(embeddings[idx_test[0]])
+        transformar = lambda: proyeccion.transformar(embedding)
+
+    return {
+        "metodo": metodo if dim > 0 else "ninguno",
+        "dimensiones": dim if dim > 0 else embeddings.shape[1],
+        "accuracy": accuracy_score(y[idx_test], model.predict(X_test)),
+        "tamano_modelo_kb": tamano_modelo_kb(model),
+        "latencia_ms": medir_latencia_ms(model, X_test.iloc[[0]], transformar=transformar),
+        "entrenamiento_s": segundos_entrenamiento,
+    }
+
+
+if __name__ == '__main__':
+    print("Cargando feature store...")
+    embeddings, df = cargar_feature_store(FEATURE_STORE_DIR)
+
+    columnas_contexto = [col for col in df.columns if col not in ['falla_detectada', 'target_falla']]
+    # Imputar con la media los valores numéricos faltantes del contexto
+    numericas = df[columnas_contexto].select_dtypes(include=np.number).columns
+    df[numericas] = df[numericas].fillna(df[numericas].mean())
+
+    # Se compara con el modelo de detección (binario), que sí tiene conjunto de prueba
+    y = df['falla_detectada'].astype(int).to_numpy()
+    idx_train, idx_test = train_test_split(np.arange(len(df)), test_size=0.25, random_state=42, stratify=y)
+
+    resultados = []
+    for dim in DIMENSIONES:
+        for metodo in (METODOS if dim > 0 else [None]):
+            print(f"Evaluando dimensiones={dim or embeddings.shape[1]} método={metodo or 'ninguno'}...")
+            resultados.append(evaluar_configuracion(
+                embeddings, df, columnas_contexto, y, idx_train, idx_test, dim, metodo))
+
+    reporte = pd.DataFrame(resultados)
+    print("\nComparación de configuraciones de serving:")
+    print(reporte.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+
+    os.makedirs(os.path.dirname(REPORTE_PATH), exist_ok=True)
+    reporte.to_csv(REPORTE_PATH, index=False)
+    print(f"\n✅ Reporte guardado en '{REPORTE_PATH}'")
@@ -0,0 +1,172 @@
+import fcntl
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from catboost import CatBoostClassifier
+
+from src.features.batch_encoder import codificar_por_buckets
+from src.features.feature_store import PREFIJO_EMBEDDING
+from src.features.projection import PREFIJO_PROYECCION, cargar_proyeccion, modelo_usa_proyeccion
+from src.training.feedback_log import BASE_DIR, guardar_cursor, leer_cursor, leer_feedback
+
+# ================= CONFIG =================
+# Mismas rutas que usa la API (relativas a la raíz del proyecto)
+MODEL_CLASIFICACION_PATH = BASE_DIR / os.getenv("MODEL_CLASIFICACION_PATH", "models/modelo_clasificacion_falla.cbm")
+MODEL_DETECCION_PATH = BASE_DIR / os.getenv("MODEL_DETECCION_PATH", "models/modelo_deteccion_falla.cbm")
+LABEL_ENCODING_PATH = BASE_DIR / os.getenv("LABEL_ENCODING_PATH", "data/processed/label_encoding.json")
+PROYECCION_EMBEDDINGS_PATH = BASE_DIR / os.getenv("PROYECCION_EMBEDDINGS_PATH", "models/proyeccion_embeddings.npz")
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "xlm-roberta-base")
+
+# Árboles agregados por cada lote de feedback (el modelo actual se usa como init_model)
+REENTRENAMIENTO_ITERACIONES = int(os.getenv("REENTRENAMIENTO_ITERACIONES", "50"))
+REENTRENAMIENTO_LEARNING_RATE = float(os.getenv("REENTRENAMIENTO_LEARNING_RATE", "0.03"))
+
+LOCK_PATH = BASE_DIR / "data/feedback/reentrenamiento.lock"
+
+# Etiqueta con la que el operador indica que el tweet no reporta ninguna falla (la misma
+# que la API pone a lo que descarta la cascada); solo entrena al modelo de detección
+CLASE_SIN_FALLA = "Sin falla"
+MIN_REGISTROS_POR_MODELO = 2
+
+
+def construir_features(registros, vectores, model):
+    """Arma X con el mismo orden de columnas que el modelo, igual que la API"""
+    prefijo = PREFIJO_EMBEDDING
+    if modelo_usa_proyeccion(model.feature_names_):
+        vectores = cargar_proyeccion(PROYECCION_EMBEDDINGS_PATH).transformar(vectores)
+        prefijo = PREFIJO_PROYECCION
+
+    contexto = pd.DataFrame({
+        'station': [r['estacion'] for r in registros],
+        'temp': [r['temp'] for r in registros],
+        'humidity': [r['humidity'] for r in registros],
+        'precip_mm': [r['precip_mm'] for r in registros],
+        'traffic_jam_level': [r['traffic_jam_level'] for r in registros],
+    })
+    embeddings = pd.DataFrame(vectores, columns=[f"{prefijo}{i}" for i in range(vectores.shape[1])])
+    return pd.concat([contexto, embeddings], axis=1)[model.feature_names_]
+
+
+def continuar_modelo(ruta, registros, vectores, y):
+    """
+    Agrega árboles al modelo de `ruta` (su versión actual como init_model) con el lote
+    (registros, y). Regresa (modelo nuevo, árboles antes); no lo guarda.
+    """
+    model = CatBoostClassifier()
+    model.load_model(str(ruta))
+    X = construir_features(registros, vectores, model)
+    y = np.asarray(y)
+    pesos = np.ones(len(y))
+
+    # CatBoost exige que el lote contenga todas las clases del modelo inicial; las que
+    # faltan se agregan como filas ancla con peso 0 (no aportan al gradiente).
+    faltantes = sorted(set(int(c) for c in model.classes_) - set(y.tolist()))
+    if faltantes:
+        X = pd.concat([X, X.iloc[[0] * len(faltantes)]], ignore_index=True)
+        y = np.concatenate([y, faltantes])
+        pesos = np.concatenate([pesos, np.zeros(len(faltantes))])
+
+    parametros = model.get_all_params()
+    cat_features = [i for i, col in enumerate(X.columns) if col == 'station']
+    nuevo = CatBoostClassifier(
+        iterations=REENTRENAMIENTO_ITERACIONES,
+        learning_rate=REENTRENAMIENTO_LEARNING_RATE,
+        depth=parametros['depth'],
+        loss_function=parametros['loss_function'],
+        verbose=0,
+        allow_writing_files=False  # Sin catboost_info/ en la raíz cuando lo lanza la API
+    )
+    nuevo.fit(X, y, cat_features=cat_features, sample_weight=pesos, init_model=model)
+    return nuevo, model.tree_count_
+
+
+def guardar_modelo(model, ruta):
+    """Reemplazo atómico: la API nunca ve un .cbm a medio escribir"""
+    tmp_path = Path(ruta).with_suffix('.cbm.tmp')
+    model.save_model(str(tmp_path))
+    os.replace(tmp_path, ruta)
+
+
+def reentrenar():
+    """
+    Continúa el entrenamiento con el feedback nuevo (desde la última corrida):
+    - detección (falla / sin falla) con todos los registros, si el modelo existe;
+    - clasificación con los registros de una falla que el modelo conoce.
+    Regresa el número de registros usados.
+    """
+    cursor = leer_cursor()
+    registros, posicion = leer_feedback(cursor["posicion"])
+    if not registros:
+        print("No hay feedback nuevo. Nada que reentrenar.")
+        return 0
+
+    with open(LABEL_ENCODING_PATH, 'r', encoding='utf-8') as f:
+        label_mapping = {int(k): v for k, v in json.load(f).items()}
+    indice_por_clase = {v: k for k, v in label_mapping.items()}
+
+    # Registros con una clase que ningún modelo conoce no se pueden usar para continuar
+    validos = [r for r in registros if r['clase_correcta'] in indice_por_clase or r['clase_correcta'] == CLASE_SIN_FALLA]
+    if len(validos) < len(registros):
+        print(f"⚠️  Se descartaron {len(registros) - len(validos)} registros con clases desconocidas.")
+    fallas = [i for i, r in enumerate(validos) if r['clase_correcta'] != CLASE_SIN_FALLA]
+
+    if validos:
+        inicio = time.perf_counter()
+        vectores, _ = codificar_por_buckets([r['texto'] for r in validos], EMBEDDING_MODEL_NAME)
+
+        # Primero se entrenan ambos y después se guardan: si uno falla, ninguno cambia y
+        # el cursor no avanza, así que el siguiente intento no repite el lote en el otro
+        lotes = []
+        if not MODEL_DETECCION_PATH.exists():
+            print(f"⚠️  No existe '{MODEL_DETECCION_PATH}'; solo se actualiza la clasificación.")
+        else:
+            lotes.append(('detección', MODEL_DETECCION_PATH, list(range(len(validos))),
+                          [int(r['clase_correcta'] != CLASE_SIN_FALLA) for r in validos]))
+        lotes.append(('clasificación', MODEL_CLASIFICACION_PATH, fallas,
+                      [indice_por_clase[validos[i]['clase_correcta']] for i in fallas]))
+
+        nuevos = []
+        for nombre, ruta, indices, y in lotes:
+            # Con un solo registro todas las filas (y las anclas) son iguales y CatBoost no
+            # tiene ninguna feature que usar
+            if len(indices) < MIN_REGISTROS_POR_MODELO:
+                if indices:
+                    print(f"⚠️  {len(indices)} registro(s) no alcanzan para actualizar el modelo de {nombre}.")
+                continue
+            nuevo, antes = continuar_modelo(ruta, [validos[i] for i in indices], vectores[indices], y)
+            nuevos.append((nombre, ruta, nuevo, antes, len(indices)))
+
+        for nombre, ruta, nuevo, antes, n in nuevos:
+            guardar_modelo(nuevo, ruta)
+            print(f"✅ Modelo de {nombre} actualizado con {n} registros de feedback ({antes} → {nuevo.tree_count_} árboles)")
+        print(f"✅ Reentrenamiento terminado en {time.perf_counter() - inicio:.1f}s")
+
+    # El cursor se avanza solo después de guardar los modelos
+    guardar_cursor({
+        "posicion": posicion,
+        "registros_consumidos": cursor["registros_consumidos"] + len(registros),
+        "ultima_actualizacion": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    })
+    return len(validos)
+
+
+if __name__ == '__main__':
+    # Un solo reentrenamiento a la vez (la API o una corrida manual). El candado es un
+    # flock: el sistema lo libera si el proceso muere, así que nunca queda uno huérfano.
+    LOCK_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(LOCK_PATH, 'a+', encoding='utf-8') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.seek(0)
+            print(f"⚠️  Ya hay un reentrenamiento en curso (PID {lock.read().strip() or '?'}, '{LOCK_PATH}').")
+        else:
+            lock.truncate(0)
+            lock.write(str(os.getpid()))
+            lock.flush()
+            reentrenar()
@@ -0,0 +1,29 @@
+import os
+import tempfile
+import time
+import numpy as np
+
+N_MEDICIONES_LATENCIA = 200
+
+
+def medir_latencia_ms(model, X_fila, transformar=None, n_mediciones=N_MEDICIONES_LATENCIA):
+    """
+    Latencia mediana (ms) de puntuar un tweet: el paso previo opcional `transformar()`
+    (p. ej. la proyección de embeddings) más predict_proba de una sola fila.
+    """
+    tiempos = []
+    for _ in range(n_mediciones):
+        inicio = time.perf_counter()
+        if transformar is not None:
+            transformar()
+        model.predict_proba(X_fila)
+        tiempos.append(time.perf_counter() - inicio)
+    return float(np.median(tiempos) * 1000)
+
+
+def tamano_modelo_kb(model):
+    """Tamaño en disco del modelo CatBoost serializado (.cbm)"""
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = os.path.join(tmp, "modelo.cbm")
+        model.save_model(ruta)
+        return os.path.getsize(ruta) / 1024
@@ -0,0 +1,223 @@
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from catboost import CatBoostClassifier
+from sklearn.metrics import accuracy_score
+
+from src.features.feature_store import FEATURE_STORE_DIR
+from src.training.dataset import huella_feature_store
+from src.training.pool_cache import cargar_pools, predecir_prueba
+from src.training.serving_metrics import medir_latencia_ms, tamano_modelo_kb
+
+# ================= CONFIG =================
+SWEEP_OBJETIVO = os.getenv("SWEEP_OBJETIVO", "deteccion")      # 'deteccion' o 'clasificacion'
+SWEEP_MODO = os.getenv("SWEEP_MODO", "random")                  # 'grid' o 'random'
+SWEEP_TRIALS = int(os.getenv("SWEEP_TRIALS", "20"))             # Solo en modo 'random'
+SWEEP_WORKERS = int(os.getenv("SWEEP_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+SWEEP_SEED = int(os.getenv("SWEEP_SEED", "42"))
+
+MIN_TRIALS_PARA_PODAR = 3
+EARLY_STOPPING_ROUNDS = 50
+
+CACHE_DIR = "logs/sweep_cache"
+LEADERBOARD_PATH = "logs/sweep_leaderboard.csv"
+
+# Espacio de búsqueda de CatBoost
+ESPACIO = {
+    'depth': [4, 6, 8],
+    'learning_rate': [0.03, 0.05, 0.1],
+    'l2_leaf_reg': [1, 3, 9],
+    'iterations': [300, 500],
+}
+
+LOSS_POR_OBJETIVO = {'deteccion': 'Logloss', 'clasificacion': 'MultiClass'}
+
+# Poda: en la misma iteración de control para todos los trials (20% del menor número de
+# iteraciones del espacio) el trial se detiene si su pérdida de validación es peor que la
+# mediana de los trials anteriores en esa iteración.
+FRACCION_PODA = 0.2
+ITERACION_PODA = max(1, int(min(ESPACIO['iterations']) * FRACCION_PODA))
+
+
+# ================= ESPACIO DE BÚSQUEDA =================
+def generar_configuraciones(modo=SWEEP_MODO, n_trials=SWEEP_TRIALS, seed=SWEEP_SEED):
+    claves = sorted(ESPACIO)
+    grid = [dict(zip(claves, valores)) for valores in itertools.product(*(ESPACIO[k] for k in claves))]
+    if modo == 'grid':
+        return grid
+    if modo == 'random':
+        return random.Random(seed).sample(grid, min(n_trials, len(grid)))
+    raise ValueError(f"Modo de búsqueda desconocido: {modo}. Opciones: grid, random")
+
+
+def clave_trial(huella_datos, objetivo, params):
+    contenido = json.dumps({"datos": huella_datos, "objetivo": objetivo, "params": params}, sort_keys=True)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+# ================= WORKERS =================
+# Pools cuantizados cargados una sola vez por worker desde la caché de pools
+_datos = None
+
+
+def _inicializar_worker(objetivo, directorio):
+    global _datos
+    _datos = cargar_pools(objetivo, directorio)
+    _datos["objetivo"] = objetivo
+
+
+class _CallbackPoda:
+    """Detiene el entrenamiento en el punto de control si la pérdida supera el umbral"""
+
+    def __init__(self, iteracion_control, metrica, umbral):
+        self.iteracion_control = iteracion_control
+        self.metrica = metrica
+        self.umbral = umbral
+        self.perdida_control = None
+        self.podado = False
+
+    def after_iteration(self, info):
+        if info.iteration + 1 != self.iteracion_control:
+            return True
+        self.perdida_control = min(info.metrics['validation'][self.metrica])
+        if self.umbral is not None and self.perdida_control > self.umbral:
+            self.podado = True
+            return False
+        return True
+
+
+def _ejecutar_trial(params, umbral_poda, hilos):
+    metrica = LOSS_POR_OBJETIVO[_datos["objetivo"]]
+    callback = _CallbackPoda(ITERACION_PODA, metrica, umbral_poda)
+
+    model = CatBoostClassifier(
+        **params,
+        loss_function=metrica,
+        thread_count=hilos,
+        random_seed=SWEEP_SEED,
+        verbose=0,
+        early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+    )
+    inicio = time.perf_counter()
+    model.fit(_datos["train"], eval_set=_datos["test"], callbacks=[callback])
+    segundos = time.perf_counter() - inicio
+
+    resultado = {
+        "params": params,
+        "estado": "podado" if callback.podado else "completo",
+        "perdida_control": callback.perdida_control,
+        "iteraciones": model.tree_count_,
+        "entrenamiento_s": segundos,
+    }
+    if not callback.podado:
+        resultado.update({
+            "accuracy": float(accuracy_score(_datos["y_test"], predecir_prueba(model, _datos))),
+            "perdida_validacion": float(model.get_best_score()['validation'][metrica]),
+            "latencia_ms": medir_latencia_ms(model, _datos["muestra"]),
+            "tamano_modelo_kb": tamano_modelo_kb(model),
+        })
+    return resultado
+
+
+# ================= SWEEP =================
+def _umbral_actual(resultados):
+    perdidas = [r["perdida_control"] for r in resultados if r.get("perdida_control") is not None]
+    if len(perdidas) < MIN_TRIALS_PARA_PODAR:
+        return None
+    return float(np.median(perdidas))
+
+
+def ejecutar_sweep(objetivo=SWEEP_OBJETIVO, configuraciones=None, n_workers=SWEEP_WORKERS,
+                   directorio=FEATURE_STORE_DIR, cache_dir=CACHE_DIR):
+    """
+    Evalúa las configuraciones en un pool de procesos y regresa el leaderboard.
+    Los trials ya evaluados con los mismos datos y parámetros se leen de la caché. Los
+    podados no se guardan: la poda depende de qué trials terminaron antes, así que en el
+    siguiente sweep se vuelven a evaluar.
+    """
+    configuraciones = configuraciones or generar_configuraciones()
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    huella = huella_feature_store(directorio)
+    resultados = []
+    pendientes = []
+    for params in configuraciones:
+        ruta = cache_dir / f"{clave_trial(huella, objetivo, params)}.json"
+        resultado = None
+        if ruta.exists():
+            with open(ruta, 'r', encoding='utf-8') as f:
+                resultado = json.load(f)
+        if resultado is not None and resultado["estado"] != "podado":
+            resultados.append(resultado)
+        else:
+            pendientes.append((params, ruta))
+    print(f"{len(resultados)} trials en caché, {len(pendientes)} por evaluar con {n_workers} workers.")
+
+    # Los pools se construyen aquí una sola vez; los workers solo los leen de la caché
+    if pendientes:
+        cargar_pools(objetivo, directorio)
+
+    # Presupuesto de hilos por trial para no sobre-suscribir los núcleos
+    hilos = max(1, (os.cpu_count() or 1) // n_workers)
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=contexto,
+                             initializer=_inicializar_worker, initargs=(objetivo, directorio)) as executor:
+        en_curso = {}
+        while pendientes or en_curso:
+            # Se envían trials a medida que se liberan workers, con el umbral de poda más reciente
+            while pendientes and len(en_curso) < n_workers:
+                params, ruta = pendientes.pop(0)
+                futuro = executor.submit(_ejecutar_trial, params, _umbral_actual(resultados), hilos)
+                en_curso[futuro] = ruta
+
+            terminados, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+            for futuro in terminados:
+                ruta = en_curso.pop(futuro)
+                resultado = futuro.result()
+                if resultado["estado"] != "podado":
+                    with open(ruta, 'w', encoding='utf-8') as f:
+                        json.dump(resultado, f, indent=4)
+                resultados.append(resultado)
+                print(f"  [{resultado['estado']}] {resultado['params']} -> "
+                      f"accuracy={resultado.get('accuracy', float('nan')):.4f}")
+
+    return construir_leaderboard(resultados)
+
+
+def construir_leaderboard(resultados):
+    filas = []
+    for r in resultados:
+        fila = dict(r["params"])
+        fila.update({k: v for k, v in r.items() if k != "params"})
+        filas.append(fila)
+    leaderboard = pd.DataFrame(filas)
+    orden = ["estado", "accuracy", "latencia_ms", "tamano_modelo_kb"]
+    criterios = [(c, asc) for c, asc in [("estado", True), ("accuracy", False), ("latencia_ms", True)]
+                 if c in leaderboard.columns]
+    leaderboard = leaderboard.sort_values(
+        by=[c for c, _ in criterios], ascending=[asc for _, asc in criterios], na_position='last')
+    columnas = [c for c in orden if c in leaderboard.columns] + \
+               [c for c in leaderboard.columns if c not in orden]
+    return leaderboard[columnas].reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    print(f"Iniciando sweep de hiperparámetros ({SWEEP_OBJETIVO}, modo {SWEEP_MODO})...")
+    leaderboard = ejecutar_sweep()
+
+    print("\nLeaderboard (accuracy vs. latencia de inferencia y tamaño del modelo):")
+    print(leaderboard.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+
+    os.makedirs(os.path.dirname(LEADERBOARD_PATH), exist_ok=True)
+    leaderboard.to_csv(LEADERBOARD_PATH, index=False)
+    print(f"\n✅ Leaderboard guardado en '{LEADERBOARD_PATH}'")
@@ -1,40 +1,33 @@
-import json
 import pandas as pd
 import numpy as np
 from catboost import CatBoostClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report
+from src.features.feature_store import cargar_feature_store
 
 # 1. CARGAR DATOS 
+# El generador escribe un feature store binario: los vectores se abren como memmap
+# (sin parsear texto) y los metadatos vienen en una tabla pequeña aparte.
 print("Cargando dataset...")
 try:
-    with open('datos_entrenamiento.json', 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    print(f" Se cargaron {len(data)} registros.")
+    vectores, df_meta_raw = cargar_feature_store('datos_entrenamiento')
+    print(f" Se cargaron {len(df_meta_raw)} registros.")
 except FileNotFoundError:
-    print("  ERROR: No encuentro 'datos_entrenamiento.json'. Créalo o pídelo.")
+    print("  ERROR: No encuentro el feature store 'datos_entrenamiento/'. Créalo o pídelo.")
     exit()
 
 # 2. PREPARAR LA MATRIZ DE CARACTERÍSTICAS (X)
 print("⚙️  Procesando vectores y columnas...")
 
-# A. Desglosamos el vector de 768 números en 768 columnas
-# Esto convierte la lista [0.1, 0.2...] en columnas col_0, col_1...
-lista_vectores = [d['vector_tweet'] for d in data]
-df_vectores = pd.DataFrame(lista_vectores)
-
-df_vectores.columns = [f"v_{i}" for i in range(df_vectores.shape[1])]
-
+# A. La matriz float32 de vectores se convierte directamente en columnas v_0, v_1...
+df_vectores = pd.DataFrame(vectores, columns=[f"v_{i}" for i in range(vectores.shape[1])], copy=False)
 
 # B. Sacamos los datos de contexto (DÓNDE y CUÁNDO)
-lista_meta = []
-for d in data:
-    lista_meta.append({
-        'estacion': d['estacion_tweet'],  # TEXTO (Importante para el "Dónde")
-        'hora': d['hora_tweet'],          # NÚMERO
-        'dia': d['dia_semana']            # TEXTO
-    })
-df_meta = pd.DataFrame(lista_meta)
+df_meta = pd.DataFrame({
+    'estacion': df_meta_raw['estacion_tweet'].astype(str),  # TEXTO (Importante para el "Dónde")
+    'hora': df_meta_raw['hora_tweet'],                      # NÚMERO
+    'dia': df_meta_raw['dia_semana'].astype(str)            # TEXTO
+})
 
 # C. Unimos todo en una sola tabla gigante
 # X tendrá: 768 cols de vector + 1 col estacion + 1 col hora + 1 col dia
@@ -42,7 +35,7 @@ X = pd.concat([df_vectores, df_meta], axis=1)
 
 # 3. PREPARAR EL OBJETIVO (Y) - QUÉ FALLA
 # Esto es lo que aprendemos del Excel de Siemens
-y = [d['target_falla'] for d in data]
+y = df_meta_raw['target_falla'].to_numpy()
 
 # 4. CONFIGURAR CATBOOST
 # Le decimos cuáles columnas son texto para que él las maneje internamente
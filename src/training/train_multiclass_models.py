@@ -1,56 +1,41 @@
-
-import pandas as pd
-import numpy as np
 from catboost import CatBoostClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import LabelEncoder
 from sklearn.metrics import accuracy_score, classification_report
-from sklearn.impute import SimpleImputer
 import json
+from src.features.feature_store import FEATURE_STORE_DIR
+from src.features.projection import PROYECCION_PATH
+from src.training.pool_cache import POOL_CACHE_DIR, cargar_pools, predecir_prueba
+import os
+
+# Dimensión objetivo de la proyección de embeddings (0 = usar los 768 originales)
+PROYECCION_DIM = int(os.getenv("PROYECCION_DIM", "0"))
+PROYECCION_METODO = os.getenv("PROYECCION_METODO", "pca")
 
 print("Iniciando el proceso de entrenamiento de modelos...")
 
 # 1. Cargar los datos
+# Los pools cuantizados de CatBoost (con bordes, imputer y proyección) se construyen una
+# sola vez por versión del feature store y se reutilizan en los siguientes entrenamientos.
 try:
-    df = pd.read_csv('data/processed/features_embeddings.csv')
-    print("CSV 'features_embeddings.csv' cargado correctamente.")
+    datos_deteccion = cargar_pools('deteccion', FEATURE_STORE_DIR, proyeccion_dim=PROYECCION_DIM,
+                                   proyeccion_metodo=PROYECCION_METODO)
 except FileNotFoundError:
-    print("Error: No se encontró el archivo 'data/processed/features_embeddings.csv'. Asegúrate de generarlo primero.")
+    print(f"Error: No se encontró el feature store '{FEATURE_STORE_DIR}'. Asegúrate de generarlo primero.")
     exit()
 
-# 2. Preparación de datos
-print("Preparando los datos...")
-
-# La columna 'station' es categórica
-if 'station' in df.columns:
-    df['station'] = df['station'].astype('category')
-
-# Separar features (X) de las variables objetivo (y)
-y1 = df['falla_detectada']
-y2 = df['target_falla']
-
-# Definir columnas de features
-feature_columns = [col for col in df.columns if col not in ['falla_detectada', 'target_falla']]
-X = df[feature_columns]
-
-# Identificar columnas categóricas y numéricas para el preprocesamiento
-categorical_features_indices = [i for i, col in enumerate(X.columns) if X[col].dtype.name == 'category']
-numerical_features = X.select_dtypes(include=np.number).columns.tolist()
+if datos_deteccion["desde_cache"]:
+    print("Pools cuantizados cargados desde la caché (sin reprocesar el feature store).")
+else:
+    print(f"Pools cuantizados construidos y guardados en '{POOL_CACHE_DIR}'.")
 
-# Imputar valores nulos en columnas numéricas
-imputer = SimpleImputer(strategy='mean')
-X[numerical_features] = imputer.fit_transform(X[numerical_features])
-print("Valores nulos en características numéricas rellenados con la media.")
+# Proyección opcional de los embeddings (PROYECCION_DIM=0 la desactiva). Se guarda junto
+# a los .cbm para que la API y los simuladores apliquen la misma transformación.
+if datos_deteccion["proyeccion"] is not None:
+    datos_deteccion["proyeccion"].guardar(PROYECCION_PATH)
+    print(f"✅ Proyección '{PROYECCION_METODO}' a {PROYECCION_DIM} dimensiones guardada como '{PROYECCION_PATH}'")
 
 # --- Modelo 1: Detección de Falla (Binario) ---
 print("\n--- Entrenando Modelo 1: Detección de Falla (Sí/No) ---")
 
-# Convertir booleano a 0/1
-y1_binary = y1.astype(int)
-
-# División de datos para el modelo 1
-X_train1, X_test1, y_train1, y_test1 = train_test_split(X, y1_binary, test_size=0.25, random_state=42, stratify=y1_binary)
-
 # Crear y entrenar el clasificador CatBoost
 print("Entrenando CatBoostClassifier para detección...")
 model1 = CatBoostClassifier(
@@ -59,14 +44,15 @@ model1 = CatBoostClassifier(
     depth=6,
     loss_function='Logloss',
     verbose=100,
-    cat_features=categorical_features_indices,
     early_stopping_rounds=50
 )
-model1.fit(X_train1, y_train1, eval_set=(X_test1, y_test1))
+# Las columnas categóricas ya vienen declaradas en el pool
+model1.fit(datos_deteccion["train"], eval_set=datos_deteccion["test"])
 
 # Evaluar el modelo 1
 print("\nEvaluación del Modelo 1:")
-y_pred1 = model1.predict(X_test1)
+y_test1 = datos_deteccion["y_test"]
+y_pred1 = predecir_prueba(model1, datos_deteccion)
 accuracy1 = accuracy_score(y_test1, y_pred1)
 print(f"Precisión (Accuracy): {accuracy1:.4f}")
 print("Reporte de Clasificación:")
@@ -80,34 +66,21 @@ print("✅ Modelo 1 guardado como 'models/modelo_deteccion_falla.cbm'")
 # --- Modelo 2: Clasificación del Tipo de Falla (Multiclase) ---
 print("\n--- Entrenando Modelo 2: Clasificación del Tipo de Falla ---")
 
-# Filtrar el dataset para incluir solo los casos donde hubo una falla
-df_fallas = df[df['falla_detectada'] == True].copy()
-df_fallas = df_fallas.dropna(subset=['target_falla']) # Eliminar filas si el target es nulo
-
-if not df_fallas.empty:
-    X_fallas = df_fallas[feature_columns]
-    y_fallas_raw = df_fallas['target_falla']
+# Solo los casos donde hubo una falla; sin conjunto de prueba por el bajo número de muestras
+datos_fallas = cargar_pools('clasificacion', FEATURE_STORE_DIR, con_prueba=False,
+                            proyeccion_dim=PROYECCION_DIM, proyeccion_metodo=PROYECCION_METODO)
 
-    # Imputar de nuevo por si acaso el subconjunto tiene diferentes nulos
-    X_fallas[numerical_features] = imputer.fit_transform(X_fallas[numerical_features])
-
-    # Codificar las etiquetas de texto del target a números
-    le = LabelEncoder()
-    y_fallas_encoded = le.fit_transform(y_fallas_raw)
-    
+if datos_fallas["train"].num_row() > 0:
     # Guardar el mapeo de etiquetas
-    label_mapping = {index: label for index, label in enumerate(le.classes_)}
+    label_mapping = {index: label for index, label in enumerate(datos_fallas["clases"])}
     with open('data/processed/label_encoding.json', 'w', encoding='utf-8') as f:
         json.dump(label_mapping, f, ensure_ascii=False, indent=4)
-    print(f"Mapeo de etiquetas para el Modelo 2 guardado en 'data/processed/label_encoding.json'. Clases: {le.classes_}")
+    print(f"Mapeo de etiquetas para el Modelo 2 guardado en 'data/processed/label_encoding.json'. Clases: {datos_fallas['clases']}")
 
     # Debido al bajo número de muestras con fallas, no se creará un conjunto de prueba.
     # El modelo se entrenará con todos los datos de fallas disponibles.
     print("Advertencia: El número de muestras de fallas es muy bajo. El Modelo 2 se entrenará con todos los datos disponibles (sin división de prueba).")
     
-    X_train2 = X_fallas
-    y_train2 = y_fallas_encoded
-
     # Crear y entrenar el clasificador CatBoost
     print("\nEntrenando CatBoostClassifier para clasificación de tipo de falla...")
     model2 = CatBoostClassifier(
@@ -115,11 +88,10 @@ if not df_fallas.empty:
         learning_rate=0.05,
         depth=4, # Reducir complejidad para dataset pequeño
         loss_function='MultiClass',
-        verbose=100,
-        cat_features=[X_fallas.columns.get_loc(col) for col in X_fallas.columns if X_fallas[col].dtype.name == 'category']
+        verbose=100
     )
     # No se usa eval_set ya que no hay conjunto de prueba
-    model2.fit(X_train2, y_train2)
+    model2.fit(datos_fallas["train"])
 
     # No hay evaluación posible sin un conjunto de prueba.
     print("\nEvaluación del Modelo 2 omitida debido a la falta de un conjunto de prueba.")
@@ -0,0 +1,121 @@
+import json
+
+from src.api import history_store
+from src.api.history_store import ACTIVO_FILE, PREFIJO_PENDIENTE, PREFIJO_SEGMENTO, HistorialEstaciones
+
+ESTACIONES = ['Balderas', 'Pino Suárez', 'Zócalo']
+CLASES = [0, 1]
+T0 = 1_000_000.0
+
+
+def _historial(directorio, **kwargs):
+    return HistorialEstaciones(directorio, ESTACIONES, CLASES, [100.0, 0.0], 80.0, 30.0, **kwargs)
+
+
+def _caida(historial):
+    """El proceso muere: los archivos quedan como están y el sistema libera el flock"""
+    historial._archivo.close()
+    historial._candado.close()
+    historial._ejecutor.shutdown(wait=True)
+
+
+def _archivos(directorio, prefijo):
+    return sorted(ruta.name for ruta in directorio.iterdir() if ruta.name.startswith(prefijo))
+
+
+def test_consulta_arrastra_el_ultimo_estado_a_buckets_vacios(tmp_path):
+    historial = _historial(tmp_path)
+    historial.registrar_tick(T0, {'Balderas': ([5.0, 95.0], 2)}, [0.0, 40.0, 0.0], {'Balderas': 1})
+
+    serie = historial.consultar(['Balderas', 'Pino Suárez'], T0, T0 + 5, 1)
+    balderas = serie['Balderas']
+    assert balderas['prob_falla']['max'] == [95.0] * 5
+    assert balderas['alerta'] == [True] * 5
+    assert balderas['tweets'] == [2, 0, 0, 0, 0]
+    assert balderas['alertas_criticas'] == [1, 0, 0, 0, 0]
+    pino = serie['Pino Suárez']
+    assert pino['riesgo']['media'] == [40.0] * 5
+    assert pino['alerta'] == [False] * 5
+    assert pino['alerta_propagada'] == [True] * 5
+    historial.cerrar()
+
+
+def test_consulta_arrastra_desde_la_fila_anterior_al_rango(tmp_path):
+    historial = _historial(tmp_path)
+    historial.registrar_tick(T0, {'Balderas': ([5.0, 95.0], 1)}, [0.0, 0.0, 0.0])
+    historial.registrar_tick(T0 + 10, {'Zócalo': ([90.0, 10.0], 1)}, [0.0, 0.0, 0.0])
+
+    # Sin filas de Balderas en el rango: todo sale de la semilla (la fila de T0)
+    balderas = historial.consultar(['Balderas'], T0 + 5, T0 + 8, 1)['Balderas']
+    assert balderas['prob_falla']['min'] == [95.0] * 3
+    assert balderas['alerta'] == [True] * 3
+    assert balderas['tweets'] == [0, 0, 0]
+
+    # Un reinicio también es una fila: después de él ya no se arrastra la alerta
+    historial.reiniciar(T0 + 20)
+    balderas = historial.consultar(['Balderas'], T0 + 19, T0 + 22, 1)['Balderas']
+    assert balderas['prob_falla']['max'] == [95.0, 0.0, 0.0]
+    assert balderas['alerta'] == [True, False, False]
+    historial.cerrar()
+
+
+def test_recupera_el_segmento_activo_con_una_fila_cortada(tmp_path):
+    historial = _historial(tmp_path)
+    for i in range(5):
+        historial.registrar_tick(T0 + i, {'Balderas': ([100.0 - i, float(i)], 1)}, [0.0, 0.0, 0.0])
+    esperado = historial.consultar(['Balderas'], T0, T0 + 5, 1)
+    _caida(historial)
+    with open(tmp_path / ACTIVO_FILE, 'ab') as f:
+        f.write(b'\x01\x02\x03')  # Escritura interrumpida a la mitad de una fila
+
+    historial = _historial(tmp_path)
+    assert historial._n == 5
+    assert historial.consultar(['Balderas'], T0, T0 + 5, 1) == esperado
+    # La fila cortada se descartó también del archivo: lo nuevo queda alineado
+    historial.registrar_tick(T0 + 5, {'Balderas': ([10.0, 90.0], 1)}, [0.0, 0.0, 0.0])
+    _caida(historial)
+    historial = _historial(tmp_path)
+    assert historial.consultar(['Balderas'], T0 + 5, T0 + 6, 1)['Balderas']['prob_falla']['max'] == [90.0]
+    historial.cerrar()
+
+
+def test_publica_el_pendiente_que_dejo_una_caida(tmp_path, monkeypatch):
+    def disco_lleno(*args, **kwargs):
+        raise OSError("disco lleno")
+
+    # El segmento sellado no se alcanza a escribir: sus filas quedan solo en el pend_
+    monkeypatch.setattr(history_store, '_escribir_segmento', disco_lleno)
+    historial = _historial(tmp_path, filas_por_segmento=4)
+    for i in range(6):
+        historial.registrar_tick(T0 + i, {'Zócalo': ([50.0, 50.0 + i], 1)}, [0.0, 0.0, 0.0])
+    _caida(historial)
+    assert len(_archivos(tmp_path, PREFIJO_PENDIENTE)) == 2  # .bin y .json
+    monkeypatch.undo()
+
+    historial = _historial(tmp_path, filas_por_segmento=4)
+    assert _archivos(tmp_path, PREFIJO_PENDIENTE) == []
+    assert len(_archivos(tmp_path, PREFIJO_SEGMENTO)) == 1
+    zocalo = historial.consultar(['Zócalo'], T0, T0 + 6, 1)['Zócalo']
+    assert zocalo['prob_falla']['max'] == [50.0, 51.0, 52.0, 53.0, 54.0, 55.0]
+    assert zocalo['tweets'] == [1] * 6
+    historial.cerrar()
+
+
+def test_pendiente_ya_publicado_no_duplica_filas(tmp_path):
+    historial = _historial(tmp_path, filas_por_segmento=4)
+    for i in range(4):
+        historial.registrar_tick(T0 + i, {'Zócalo': ([50.0, 50.0], 1)}, [0.0, 0.0, 0.0])
+    historial._ejecutor.shutdown(wait=True)
+    segmento = historial._segmentos[0]
+    # Caída justo después de publicar el segmento y antes de borrar el pend_
+    pendiente = tmp_path / segmento.meta['reemplaza'][0]
+    filas = historial._filas_de(segmento)
+    filas.tofile(pendiente)
+    with open(pendiente.with_suffix('.json'), 'w', encoding='utf-8') as f:
+        json.dump(segmento.meta, f)
+    _caida(historial)
+
+    historial = _historial(tmp_path, filas_por_segmento=4)
+    assert _archivos(tmp_path, PREFIJO_PENDIENTE) == []
+    assert historial.consultar(['Zócalo'], T0, T0 + 4, 4)['Zócalo']['tweets'] == [4]
+    historial.cerrar()
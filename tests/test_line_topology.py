@@ -0,0 +1,31 @@
+import numpy as np
+
+from src.features.line_topology import PropagadorRiesgo, Topologia
+from src.features.metro_network import cargar_red
+
+
+def _propagador_red_completa():
+    red = cargar_red()
+    return PropagadorRiesgo(Topologia(red.lineas))
+
+
+def test_riesgo_no_supera_al_observado_en_transbordos():
+    propagador = _propagador_red_completa()
+    propagador.observar('Pino Suárez', 60.0)
+    for _ in range(200):
+        riesgo = propagador.paso()
+    assert riesgo.max() <= 60.0
+    assert propagador.riesgo_de('Isabel la Católica') > 0
+
+
+def test_riesgo_decae_a_cero_al_apagar_la_fuente():
+    propagador = _propagador_red_completa()
+    for estacion in propagador.topologia.transbordos:
+        propagador.observar(estacion, 100.0)
+    for _ in range(20):
+        propagador.paso()
+    for estacion in propagador.topologia.transbordos:
+        propagador.observar(estacion, 0.0)
+    for _ in range(200):
+        riesgo = propagador.paso()
+    assert np.all(riesgo < 1e-6)
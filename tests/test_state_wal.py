@@ -0,0 +1,63 @@
+import random
+
+from src.api.session_store import SesionSimulacion, riesgo_observado
+from src.api.state_wal import BitacoraEstado
+from src.features.line_topology import Topologia
+from src.features.metro_network import cargar_red
+from src.features.near_duplicates import VentanaDuplicados
+
+CLASES = [0, 1, 2]
+
+
+def _nueva_sesion(red, topologia):
+    return SesionSimulacion('principal', red, topologia, lambda: {0: 100.0, 1: 0.0, 2: 0.0, 'hora': '-'},
+                            VentanaDuplicados(), 0.5, 0.8)
+
+
+def _iteracion(sesion, rng, n):
+    """Lo mismo que hace /iteracion con el estado: actualizar estaciones, difundir y devolver el evento"""
+    cambios = {}
+    for est in rng.sample(sesion.red.estaciones, 3):
+        falla = rng.uniform(0.0, 100.0)
+        probabilidades = {0: 100.0 - falla, 1: falla * 0.7, 2: falla * 0.3}
+        estado = sesion.estado_estacion(est)
+        estado.update(probabilidades)
+        estado['hora'] = f"08:{n:02d}"
+        sesion.propagador.observar(est, riesgo_observado(probabilidades))
+        cambios[est] = {'p': [estado[c] for c in CLASES], 'hora': estado['hora']}
+    sesion.propagador.paso()
+    return {'tipo': 'iteracion', 'estaciones': cambios}
+
+
+def test_reaplicar_wal_reproduce_el_estado(tmp_path):
+    red = cargar_red()
+    topologia = Topologia(red.lineas)
+    sesion = _nueva_sesion(red, topologia)
+    rng = random.Random(0)
+
+    bitacora = BitacoraEstado(tmp_path, snapshot_cada=4)
+    assert bitacora.recuperar() == (None, [])
+    bitacora.snapshot(sesion.capturar_estado(CLASES))
+    # Snapshots en los eventos 4 y 8; el reset y las dos iteraciones siguientes solo quedan en el log
+    eventos = [_iteracion(sesion, rng, n) for n in range(8)]
+    for evento in eventos:
+        if bitacora.registrar(evento):
+            bitacora.snapshot(sesion.capturar_estado(CLASES))
+    sesion.reiniciar()
+    bitacora.registrar({'tipo': 'reset'})
+    for n in range(8, 10):
+        bitacora.registrar(_iteracion(sesion, rng, n))
+
+    # Caída: sin snapshot final y con un evento a medio escribir
+    bitacora._log.write('{"n": 12, "tipo": "itera')
+    bitacora._log.close()
+    bitacora._candado.close()
+
+    bitacora = BitacoraEstado(tmp_path, snapshot_cada=4)
+    snapshot, pendientes = bitacora.recuperar()
+    assert [e['tipo'] for e in pendientes] == ['reset', 'iteracion', 'iteracion']
+
+    restaurada = _nueva_sesion(red, topologia)
+    restaurada.restaurar(snapshot, pendientes, CLASES)
+    assert restaurada.capturar_estado(CLASES) == sesion.capturar_estado(CLASES)
+    bitacora.cerrar()